@@ -0,0 +1,16 @@
+-- CreateTable
+CREATE TABLE "AnalysisResultCache" (
+    "contentKey" TEXT NOT NULL,
+    "jobId" TEXT NOT NULL,
+    "createdAt" TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    "lastUsedAt" TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    "hits" INTEGER NOT NULL DEFAULT 0,
+
+    CONSTRAINT "AnalysisResultCache_pkey" PRIMARY KEY ("contentKey")
+);
+
+-- CreateIndex
+CREATE INDEX "AnalysisResultCache_lastUsedAt_idx" ON "AnalysisResultCache"("lastUsedAt");
+
+-- AddForeignKey
+ALTER TABLE "AnalysisResultCache" ADD CONSTRAINT "AnalysisResultCache_jobId_fkey" FOREIGN KEY ("jobId") REFERENCES "AnalysisJob"("id") ON DELETE CASCADE ON UPDATE CASCADE;
@@ -92,4 +92,18 @@ describe('EventsGateway', () => {
       });
     });
   });
+
+  describe('notifyJobProgress', () => {
+    it('should emit job_progress event with the job id and progress (Happy Path)', () => {
+      // Arrange
+      const progress = { stage: 'mine', linesProcessed: 1000, bytesProcessed: 2048, totalBytes: 4096 };
+
+      // Act
+      gateway.notifyJobProgress('job-3', progress);
+
+      // Assert
+      expect(mockServer.emit).toHaveBeenCalledTimes(1);
+      expect(mockServer.emit).toHaveBeenCalledWith('job_progress', { jobId: 'job-3', ...progress });
+    });
+  });
 });
\ No newline at end of file
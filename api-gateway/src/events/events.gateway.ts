@@ -2,6 +2,13 @@ import { Logger } from '@nestjs/common';
 import { OnGatewayConnection, OnGatewayDisconnect, WebSocketGateway, WebSocketServer } from '@nestjs/websockets';
 import { Server, Socket } from 'socket.io';
 
+export type JobProgress = {
+  stage?: string;
+  linesProcessed?: number;
+  bytesProcessed?: number;
+  totalBytes: number | null;
+};
+
 @WebSocketGateway()
 export class EventsGateway implements OnGatewayConnection, OnGatewayDisconnect {
   private readonly logger = new Logger(EventsGateway.name);
@@ -25,4 +32,8 @@ export class EventsGateway implements OnGatewayConnection, OnGatewayDisconnect {
       incidents: incidents,
     });
   }
+
+  notifyJobProgress(jobId: string, progress: JobProgress): void {
+    this.server.emit('job_progress', { jobId, ...progress });
+  }
 }
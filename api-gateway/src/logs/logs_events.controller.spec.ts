@@ -9,7 +9,7 @@ import { AnalysisJobHistoryItemDto, IncidentResponseDto } from './dto/logs-respo
 describe('LogsEventsController', () => {
   let controller: LogsEventsController;
   let logsService: jest.Mocked<Pick<LogsService, 'getJobById'>>;
-  let eventsGateway: jest.Mocked<Pick<EventsGateway, 'notifyJobFinished'>>;
+  let eventsGateway: jest.Mocked<Pick<EventsGateway, 'notifyJobFinished' | 'notifyJobProgress'>>;
   let clsService: jest.Mocked<Pick<ClsService, 'run' | 'set'>>;
 
   beforeEach(async () => {
@@ -22,7 +22,7 @@ describe('LogsEventsController', () => {
         },
         {
           provide: EventsGateway,
-          useValue: { notifyJobFinished: jest.fn() },
+          useValue: { notifyJobFinished: jest.fn(), notifyJobProgress: jest.fn() },
         },
         {
           provide: ClsService,
@@ -39,7 +39,7 @@ describe('LogsEventsController', () => {
     controller = module.get<LogsEventsController>(LogsEventsController);
 
     logsService = module.get(LogsService) as unknown as jest.Mocked<Pick<LogsService, 'getJobById'>>;
-    eventsGateway = module.get(EventsGateway) as unknown as jest.Mocked<Pick<EventsGateway, 'notifyJobFinished'>>;
+    eventsGateway = module.get(EventsGateway) as unknown as jest.Mocked<Pick<EventsGateway, 'notifyJobFinished' | 'notifyJobProgress'>>;
     clsService = module.get(ClsService) as unknown as jest.Mocked<Pick<ClsService, 'run' | 'set'>>;
 
     jest.spyOn(Logger.prototype, 'error').mockImplementation(() => { });
@@ -132,5 +132,32 @@ describe('LogsEventsController', () => {
       expect(logsService.getJobById).toHaveBeenCalledWith('missing-job');
       expect(eventsGateway.notifyJobFinished).not.toHaveBeenCalled();
     });
+
+    it('should forward PROGRESS messages without a database lookup', async () => {
+      // Arrange
+      const message = {
+        jobId: 'job-123',
+        status: 'PROGRESS',
+        stage: 'mine',
+        linesProcessed: 50000,
+        bytesProcessed: 4194304,
+        totalBytes: 10485760,
+        correlationId: 'corr-abc',
+      };
+
+      // Act
+      await controller.handleJobResult(message);
+
+      // Assert
+      expect(clsService.set).toHaveBeenCalledWith('correlationId', 'corr-abc');
+      expect(logsService.getJobById).not.toHaveBeenCalled();
+      expect(eventsGateway.notifyJobFinished).not.toHaveBeenCalled();
+      expect(eventsGateway.notifyJobProgress).toHaveBeenCalledWith('job-123', {
+        stage: 'mine',
+        linesProcessed: 50000,
+        bytesProcessed: 4194304,
+        totalBytes: 10485760,
+      });
+    });
   });
 });
\ No newline at end of file
@@ -5,6 +5,18 @@ import { Payload } from '@nestjs/microservices';
 import { LogsService } from './logs.service';
 import { ClsService } from 'nestjs-cls';
 
+type JobResultMessage = {
+    jobId: string,
+    status: string,
+    incidentCount?: number,
+    correlationId?: string,
+    // PROGRESS messages only
+    stage?: string,
+    linesProcessed?: number,
+    bytesProcessed?: number,
+    totalBytes?: number | null,
+};
+
 @Controller()
 export class LogsEventsController {
     private readonly logger = new Logger(LogsEventsController.name);
@@ -17,13 +29,24 @@ export class LogsEventsController {
 
     @EventPattern('results_queue')
     async handleJobResult(
-        @Payload() message: { jobId: string, status: string, incidentCount: number, correlationId?: string }
+        @Payload() message: JobResultMessage
     ) {
         await this.clsService.run(async () => {
             if (message.correlationId) {
                 this.clsService.set('correlationId', message.correlationId);
             }
 
+            if (message.status === 'PROGRESS') {
+                // Intermediate update of a running job: forwarded as is, no database lookup
+                this.eventsGateway.notifyJobProgress(message.jobId, {
+                    stage: message.stage,
+                    linesProcessed: message.linesProcessed,
+                    bytesProcessed: message.bytesProcessed,
+                    totalBytes: message.totalBytes ?? null,
+                });
+                return;
+            }
+
             const job = await this.logsService.getJobById(message.jobId);
             if (!job) {
                 this.logger.error(
@@ -1,44 +1,275 @@
-import array
+import math
+import os
 import re
+import shutil
+import tempfile
 import numpy as np
-from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass, replace
+from time import perf_counter, time
 from sklearn.ensemble import IsolationForest
 from sklearn.preprocessing import StandardScaler
 from dateutil import parser
 from drain3 import TemplateMiner
 from drain3.template_miner_config import TemplateMinerConfig
-from datetime import datetime
-from typing import Union
+from native_miner import NativeMiner
+from datetime import datetime, timedelta, timezone
+from itertools import islice
+from typing import Callable, Union
 
 # Input: list of lines or file-like (e.g. open file, NamedTemporaryFile)
-LogLinesSource = Union[list[str], object]
+LogLinesSource = Union[list[str], "LineBatches", object]
+
+# progress(stage, lines): called once per mined batch ("mine", lines mined so far) and once when each
+# later stage starts ("merge", "score", "aggregate"; lines in the analysis), never per line
+ProgressCallback = Callable[[str, int], None]
+
+# Lines per batch for bulk severity/length/timestamp extraction in analyze_log
+FEATURE_CHUNK_SIZE = 65_536
+# Lines whose rows the forest is fitted on when repeats are collapsed (a uniform sample of longer files)
+COLLAPSED_FIT_LINES = 1_048_576
+
+
+@dataclass(frozen=True)
+class ModelConfig:
+    """Scaler / Isolation Forest settings for analyze_log. Defaults reproduce the original
+    behaviour: fit and score on every line, 100 trees, 256-row subsamples, one scoring thread.
+
+    fit_sample_size: fit scaler and forest on a reservoir sample of this many lines drawn while
+        streaming (None = all lines); fit cost then stays flat as files grow.
+    n_jobs: threads for forest fitting and for scoring row blocks (-1 = all cores).
+    dedup_features / dedup_decimals: see fit_score_deduplicated.
+    """
+    n_estimators: int = 100
+    max_samples: int | float | str = "auto"
+    random_state: int = 42
+    fit_sample_size: int | None = None
+    n_jobs: int = 1
+    score_block_size: int = 262_144
+    dedup_features: bool = False
+    dedup_decimals: int | None = None
+
+    def make_forest(self) -> IsolationForest:
+        return IsolationForest(
+            n_estimators=self.n_estimators,
+            max_samples=self.max_samples,
+            contamination="auto",
+            random_state=self.random_state,
+            n_jobs=self.n_jobs if self.n_jobs != 1 else None,
+        )
+
+@dataclass(frozen=True)
+class StreamingConfig:
+    """Segment-by-segment analysis (analyze_stream, or analyze_log(streaming=...)): memory stays
+    O(templates + segment) instead of O(lines), and incidents are available after every segment.
+
+    segment_lines: lines mined, featurized and scored together.
+    reservoir_size: feature rows kept (a uniform sample of all lines so far) to fit the scaler and
+        forest on; replaces ModelConfig.fit_sample_size.
+    refit_segments: refit on the reservoir every this many segments (0 = fit once, on the first).
+    """
+    segment_lines: int = 100_000
+    reservoir_size: int = 50_000
+    refit_segments: int = 1
+
+    def __post_init__(self):
+        if self.segment_lines < 1 or self.reservoir_size < 10 or self.refit_segments < 0:
+            raise ValueError(f"Invalid streaming settings: {self!r}")
+
+# Bytes per line held in memory by whole-file analysis: LineColumns plus the peak of score_mined
+# (feature columns, the feature matrix and its scaled copy, scores and temporaries)
+IN_MEMORY_BYTES_PER_LINE = 176
+
+
+@dataclass(frozen=True)
+class SpillConfig:
+    """Out-of-core whole-file analysis (analyze_log(spill=...)): once the per-line arrays of a file
+    would take more than memory_limit_bytes in memory (IN_MEMORY_BYTES_PER_LINE per line), the line
+    columns, the feature matrix, its scaled float32 rows and the scores move to np.memmap files in
+    a scratch directory, and features, scaling and scoring run block by block. Memory then stays
+    O(block_lines + templates); disk use is about 90 bytes per line. Incidents match the in-memory
+    analysis up to float rounding of the scaler statistics and of the threshold's standard deviation.
+
+    directory: where each analysis creates its scratch directory (None = the system temp dir); it is
+        removed when the analysis ends, also when it fails.
+    block_lines: rows featurized, scaled and scored at a time.
+    Fitting the forest on every line still allocates per-tree arrays over all rows; combine with
+    ModelConfig.fit_sample_size for a fixed memory bound. dedup_features keeps the distinct rows in memory.
+    """
+    memory_limit_bytes: int = 1024 ** 3
+    directory: str | None = None
+    block_lines: int = 1_048_576
+
+    def __post_init__(self):
+        if self.memory_limit_bytes < 0 or self.block_lines < 1:
+            raise ValueError(f"Invalid spill settings: {self!r}")
+
+    @property
+    def max_memory_lines(self) -> int:
+        """Lines analyzed in memory; longer files spill."""
+        return self.memory_limit_bytes // IN_MEMORY_BYTES_PER_LINE
+
+
+class SpillFiles:
+    """Scratch files of one analysis (see SpillConfig). The directory is created on first use;
+    close() closes the open files and removes it with everything in it."""
+
+    def __init__(self, config: SpillConfig):
+        self.config = config
+        self.directory: str | None = None
+        self._files = []
+
+    def path(self, name: str) -> str:
+        if self.directory is None:
+            self.directory = tempfile.mkdtemp(prefix="sentinel-spill-", dir=self.config.directory)
+        return os.path.join(self.directory, name)
+
+    def open(self, name: str):
+        """A new file opened for appending raw column bytes."""
+        f = open(self.path(name), "wb")
+        self._files.append(f)
+        return f
+
+    def array(self, name: str, dtype, shape) -> np.ndarray:
+        """A new zero-filled np.memmap array of `shape`."""
+        return np.memmap(self.path(name), dtype=dtype, mode="w+", shape=shape)
+
+    def close(self):
+        for f in self._files:
+            f.close()
+        self._files.clear()
+        if self.directory is not None:
+            shutil.rmtree(self.directory, ignore_errors=True)
+            self.directory = None
+
+# Built-in token masks for MiningConfig.masks, replaced by "<NAME>" (Drain3's mask format) before mining;
+# examples keep the raw line. A mask starts after whitespace or a delimiter (see _MASK_START); numbers,
+# durations and IPs not after ":", "/" or "-", so dates, times and versions stay Drain3's. Where two masks
+# match at the same position the earlier one wins; the most frequent come first.
+TOKEN_MASKS = {
+    "num": r"(?<![:/-])[-+]?[0-9]+(?:\.[0-9]+)?(?!\.?[\w:/-])",
+    "duration": r"(?<![:/-])[0-9]+(?:\.[0-9]+)?(?:ns|us|µs|ms|s|m|h)\b",
+    "ip": r"(?<![:/-])[0-9]{1,3}(?:\.[0-9]{1,3}){3}(?::[0-9]{1,5})?(?!\.?[\w:])",
+    "uuid": r"[0-9a-fA-F]{8}(?:-[0-9a-fA-F]{4}){3}-[0-9a-fA-F]{12}\b",
+    "hex": r"0[xX][0-9a-fA-F]+\b|(?=[a-fA-F]*[0-9])(?=[0-9]*[a-fA-F])[0-9a-fA-F]{8,}\b",
+    "id": r"(?=[A-Za-z]*[0-9])(?=[0-9]*[A-Za-z])[A-Za-z0-9]{16,}\b",
+}
+# Delimiter before a mask (kept), then a cheap check that a digit follows (every mask needs one, or a
+# UUID's first group): most positions fail here instead of in every mask
+_MASK_START = r"([\s=,;:/(\[{\"'<>|@-])(?=[-+]?[A-Za-z]*[0-9]|[a-fA-F]{8}-)"
+MASK_PROFILES = {
+    "default": tuple(TOKEN_MASKS),
+    "ids": ("uuid", "ip", "hex", "id"),
+}
+
+
+def resolve_masks(spec: str) -> tuple[str, ...]:
+    """Mask names for a MASK_PROFILES name or a comma-separated list of TOKEN_MASKS names ("" = none)."""
+    spec = spec.strip()
+    if spec in MASK_PROFILES:
+        return MASK_PROFILES[spec]
+    names = tuple(name.strip() for name in spec.split(",") if name.strip())
+    unknown = [name for name in names if name not in TOKEN_MASKS]
+    if unknown:
+        raise ValueError(f"Unknown token masks {unknown}; use {sorted(TOKEN_MASKS)} or a profile {sorted(MASK_PROFILES)}")
+    return names
+
+
+class TokenMasker:
+    """The given TOKEN_MASKS compiled into one regex: a batch of lines is masked with a single pass
+    over the joined batch instead of one pass per mask and line."""
+
+    def __init__(self, names: tuple[str, ...]):
+        self.names = tuple(name for name in TOKEN_MASKS if name in names)
+        alternatives = "|".join(f"(?P<{name}>{TOKEN_MASKS[name]})" for name in self.names)
+        self._regex = re.compile(f"{_MASK_START}(?:{alternatives})")
+        replacement = {name: f"<{name.upper()}>" for name in self.names}
+        self._replace = lambda match: match.group(1) + replacement[match.lastgroup]
+
+    def mask(self, line: str) -> str:
+        return self._regex.sub(self._replace, "\n" + line)[1:]
+
+    def mask_batch(self, lines: list[str]) -> list[str]:
+        # No mask matches a newline, so masking the joined batch keeps the line boundaries; the leading
+        # newline is the delimiter before the first line
+        text = "\n" + "\n".join(lines)
+        if text.count("\n") != len(lines):
+            # A line with its own newline would split into several; mask line by line instead
+            return [self.mask(line) for line in lines]
+        return self._regex.sub(self._replace, text)[1:].split("\n")
+
+
+MINING_ENGINES = ("drain3", "native")
+
+
+@dataclass(frozen=True)
+class MiningConfig:
+    """Template mining settings for mine_log. Defaults reproduce the original behaviour: Drain3, no
+    masking and an unbounded number of clusters.
+
+    masks: TOKEN_MASKS names (see MASK_PROFILES / resolve_masks) replaced in every line before mining,
+        so IPs, ids and durations do not grow the Drain tree or split templates.
+    max_clusters: keep at most this many Drain3 clusters; the least recently matched one is evicted
+        (lines already mined keep their template).
+    engine: "drain3" (drain3.TemplateMiner) or "native" (native_miner.NativeMiner: the same clusters
+        and templates, mined per batch).
+    collapse_repeats: collapse runs of consecutive lines that differ only in their leading timestamp
+        into one record with a line count (see RepeatCollapser), so that storms of one line cost one
+        record in mining, features and the forest. Whole-file analysis only; streaming segments
+        mine every line.
+    """
+    masks: tuple[str, ...] = ()
+    max_clusters: int | None = None
+    engine: str = "drain3"
+    collapse_repeats: bool = False
+
+    def __post_init__(self):
+        if self.engine not in MINING_ENGINES:
+            raise ValueError(f"Unknown mining engine {self.engine!r}; use one of {MINING_ENGINES}")
+
+    def make_miner(self) -> "TemplateMiner | NativeMiner":
+        if self.engine == "native":
+            return NativeMiner(max_clusters=self.max_clusters)
+        config = TemplateMinerConfig()
+        config.drain_max_clusters = self.max_clusters
+        return TemplateMiner(config=config)
+
+    def make_masker(self) -> TokenMasker | None:
+        return TokenMasker(self.masks) if self.masks else None
+
+
+_EPOCH_RE = re.compile(r'\b(\d{10})\b')
+_ROBUST_TS_PATTERNS = [
+    re.compile(r'\[(\d{2}/\w{3}/\d{4}:\d{2}:\d{2}:\d{2}\s+[+-]\d{4})\]'),  # Apache
+    re.compile(r'([A-Z][a-z]{2}\s+\d{1,2}\s+\d{2}:\d{2}:\d{2})'),           # Syslog
+    re.compile(r'(\d{2,4}[./-]\d{2}[./-]\d{2,4}(?:[ T]\d{2}:\d{2}:\d{2}(?:\.\d+)?Z?)?)'),  # ISO/slash/dot
+    re.compile(r'\b(\d{14})\b'),  # YYYYMMDDHHMMSS
+]
+_APACHE_YEAR_COLON_RE = re.compile(r'(\d{4}):')
+_TIME_ONLY_RE = re.compile(r'(\d{2}:\d{2}:\d{2})')
+
 
 def extract_timestamp_robust(line: str):
     """Extract timestamp from a log line; supports Unix epoch, Apache, syslog, ISO, compact."""
-    epoch_match = re.search(r'\b(\d{10})\b', line[:20])
+    epoch_match = _EPOCH_RE.search(line[:20])
     if epoch_match:
         return datetime.fromtimestamp(int(epoch_match.group(1)))
 
-    patterns = [
-        r'\[(\d{2}/\w{3}/\d{4}:\d{2}:\d{2}:\d{2}\s+[+-]\d{4})\]',  # Apache
-        r'([A-Z][a-z]{2}\s+\d{1,2}\s+\d{2}:\d{2}:\d{2})',           # Syslog
-        r'(\d{2,4}[./-]\d{2}[./-]\d{2,4}(?:[ T]\d{2}:\d{2}:\d{2}(?:\.\d+)?Z?)?)',  # ISO/slash/dot
-        r'\b(\d{14})\b'  # YYYYMMDDHHMMSS
-    ]
-
-    for pattern in patterns:
-        match = re.search(pattern, line[:70])
+    head = line[:70]
+    for pattern in _ROBUST_TS_PATTERNS:
+        match = pattern.search(head)
         if match:
             ts_str = match.group(1)
             try:
                 if '/' in ts_str and ':' in ts_str:
-                    ts_str = re.sub(r'(\d{4}):', r'\1 ', ts_str)  # Apache time part
+                    ts_str = _APACHE_YEAR_COLON_RE.sub(r'\1 ', ts_str)  # Apache time part
                 dt = parser.parse(ts_str, fuzzy=True)
                 return dt
             except:
                 continue
 
-    match_time = re.search(r'(\d{2}:\d{2}:\d{2})', line[:50])
+    match_time = _TIME_ONLY_RE.search(line[:50])
     if match_time:
         try:
             return parser.parse(match_time.group(1))  # today + time
@@ -48,102 +279,1494 @@ def extract_timestamp_robust(line: str):
     return None
 
 
+# --- Fast-path timestamp parsers (one per known format, bound per stream) ---
+
+_MONTHS = {m: i for i, m in enumerate(
+    ("Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"), start=1)}
+_DAYS_IN_MONTH = np.array([31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31], dtype=np.int64)
+_EPOCH_NAIVE = datetime(1970, 1, 1)
+
+
+def _days_from_civil(y: np.ndarray, m: np.ndarray, d: np.ndarray) -> np.ndarray:
+    """Days since 1970-01-01 for proleptic Gregorian dates (vectorized, integer-only)."""
+    y = y - (m <= 2)
+    era = y // 400
+    yoe = y - era * 400
+    doy = (153 * np.where(m > 2, m - 3, m + 9) + 2) // 5 + d - 1
+    doe = yoe * 365 + yoe // 4 - yoe // 100 + doy
+    return era * 146097 + doe - 719468
+
+
+def _valid_civil(y, m, d, hh, mm, ss) -> np.ndarray:
+    """Mask of field rows that datetime(...) accepts."""
+    ok = (y >= 1) & (y <= 9999) & (m >= 1) & (m <= 12) & (hh < 24) & (mm < 60) & (ss < 60) & (d >= 1)
+    mi = np.clip(m, 1, 12) - 1
+    leap = ((y % 4 == 0) & (y % 100 != 0)) | (y % 400 == 0)
+    return ok & (d <= _DAYS_IN_MONTH[mi] + ((mi == 1) & leap))
+
+
+def _epoch_seconds(valid, y, m, d, hh, mm, ss, micro, utc_offset=None) -> np.ndarray:
+    """Bulk equivalent of datetime(...).timestamp() for the `valid` rows (others are 0): naive rows
+    are local time (utc_offset None), otherwise utc_offset holds seconds east of UTC per row."""
+    secs = np.where(valid, _days_from_civil(y, m, d) * 86400 + hh * 3600 + mm * 60 + ss, 0)
+    if utc_offset is not None:
+        return ((secs - utc_offset) * 1_000_000 + micro).astype(np.float64) / 1e6
+    # Local UTC offset only changes on (half-)hour boundaries: resolve it once per distinct slot.
+    slots, inverse = np.unique(secs // 1800, return_inverse=True)
+    offsets = np.array(
+        [(_EPOCH_NAIVE + timedelta(seconds=int(s) * 1800)).timestamp() - int(s) * 1800 for s in slots],
+        dtype=np.int64,
+    )
+    return (secs + offsets[inverse]).astype(np.float64) + micro / 1e6
+
+
+# Characters accepted right after a fixed-width timestamp (0 = end of line); none of them can
+# extend a match or fail a format's trailing \b / lookahead.
+_LAYOUT_BOUNDARY = np.zeros(128, dtype=bool)
+_LAYOUT_BOUNDARY[[0] + [ord(c) for c in " \t,;|]"]] = True
+_MAX_LAYOUTS = 4
+
+
+class _RegexFields:
+    """Group columns of regex matches (one row per match), as strings."""
+
+    def __init__(self, fields: np.ndarray):
+        self.fields = fields
+
+    def __len__(self):
+        return len(self.fields)
+
+    def str(self, i: int) -> np.ndarray:
+        return self.fields[:, i]
+
+    def int(self, i: int, width: int | None = None) -> np.ndarray:
+        """Integer value of group i; with `width`, of its first `width` digits right-padded with 0."""
+        col = self.fields[:, i]
+        if width is not None:
+            col = np.char.ljust(col.astype(f"U{width}"), width, "0")
+        return col.astype(np.int64)
+
+
+class _LayoutFields(_RegexFields):
+    """Group columns sliced at fixed offsets out of a (lines x width) code-point matrix."""
+
+    def __init__(self, codes: np.ndarray, spans: list[tuple[int, int]]):
+        self.codes = codes
+        self.spans = spans
+
+    def __len__(self):
+        return len(self.codes)
+
+    def str(self, i: int) -> np.ndarray:
+        s, e = self.spans[i]
+        if s < 0:
+            return np.full(len(self.codes), "")
+        return np.ascontiguousarray(self.codes[:, s:e]).view(f"U{e - s}").ravel()
+
+    def int(self, i: int, width: int | None = None) -> np.ndarray:
+        s, e = self.spans[i]
+        if s < 0:
+            return np.zeros(len(self.codes), dtype=np.int64)
+        scale = 1
+        if width is not None:
+            k = min(e - s, width)
+            e, scale = s + k, 10 ** (width - k)
+        digits = self.codes[:, s:e].astype(np.int64) - 48
+        return digits @ (10 ** np.arange(e - s - 1, -1, -1, dtype=np.int64)) * scale
+
+
+class _TimestampFormat:
+    """One known timestamp format. `line_re` is matched at the start of a line (or searched in
+    its first 70 chars when `search` is set); `__call__` returns a datetime or None on a miss.
+
+    `many` converts a whole chunk at once. For line-prefix formats the fixed-width layouts seen
+    in the detection sample are learned (`learn_layouts`) and lines are then validated and sliced
+    as a NumPy code-point matrix; otherwise one regex scan over the joined chunk is used.
+    `search` formats must have a fixed-width pattern: matches are located by the regex and their
+    fields sliced at fixed offsets."""
+
+    line_re: re.Pattern
+    search = False
+    word_groups: tuple[int, ...] = ()  # groups matched by [A-Z]/[a-z] classes (e.g. month names)
+
+    def __init__(self):
+        self._bulk_re = re.compile('^' + self.line_re.pattern, re.MULTILINE)
+        self._layouts: list[tuple[np.ndarray, np.ndarray, list[tuple[int, int]]]] = []
+
+    def __call__(self, line: str):
+        m = self.line_re.search(line, 0, 70) if self.search else self.line_re.match(line)
+        if not m:
+            return None
+        try:
+            return self._to_datetime(m.groups())
+        except ValueError:
+            return None
+
+    def learn_layouts(self, lines: list[str]):
+        """Record the character-class signature of up to _MAX_LAYOUTS distinct prefixes the parser
+        accepts. A line with the same signature and an allowed next character is matched by
+        `line_re` with the same group spans, so it can be sliced without running the regex."""
+        if self.search:
+            return
+        layouts: dict[tuple, list[tuple[int, int]]] = {}
+        for line in lines:
+            m = self.line_re.match(line)
+            if not m or self(line) is None:
+                continue
+            end = m.end()
+            if end < len(line) and not (ord(line[end]) < 128 and _LAYOUT_BOUNDARY[ord(line[end])]):
+                continue
+            ranges = [(48, 57) if "0" <= ch <= "9" else (ord(ch), ord(ch)) for ch in line[:end]]
+            for g in self.word_groups:
+                s, e = m.span(g + 1)
+                for k in range(s, e):
+                    ranges[k] = (65, 90) if line[k].isupper() else (97, 122)
+            layouts.setdefault(tuple(ranges), [m.span(g) for g in range(1, len(m.groups()) + 1)])
+            if len(layouts) == _MAX_LAYOUTS:
+                break
+        self._layouts = [
+            (np.array([lo for lo, _ in key], dtype=np.uint32), np.array([hi for _, hi in key], dtype=np.uint32), spans)
+            for key, spans in layouts.items()
+        ]
+
+    def many(self, lines: list[str], text: str, starts: np.ndarray):
+        """Indices of the lines in a chunk that the fast parser accepts, and their epoch seconds
+        (identical to __call__(line).timestamp()). Lines not returned may still be accepted by
+        __call__; `text`/`starts` are the chunk joined with '\n' and the line offsets."""
+        if self._layouts:
+            return self._many_fixed(lines)
+        if self.search:
+            return self._many_search(text, starts)
+        found = list(self._bulk_re.finditer(text))
+        if not found:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+        pos = np.fromiter((m.start() for m in found), dtype=np.int64, count=len(found))
+        idx = np.searchsorted(starts, pos, side="right") - 1
+        valid, seconds = self._to_epoch(_RegexFields(np.array([m.groups("") for m in found])))
+        # A line containing an embedded newline can produce a match that is not at its start.
+        valid &= starts[idx] == pos
+        return idx[valid], seconds[valid]
+
+    def _many_search(self, text: str, starts: np.ndarray):
+        # Only used for fixed-width patterns: the regex just locates matches, fields are sliced.
+        pos = np.fromiter((m.start() for m in self.line_re.finditer(text)), dtype=np.int64)
+        if not pos.size:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+        idx = np.searchsorted(starts, pos, side="right") - 1
+        # Keep the leftmost match per line, and only if it ends within the line's first 70 chars
+        idx, first = np.unique(idx, return_index=True)
+        pos = pos[first]
+        m = self.line_re.match(text, int(pos[0]))
+        width = m.end() - m.start()
+        spans = [(s - m.start(), e - m.start()) for s, e in (m.span(g) for g in range(1, len(m.groups()) + 1))]
+        keep = pos + width - starts[idx] <= 70
+        idx, pos = idx[keep], pos[keep]
+        codes = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32)
+        valid, seconds = self._to_epoch(_LayoutFields(codes[pos[:, None] + np.arange(width)], spans))
+        return idx[valid], seconds[valid]
+
+    def _many_fixed(self, lines: list[str]):
+        width = max(len(lo) for lo, _, _ in self._layouts) + 1
+        codes = np.array(lines, dtype=f"U{width}").view(np.uint32).reshape(len(lines), width)
+        claimed = np.zeros(len(lines), dtype=bool)
+        idx_parts, sec_parts = [], []
+        for lo, hi, spans in self._layouts:
+            end = len(lo)
+            head = codes[:, :end]
+            nxt = codes[:, end]
+            ok = ~claimed & ((head >= lo) & (head <= hi)).all(axis=1)
+            ok &= (nxt < 128) & _LAYOUT_BOUNDARY[np.minimum(nxt, 127)]
+            rows = np.flatnonzero(ok)
+            if rows.size == 0:
+                continue
+            valid, seconds = self._to_epoch(_LayoutFields(codes[rows], spans))
+            claimed[rows[valid]] = True
+            idx_parts.append(rows[valid])
+            sec_parts.append(seconds[valid])
+        if not idx_parts:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+        return np.concatenate(idx_parts), np.concatenate(sec_parts)
+
+    def _to_datetime(self, groups):
+        raise NotImplementedError
+
+    def _to_epoch(self, fields: _RegexFields):
+        """(valid mask, epoch seconds) for every row of `fields`."""
+        raise NotImplementedError
+
+
+def _month_numbers(names: np.ndarray) -> np.ndarray:
+    """Month number (0 if unknown) for an array of 3-letter month names."""
+    uniq, inverse = np.unique(names, return_inverse=True)
+    return np.array([_MONTHS.get(str(n), 0) for n in uniq], dtype=np.int64)[inverse]
+
+
+class _EpochFormat(_TimestampFormat):
+    line_re = re.compile(r'(\d{10})\b')
+
+    def _to_datetime(self, groups):
+        return datetime.fromtimestamp(int(groups[0]))
+
+    def _to_epoch(self, fields):
+        # fromtimestamp(x).timestamp() round-trips exactly
+        return np.ones(len(fields), dtype=bool), fields.int(0).astype(np.float64)
+
+
+class _ApacheFormat(_TimestampFormat):
+    line_re = re.compile(
+        r'\[(\d{2})/([A-Z][a-z]{2})/(\d{4}):(\d{2}):(\d{2}):(\d{2}) ([+-])(\d{2})(\d{2})\]')
+    search = True
+
+    def __init__(self):
+        super().__init__()
+        self._tz_cache: dict[tuple, timezone] = {}
+
+    def _to_datetime(self, groups):
+        day, mon, year, hh, mm, ss, sign, off_h, off_m = groups
+        month = _MONTHS.get(mon)
+        if month is None:
+            return None
+        key = (sign, off_h, off_m)
+        tz = self._tz_cache.get(key)
+        if tz is None:
+            delta = timedelta(hours=int(off_h), minutes=int(off_m))
+            tz = self._tz_cache[key] = timezone(-delta if sign == "-" else delta)
+        return datetime(int(year), month, int(day), int(hh), int(mm), int(ss), tzinfo=tz)
+
+    def _to_epoch(self, fields):
+        m = _month_numbers(fields.str(1))
+        d, y, hh, mm, ss, off_h, off_m = (fields.int(i) for i in (0, 2, 3, 4, 5, 7, 8))
+        offset = np.where(fields.str(6) == "-", -1, 1) * (off_h * 3600 + off_m * 60)
+        # timezone() only accepts offsets strictly within one day
+        valid = _valid_civil(y, m, d, hh, mm, ss) & (np.abs(offset) < 86400)
+        return valid, _epoch_seconds(valid, y, m, d, hh, mm, ss, 0, utc_offset=offset)
+
+
+class _SyslogFormat(_TimestampFormat):
+    line_re = re.compile(r'([A-Z][a-z]{2}) {1,2}(\d{1,2}) (\d{2}):(\d{2}):(\d{2})(?![\d:])')
+    word_groups = (0,)
+
+    def __init__(self):
+        super().__init__()
+        # dateutil fills the missing year from today's date; resolve it once per stream.
+        self.year = datetime.now().year
+
+    def _to_datetime(self, groups):
+        mon, day, hh, mm, ss = groups
+        month = _MONTHS.get(mon)
+        if month is None:
+            return None
+        return datetime(self.year, month, int(day), int(hh), int(mm), int(ss))
+
+    def _to_epoch(self, fields):
+        m = _month_numbers(fields.str(0))
+        d, hh, mm, ss = (fields.int(i) for i in (1, 2, 3, 4))
+        y = np.full(len(fields), self.year, dtype=np.int64)
+        valid = _valid_civil(y, m, d, hh, mm, ss)
+        return valid, _epoch_seconds(valid, y, m, d, hh, mm, ss, 0)
+
+
+class _IsoFormat(_TimestampFormat):
+    line_re = re.compile(
+        r'(\d{2,4}[./-]\d{2}[./-]\d{2,4})[ T](\d{2}):(\d{2}):(\d{2})(?:\.(\d+))?(Z)?(?![\d.:])')
+
+    def __init__(self):
+        super().__init__()
+        # Day/month/year order of slash and dot dates is ambiguous; let dateutil resolve each
+        # distinct date string once and memoize it, then build the time part from integer fields.
+        self._date_cache: dict[str, object] = {}
+
+    def _date(self, date_str: str):
+        day = self._date_cache.get(date_str)
+        if day is None:
+            try:
+                day = parser.parse(date_str).date()
+            except (ValueError, OverflowError):
+                day = False
+            self._date_cache[date_str] = day
+        return day
+
+    def _to_datetime(self, groups):
+        date_str, hh, mm, ss, frac, zulu = groups
+        day = self._date(date_str)
+        if day is False:
+            return None
+        micro = int(frac[:6].ljust(6, "0")) if frac else 0
+        return datetime(day.year, day.month, day.day, int(hh), int(mm), int(ss), micro,
+                        tzinfo=timezone.utc if zulu else None)
+
+    def _to_epoch(self, fields):
+        dates, inverse = np.unique(fields.str(0), return_inverse=True)
+        ymd = np.array([
+            (day.year, day.month, day.day) if day else (0, 0, 0)
+            for day in map(self._date, map(str, dates))
+        ], dtype=np.int64).reshape(-1, 3)[inverse]
+        y, m, d = ymd[:, 0], ymd[:, 1], ymd[:, 2]
+        hh, mm, ss = (fields.int(i) for i in (1, 2, 3))
+        micro = fields.int(4, width=6)
+        valid = (y > 0) & _valid_civil(y, m, d, hh, mm, ss)
+        zulu = fields.str(5) == "Z"
+        seconds = _epoch_seconds(valid & ~zulu, y, m, d, hh, mm, ss, micro)
+        if zulu.any():
+            seconds = np.where(zulu, _epoch_seconds(valid & zulu, y, m, d, hh, mm, ss, micro, utc_offset=0), seconds)
+        return valid, seconds
+
+
+class _CompactFormat(_TimestampFormat):
+    line_re = re.compile(r'(\d{4})(\d{2})(\d{2})(\d{2})(\d{2})(\d{2})\b')
+
+    def _to_datetime(self, groups):
+        return datetime(*map(int, groups))
+
+    def _to_epoch(self, fields):
+        y, m, d, hh, mm, ss = (fields.int(i) for i in range(6))
+        valid = _valid_civil(y, m, d, hh, mm, ss)
+        return valid, _epoch_seconds(valid, y, m, d, hh, mm, ss, 0)
+
+
+# Format name -> fast parser class (instances return datetime or None on a miss)
+TIMESTAMP_FORMATS = {
+    "epoch": _EpochFormat,
+    "apache": _ApacheFormat,
+    "syslog": _SyslogFormat,
+    "iso": _IsoFormat,
+    "compact": _CompactFormat,
+}
+
+
+def detect_timestamp_format(lines: list[str], reference: list | None = None) -> str | None:
+    """Pick the known format whose fast parser agrees with extract_timestamp_robust on a sample.
+    A format is rejected if it disagrees on any sampled line; the one with most hits wins."""
+    if reference is None:
+        reference = [extract_timestamp_robust(line) for line in lines]
+    best_name, best_hits = None, 0
+    for name, factory in TIMESTAMP_FORMATS.items():
+        fast = factory()
+        hits = 0
+        for line, expected in zip(lines, reference):
+            ts = fast(line)
+            if ts is None:
+                continue
+            if ts != expected:
+                hits = 0
+                break
+            hits += 1
+        if hits > best_hits:
+            best_name, best_hits = name, hits
+    return best_name
+
+
+class TimestampExtractor:
+    """Per-stream timestamp extraction: the first `sample_size` lines go through
+    extract_timestamp_robust and are used to detect the file's format; afterwards a
+    compiled fast parser is used and the robust path runs only when it misses."""
+
+    def __init__(self, sample_size: int = 64):
+        self.sample_size = sample_size
+        self.format: str | None = None
+        self._fast = None
+        self._sample_lines: list[str] | None = []
+        self._sample_ts: list = []
+
+    def __call__(self, line: str):
+        fast = self._fast
+        if fast is not None:
+            ts = fast(line)
+            return ts if ts is not None else extract_timestamp_robust(line)
+        ts = extract_timestamp_robust(line)
+        if self._sample_lines is not None:
+            self._sample_lines.append(line)
+            self._sample_ts.append(ts)
+            if len(self._sample_lines) >= self.sample_size:
+                self._bind()
+        return ts
+
+    def _bind(self):
+        self.format = detect_timestamp_format(self._sample_lines, self._sample_ts)
+        if self.format is not None:
+            self._fast = TIMESTAMP_FORMATS[self.format]()
+            self._fast.learn_layouts(self._sample_lines)
+        self._sample_lines = None
+        self._sample_ts = []
+
+    def extract_many(self, lines: list[str], text: str | None = None, starts: np.ndarray | None = None) -> np.ndarray:
+        """Epoch seconds (float64, NaN where no timestamp) for a chunk of lines; same values as
+        calling the extractor per line. `text`/`starts` are the '\n'-joined chunk and line offsets
+        when the caller already has them."""
+        n = len(lines)
+        out = np.full(n, np.nan, dtype=np.float64)
+        i = 0
+        while i < n and self._sample_lines is not None:
+            out[i] = _epoch_or_nan(self(lines[i]))
+            i += 1
+        if i == n:
+            return out
+        if self._fast is None:
+            out[i:] = [_epoch_or_nan(extract_timestamp_robust(line)) for line in lines[i:]]
+            return out
+        if text is None:
+            text, starts = _join_lines(lines)
+        idx, seconds = self._fast.many(lines, text, starts)
+        keep = idx >= i
+        out[idx[keep]] = seconds[keep]
+        rest = np.ones(n, dtype=bool)
+        rest[:i] = False
+        rest[idx[keep]] = False
+        for j in np.flatnonzero(rest):
+            out[j] = _epoch_or_nan(self(lines[j]))
+        return out
+
+
+def _epoch_or_nan(ts) -> float:
+    return ts.timestamp() if ts is not None else np.nan
+
+
+def _join_lines(lines: list[str]):
+    """Join a chunk with '\n' and return it with the start offset of every line."""
+    lengths = np.fromiter(map(len, lines), dtype=np.int64, count=len(lines))
+    starts = np.zeros(len(lines), dtype=np.int64)
+    np.cumsum(lengths[:-1] + 1, out=starts[1:])
+    return "\n".join(lines), starts
+
+
+# Checked in this order; the first keyword found in the line decides its score.
+_SEVERITY_KEYWORDS = (("FATAL", 5.0), ("ERROR", 3.0), ("WARN", 1.0), ("EXCEPTION", 3.5), ("FAIL", 3.0))
+_SEVERITY_PATTERNS = [re.compile(word) for word, _ in _SEVERITY_KEYWORDS]
+_SEVERITY_BY_RANK = np.array([score for _, score in _SEVERITY_KEYWORDS] + [0.0], dtype=np.float64)
+
+
 def get_severity_score(line: str) -> float:
     """Keyword-based severity: FATAL=5, ERROR/FAIL=3, EXCEPTION=3.5, WARN=1; else 0."""
     line_up = line.upper()
-    scores = {"FATAL": 5.0, "ERROR": 3.0, "WARN": 1.0, "EXCEPTION": 3.5, "FAIL": 3.0}
-    for word, score in scores.items():
+    for word, score in _SEVERITY_KEYWORDS:
         if word in line_up:
             return score
     return 0.0
 
 
+def severity_scores(lines: list[str], text: str | None = None, starts: np.ndarray | None = None) -> np.ndarray:
+    """get_severity_score for a chunk of lines: one literal scan per keyword over the upper-cased chunk."""
+    n = len(lines)
+    if text is None:
+        text, starts = _join_lines(lines)
+    upper = text.upper()
+    if len(upper) != len(text):
+        # Some characters expand when upper-cased, so offsets no longer line up
+        return np.array([get_severity_score(line) for line in lines], dtype=np.float64)
+    rank = np.full(n, len(_SEVERITY_KEYWORDS), dtype=np.int64)
+    # Lowest-priority keyword first so that higher-priority hits on the same line overwrite it
+    for r in range(len(_SEVERITY_PATTERNS) - 1, -1, -1):
+        pos = np.fromiter((m.start() for m in _SEVERITY_PATTERNS[r].finditer(upper)), dtype=np.int64)
+        if pos.size:
+            rank[np.searchsorted(starts, pos, side="right") - 1] = r
+    return _SEVERITY_BY_RANK[rank]
+
+
+def extract_line_features(lines: list[str], extract_ts: TimestampExtractor):
+    """Severity, length and epoch-timestamp columns (float64) for a chunk of lines."""
+    text, starts = _join_lines(lines)
+    lengths = np.fromiter(map(len, lines), dtype=np.float64, count=len(lines))
+    return severity_scores(lines, text, starts), lengths, extract_ts.extract_many(lines, text, starts)
+
+
+# A timestamp at the start of a line (the formats of extract_timestamp_robust, optionally bracketed
+# and with fractions and a zone); RepeatCollapser compares what follows it
+_LEADING_TIMESTAMP_RE = re.compile(
+    r"\[?(?:\d{10}(?:\.\d+)?|\d{14}"
+    r"|\d{2,4}[./-](?:\d{2}|[A-Z][a-z]{2})[./-]\d{2,4}(?:[ T:]\d{2}:\d{2}:\d{2}(?:[.,]\d+)?)?"
+    r"|[A-Z][a-z]{2}[ \t]+\d{1,2}[ \t]+\d{2}:\d{2}:\d{2}|\d{2}:\d{2}:\d{2}(?:[.,]\d+)?)"
+    r"(?:[ ]?(?:Z|[+-]\d{2}:?\d{2}))?\]?"
+)
+_DELETE_DIGITS = str.maketrans("", "", "0123456789")
+
+
+class RepeatCollapser:
+    """Run-length collapse of a stream's consecutive lines that are identical apart from their
+    leading timestamp (e.g. the same retry error thousands of times in a row); a run can continue
+    across batches. Each run becomes one record [first line, last line, count].
+
+    A line can only continue a run when it equals the line before it once digits are removed: one
+    str.translate over the joined batch and a NumPy object-array comparison, so lines that do not
+    repeat cost no Python work per line. A candidate then continues the run when it has the length
+    of the run's first line and the same text after that line's timestamp (one regex match per run)."""
+
+    def __init__(self):
+        # [first line, last line, count, text after the first line's timestamp, digit-free first line]
+        self._open: list | None = None
+
+    @staticmethod
+    def _after_timestamp(line: str) -> str:
+        m = _LEADING_TIMESTAMP_RE.match(line)
+        return line[m.end():] if m else line
+
+    def collapse(self, batch: list[str]) -> list[list]:
+        """Records of the runs that `batch` closes; its last run stays open for the next batch."""
+        n = len(batch)
+        if n == 0:
+            return []
+        joined = "\n".join(batch)
+        if joined.count("\n") == n - 1:
+            skeleton = np.array(joined.translate(_DELETE_DIGITS).split("\n"), dtype=object)
+        else:
+            # A line with its own newline would split into several
+            skeleton = np.array([line.translate(_DELETE_DIGITS) for line in batch], dtype=object)
+        starts = np.ones(n, dtype=bool)   # lines that begin a run
+        head, tail = None, None           # the current run's first line (-1 = the open run) and its text after the timestamp
+        opened = self._open
+        if opened is not None and skeleton[0] == opened[4] and len(batch[0]) == len(opened[0]) \
+                and batch[0].endswith(opened[3]):
+            starts[0] = False
+            head, tail = -1, opened[3]
+        for i in (np.flatnonzero(skeleton[1:] == skeleton[:-1]) + 1).tolist():
+            if starts[i - 1] and head != i - 1:
+                head, tail = i - 1, self._after_timestamp(batch[i - 1])
+            line = batch[i]
+            if len(line) == len(opened[0] if head == -1 else batch[head]) and line.endswith(tail):
+                starts[i] = False
+            else:
+                head, tail = i, self._after_timestamp(line)
+
+        bounds = np.flatnonzero(starts).tolist()
+        runs = []
+        if opened is not None:
+            if not starts[0]:
+                end = bounds[0] if bounds else n
+                opened[1] = batch[end - 1]
+                opened[2] += end
+                if not bounds:
+                    return []
+            runs.append(opened[:3])
+        runs.extend([batch[s], batch[e - 1], e - s] for s, e in zip(bounds, bounds[1:] + [n]))
+        last = bounds[-1]
+        self._open = runs.pop() + [tail if head == last else self._after_timestamp(batch[last]), skeleton[last]]
+        return runs
+
+    def finish(self) -> list[list]:
+        """The open run, at the end of the stream."""
+        runs = [self._open[:3]] if self._open is not None else []
+        self._open = None
+        return runs
+
+
+class TemplateTable:
+    """Interned (cluster_id, template) pairs mined so far. Every line stores only the int32 key of
+    its pair; template text and one example line live here once per template."""
+
+    def __init__(self):
+        self._key_of: dict[tuple, int] = {}
+        self._template_index: dict[str, int] = {}
+        self.templates: list[str] = []          # template index -> template text
+        self.examples: dict[str, str] = {}      # template text -> first raw line with it
+        self.cluster_of_key: list[int] = []     # key -> Drain3 cluster id
+        self.template_of_key: list[int] = []    # key -> template index
+
+    def __len__(self):
+        return len(self.cluster_of_key)
+
+    def key(self, cluster_id: int, template: str, line: str) -> int:
+        """Key of a mined (cluster_id, template) pair; records `line` as example for a new template."""
+        k = self._key_of.get((cluster_id, template))
+        if k is None:
+            t = self._template_index.get(template)
+            if t is None:
+                t = self._template_index[template] = len(self.templates)
+                self.templates.append(template)
+                self.examples[template] = line
+            k = self._key_of[(cluster_id, template)] = len(self.cluster_of_key)
+            self.cluster_of_key.append(cluster_id)
+            self.template_of_key.append(t)
+        return k
+
+
+class LineColumns:
+    """Per-line columns in growable preallocated NumPy buffers (20 bytes per line): float64 epoch
+    timestamp, int32 TemplateTable key, float32 severity and float32 length. Capacity grows 1.5x
+    when full (one column reallocated at a time), so appends are amortized O(1), slack stays
+    bounded and no per-line Python objects are kept.
+
+    repeats: also keep, per record of collapsed repeats (see RepeatCollapser), the float64 epoch
+    timestamp of its last line and its int32 line count (`last_ts` and `count` are None otherwise).
+    spill: once more than spill.config.max_memory_lines lines are appended, the columns move to
+    files in its scratch directory; later appends are written to the files and the column
+    properties are read-only np.memmap views of them."""
+
+    _COLUMNS = (("_ts", np.float64), ("_key", np.int32), ("_severity", np.float32), ("_length", np.float32))
+    _REPEAT_COLUMNS = (("_last_ts", np.float64), ("_count", np.int32))
+
+    def __init__(self, capacity: int = FEATURE_CHUNK_SIZE, spill: SpillFiles | None = None, repeats: bool = False):
+        self.n = 0
+        self.repeats = repeats
+        self._columns = self._COLUMNS + (self._REPEAT_COLUMNS if repeats else ())
+        for name, dtype in self._columns:
+            setattr(self, name, np.empty(capacity, dtype=dtype))
+        self._spill = spill
+        self._files = None      # column name -> open scratch file, once spilled
+        self._mapped = None     # column name -> np.memmap of the first n lines
+
+    def __len__(self):
+        return self.n
+
+    @property
+    def spilled(self) -> bool:
+        return self._files is not None
+
+    def append(self, ts: np.ndarray, key: np.ndarray, severity: np.ndarray, length: np.ndarray,
+               last_ts: np.ndarray | None = None, count: np.ndarray | None = None):
+        """Append a chunk of records; last_ts and count are required (only) with `repeats`."""
+        end = self.n + len(key)
+        values = (ts, key, severity, length) + ((last_ts, count) if self.repeats else ())
+        if self._files is None and self._spill is not None and end > self._spill.config.max_memory_lines:
+            self._spill_columns()
+        if self._files is not None:
+            for (name, dtype), column in zip(self._columns, values):
+                self._files[name].write(np.ascontiguousarray(column, dtype=dtype))
+            self._mapped = None
+            self.n = end
+            return
+        if end > len(self._key):
+            capacity = max(end, len(self._key) * 3 // 2)
+            for name, _ in self._columns:
+                old = getattr(self, name)
+                grown = np.empty(capacity, dtype=old.dtype)
+                grown[:self.n] = old[:self.n]
+                setattr(self, name, grown)
+        for (name, _), column in zip(self._columns, values):
+            getattr(self, name)[self.n:end] = column
+        self.n = end
+
+    def _spill_columns(self):
+        """Write the lines so far to one scratch file per column and free the buffers."""
+        self._files = {}
+        for name, _ in self._columns:
+            f = self._files[name] = self._spill.open(f"column{name}")
+            f.write(getattr(self, name)[:self.n])
+            setattr(self, name, None)
+
+    def _column(self, name: str) -> np.ndarray:
+        if self._files is None:
+            return getattr(self, name)[:self.n]
+        if self._mapped is None:
+            self._mapped = {}
+            for column, dtype in self._columns:
+                self._files[column].flush()
+                self._mapped[column] = np.memmap(self._files[column].name, dtype=dtype, mode="r", shape=(self.n,))
+        return self._mapped[name]
+
+    @property
+    def ts(self) -> np.ndarray:
+        return self._column("_ts")
+
+    @property
+    def key(self) -> np.ndarray:
+        return self._column("_key")
+
+    @property
+    def severity(self) -> np.ndarray:
+        return self._column("_severity")
+
+    @property
+    def length(self) -> np.ndarray:
+        return self._column("_length")
+
+    @property
+    def last_ts(self) -> np.ndarray | None:
+        return self._column("_last_ts") if self.repeats else None
+
+    @property
+    def count(self) -> np.ndarray | None:
+        return self._column("_count") if self.repeats else None
+
+    @property
+    def lines(self) -> int:
+        """Lines stored: the sum of the counts of collapsed records, else one per record."""
+        return int(np.sum(self.count, dtype=np.int64)) if self.repeats else self.n
+
+
+def aggregate_incidents(scores: np.ndarray, severity: np.ndarray, keys: np.ndarray,
+                        table: TemplateTable, anomaly_threshold: float, counts: np.ndarray | None = None) -> list[dict]:
+    """Flag lines (score < threshold or severity >= 3) and aggregate them into one incident per
+    template: occurrences, avg of 4-decimal rounded scores, severity and example of the
+    lowest-scoring line. Array operations over template keys; no per-line dicts.
+    counts: lines per row (collapsed repeats); occurrences and average scores count every line."""
+    flagged = np.flatnonzero((scores < anomaly_threshold) | (severity >= 3.0))
+    if flagged.size == 0:
+        return []
+
+    # Templates are grouped by stripped text; map every key to its group once.
+    group_of_text: dict[str, int] = {}
+    texts: list[str] = []
+    group_of_template = np.empty(len(table.templates), dtype=np.int64)
+    for t, template in enumerate(table.templates):
+        text = template.strip() if isinstance(template, str) else str(template).strip()
+        g = group_of_text.get(text)
+        if g is None:
+            g = group_of_text[text] = len(texts)
+            texts.append(text)
+        group_of_template[t] = g
+    group_of_key = group_of_template[np.asarray(table.template_of_key, dtype=np.int64)]
+
+    # Python round() (not np.round) so values match the per-line implementation bit for bit.
+    rounded = np.array([round(s, 4) for s in scores[flagged].tolist()], dtype=np.float64)
+    order = np.argsort(rounded, kind="stable")  # ties stay in line order
+    flagged, rounded = flagged[order], rounded[order]
+    group = group_of_key[keys[flagged]]
+
+    rows = np.bincount(group, minlength=len(texts))
+    # Incidents are created in order of each template's lowest-scoring flagged line.
+    present, first = np.unique(group, return_index=True)
+    appearance = np.argsort(first)
+    # Stable sort by group keeps each group's scores in ascending order; sum() over each
+    # contiguous segment reproduces the float accumulation of the per-line implementation.
+    by_group_order = np.argsort(group, kind="stable")
+    by_group = rounded[by_group_order]
+    ends = np.cumsum(rows)
+    occurrences = rows
+    if counts is not None:
+        weight = np.asarray(counts, dtype=np.int64)[flagged]
+        occurrences = np.bincount(group, weights=weight, minlength=len(texts)).astype(np.int64)
+        by_group = by_group * weight[by_group_order]
+
+    final_incidents = []
+    for j in appearance:
+        g = present[j]
+        count = int(rows[g])
+        score_sum = sum(by_group[ends[g] - count:ends[g]].tolist())
+        lines = int(occurrences[g])
+        text = texts[g]
+        final_incidents.append({
+            "incident_template": text,
+            "occurrences": lines,
+            "avg_score": round(score_sum / lines, 4),
+            "severity": float(severity[flagged[first[j]]]),
+            "example_log": table.examples.get(text, ""),
+        })
+
+    return sorted(final_incidents, key=lambda x: (x['severity'], x['occurrences']), reverse=True)
+
+
+class StageTimer:
+    """Wall time, calls, lines and bytes per named pipeline stage, accumulated over one job.
+    Stages are timed around chunks and whole steps, never per line, so an enabled timer costs a
+    few perf_counter calls per chunk; functions default to NULL_TIMER, which records nothing."""
+
+    def __init__(self):
+        self.stages: dict[str, dict] = {}
+
+    @contextmanager
+    def stage(self, name: str, lines: int = 0, nbytes: int = 0):
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, perf_counter() - start, lines, nbytes)
+
+    def add(self, name: str, seconds: float, lines: int = 0, nbytes: int = 0):
+        s = self.stages.get(name)
+        if s is None:
+            s = self.stages[name] = {"seconds": 0.0, "calls": 0, "lines": 0, "bytes": 0}
+        s["seconds"] += seconds
+        s["calls"] += 1
+        s["lines"] += lines
+        s["bytes"] += nbytes
+
+    def merge(self, stages: dict):
+        """Add the stages of another timer (e.g. returned by a pool process)."""
+        for name, other in stages.items():
+            s = self.stages.setdefault(name, {"seconds": 0.0, "calls": 0, "lines": 0, "bytes": 0})
+            for field in s:
+                s[field] += other[field]
+
+
+class _NullTimer:
+    _context = nullcontext()
+
+    def stage(self, name: str, lines: int = 0, nbytes: int = 0):
+        return self._context
+
+    def add(self, name: str, seconds: float, lines: int = 0, nbytes: int = 0):
+        pass
+
+    def merge(self, stages: dict):
+        pass
+
+
+NULL_TIMER = _NullTimer()
+
+
+class LineBatches:
+    """Log lines delivered in batches (list[str] per batch, already decoded and stripped), e.g. by a
+    bulk reader that splits multi-MB chunks of a file at once. analyze_log consumes the batches
+    without a per-line generator or a second strip."""
+
+    def __init__(self, batches):
+        self.batches = batches
+
+    def __iter__(self):
+        return iter(self.batches)
+
+
 def _iter_lines(source: LogLinesSource):
-    """Yield stripped lines from list[str] or file-like object (e.g. open file, NamedTemporaryFile)."""
+    """Stripped lines from list[str] or file-like object (e.g. open file, NamedTemporaryFile)."""
     if hasattr(source, "readline"):
-        for line in source:
-            if isinstance(line, bytes):
-                line = line.decode("utf-8", errors="replace")
-            yield line.rstrip("\n")
-    else:
-        for line in source:
-            yield line.strip() if isinstance(line, str) else line
+        return (
+            (line.decode("utf-8", errors="replace") if isinstance(line, bytes) else line).strip()
+            for line in source
+        )
+    return (line.strip() if isinstance(line, str) else line for line in source)
 
 
-def analyze_log(log_lines: LogLinesSource, window_size: int = 3):
-    """Run log anomaly pipeline: Drain3 templates, features, Isolation Forest, aggregate by template.
-    log_lines: list of strings or file-like (read line by line). No DataFrame: only numpy arrays
-    (numeric features) and one example raw line per template to avoid filling RAM.
+def _iter_batches(source: LogLinesSource):
+    """Stripped lines in lists of at most FEATURE_CHUNK_SIZE (LineBatches are passed through,
+    split only if larger)."""
+    size = FEATURE_CHUNK_SIZE
+    if isinstance(source, LineBatches):
+        for batch in source:
+            if len(batch) <= size:
+                yield batch
+            else:
+                for i in range(0, len(batch), size):
+                    yield batch[i:i + size]
+        return
+    lines = _iter_lines(source)
+    while batch := list(islice(lines, size)):
+        yield batch
 
-    Memory note: For very large logs (e.g. millions of lines), ts_list and template_list still
-    grow in RAM (datetime/str per line). For production at that scale, consider pre-allocated
-    numpy arrays or streaming aggregation; for typical/CV use this is acceptable.
-    """
-    miner = TemplateMiner(config=TemplateMinerConfig())
-    example_by_template: dict[str, str] = {}
-
-    # 1. Stream lines: use array.array for numeric columns (lighter than list); ts/template stay list
-    ts_list: list = []
-    severity_list = array.array("d")
-    len_list = array.array("d")
-    cluster_id_list: list = []
-    template_list: list = []
-
-    for line in _iter_lines(log_lines):
-        line_stripped = line.strip() if isinstance(line, str) else line
-        ts = extract_timestamp_robust(line_stripped)
-        result = miner.add_log_message(line_stripped)
-        template = result["template_mined"]
-        cluster_id = result["cluster_id"]
-        if template not in example_by_template:
-            example_by_template[template] = line_stripped
-        ts_list.append(ts)
-        severity_list.append(get_severity_score(line_stripped))
-        len_list.append(len(line_stripped))
-        cluster_id_list.append(cluster_id)
-        template_list.append(template)
-
-    n = len(severity_list)
-    if n < 10:
+
+class ReservoirSampler:
+    """Uniform random sample of up to `size` positions from a stream of unknown length
+    (Algorithm L). Fed one chunk at a time; only the positions that enter the reservoir
+    cost Python work, so the overhead per streamed line is O(1) NumPy."""
+
+    def __init__(self, size: int, seed: int = 42):
+        self.size = size
+        self.seen = 0
+        self.indices = np.empty(size, dtype=np.int64)
+        self._rng = np.random.default_rng(seed)
+        self._log_w = math.log(self._rng.random()) / size
+        self._next = size + self._skip()
+
+    def _skip(self) -> int:
+        return int(math.log(self._rng.random()) / math.log1p(-math.exp(self._log_w)))
+
+    def add(self, count: int) -> tuple[np.ndarray, np.ndarray]:
+        """Account for the next `count` stream positions. Returns (slots, offsets): the reservoir
+        slots that were (re)filled and the offsets within this chunk that now occupy them."""
+        start, end = self.seen, self.seen + count
+        fill = max(0, min(self.size, end) - start)
+        positions = []
+        log_w, nxt, size = self._log_w, self._next, self.size
+        log, log1p, exp = math.log, math.log1p, math.exp
+        # Random draws are taken in batches; each accepted position uses two of them
+        draws, used = self._rng.random(1024), 0
+        while nxt < end:
+            if used + 2 > len(draws):
+                draws, used = self._rng.random(1024), 0
+            positions.append(nxt)
+            log_w += log(draws[used]) / size
+            nxt += 1 + int(log(draws[used + 1]) / log1p(-exp(log_w)))
+            used += 2
+        self._log_w, self._next, self.seen = log_w, nxt, end
+        replaced = np.asarray(positions, dtype=np.int64) - start
+        slots = np.concatenate((np.arange(start, start + fill), self._rng.integers(size, size=len(replaced))))
+        offsets = np.concatenate((np.arange(fill), replaced))
+        # A slot filled or replaced more than once within this chunk keeps its last occupant
+        last = len(slots) - 1 - np.unique(slots[::-1], return_index=True)[1]
+        slots, offsets = slots[last], offsets[last]
+        self.indices[slots] = offsets + start
+        return slots, offsets
+
+    def sample(self) -> np.ndarray:
+        """Sorted stream positions currently in the reservoir."""
+        return np.sort(self.indices[:min(self.size, self.seen)])
+
+
+def score_in_blocks(model: IsolationForest, X: np.ndarray, n_jobs: int = 1, block_size: int = 262_144,
+                    out: np.ndarray | None = None) -> np.ndarray:
+    """decision_function over row blocks scored by a thread pool (tree traversal releases the GIL).
+    Scores are per row, so the result equals model.decision_function(X).
+    out: an array (e.g. a scratch np.memmap) each block's scores are written to; returned instead
+    of a new array, so X can be a memmap scored without holding all scores in memory."""
+    if n_jobs == -1:
+        n_jobs = os.cpu_count() or 1
+    if out is not None:
+        def score_block(i: int):
+            out[i:i + block_size] = model.decision_function(X[i:i + block_size])
+
+        starts = range(0, len(X), block_size)
+        if n_jobs <= 1:
+            for i in starts:
+                score_block(i)
+        else:
+            with ThreadPoolExecutor(max_workers=n_jobs) as pool:
+                list(pool.map(score_block, starts))
+        return out
+    if n_jobs <= 1 or len(X) <= block_size:
+        return model.decision_function(X)
+    blocks = [X[i:i + block_size] for i in range(0, len(X), block_size)]
+    with ThreadPoolExecutor(max_workers=n_jobs) as pool:
+        return np.concatenate(list(pool.map(model.decision_function, blocks)))
+
+
+def _unique_rows(X: np.ndarray):
+    """np.unique(X, axis=0, return_inverse=True, return_counts=True), but sorting each row as one
+    opaque byte string (much faster than the lexicographic axis=0 path)."""
+    X = np.ascontiguousarray(X)
+    rows = X.view(np.dtype((np.void, X.dtype.itemsize * X.shape[1]))).ravel()
+    _, first, inverse, counts = np.unique(rows, return_index=True, return_inverse=True, return_counts=True)
+    return X[first], inverse.ravel(), counts
+
+
+def fit_score_deduplicated(model: IsolationForest, X: np.ndarray, decimals: int | None = None,
+                           fit_rows: np.ndarray | None = None, n_jobs: int = 1,
+                           timer: StageTimer = NULL_TIMER) -> np.ndarray:
+    """Fit `model` on the distinct rows of X (or of X[fit_rows]) weighted by their multiplicity
+    and score only the distinct rows of X; every line gets the score of its row. With `decimals`,
+    rows are first rounded so that near-identical rows (e.g. lengths differing by a few chars)
+    collapse too.
+
+    Tolerance: scores are not bit-identical to fitting on all rows, because sklearn draws each
+    tree's subsample from the distinct rows (weighted, without replacement) instead of from every
+    line. On 20k-line generator logs the mean absolute score difference is ~0.013 (max ~0.07),
+    the same order as changing the full fit's random_state; high-severity incidents are
+    unaffected and borderline ML-only templates may appear or drop out."""
+    with timer.stage("fit", len(X)):
+        rows = np.round(X, decimals) if decimals is not None else X
+        uniq, inverse, counts = _unique_rows(rows)
+        if fit_rows is None:
+            model.fit(uniq, sample_weight=counts)
+        else:
+            fit_uniq, _, fit_counts = _unique_rows(rows[fit_rows])
+            model.fit(fit_uniq, sample_weight=fit_counts)
+    with timer.stage("score", len(X)):
+        return score_in_blocks(model, uniq, n_jobs)[inverse]
+
+
+def _scale_spilled(scaler: StandardScaler, X: np.ndarray, spill: SpillFiles) -> np.ndarray:
+    """scaler.transform(X) block by block into a scratch float32 np.memmap: the rows exactly as the
+    forest reads them (it casts its input to float32), so fitting and scoring do not copy them."""
+    X_scaled = spill.array("scaled", np.float32, X.shape)
+    block = spill.config.block_lines
+    for i in range(0, len(X), block):
+        X_scaled[i:i + block] = scaler.transform(X[i:i + block])
+    return X_scaled
+
+
+def fit_models(X: np.ndarray, config: ModelConfig, fit_rows: np.ndarray | None = None,
+               timer: StageTimer = NULL_TIMER, spill: SpillFiles | None = None
+               ) -> tuple[StandardScaler, IsolationForest, np.ndarray]:
+    """(scaler, forest, scores): standardize X, fit the Isolation Forest and score every row. The
+    scaler and forest are fitted on X[fit_rows] when given (sample-fit / full-score), else on all rows.
+    timer: records the scale, fit and score stages.
+    spill: X is a scratch np.memmap (see build_feature_matrix); the scaler is fitted block by block
+        (partial_fit) and the scaled rows and the scores go to scratch np.memmap files too."""
+    with timer.stage("scale", len(X)):
+        if spill is None:
+            scaler = StandardScaler().fit(X if fit_rows is None else X[fit_rows])
+            X_scaled = scaler.transform(X)
+        else:
+            scaler = StandardScaler()
+            if fit_rows is not None:
+                scaler.fit(X[fit_rows])
+            else:
+                for i in range(0, len(X), spill.config.block_lines):
+                    scaler.partial_fit(X[i:i + spill.config.block_lines])
+            X_scaled = _scale_spilled(scaler, X, spill)
+    model = config.make_forest()
+    if config.dedup_features:
+        return scaler, model, fit_score_deduplicated(model, X_scaled, config.dedup_decimals, fit_rows, config.n_jobs, timer)
+    with timer.stage("fit", len(X) if fit_rows is None else len(fit_rows)):
+        model.fit(X_scaled if fit_rows is None else X_scaled[fit_rows])
+    with timer.stage("score", len(X)):
+        out = spill.array("scores", np.float64, (len(X),)) if spill is not None else None
+        return scaler, model, score_in_blocks(model, X_scaled, config.n_jobs, config.score_block_size, out)
+
+
+def fit_score(X: np.ndarray, config: ModelConfig, fit_rows: np.ndarray | None = None,
+              timer: StageTimer = NULL_TIMER) -> np.ndarray:
+    """Isolation Forest decision scores for every row of X (see fit_models)."""
+    return fit_models(X, config, fit_rows, timer)[2]
+
+
+@dataclass
+class BaselineModel:
+    """A fitted scaler and forest with the anomaly threshold of the job they were fitted on,
+    reusable to score later jobs of the same source without refitting."""
+    scaler: StandardScaler
+    forest: IsolationForest
+    threshold: float
+    fitted_at: float
+    rows: int
+
+    def drift(self, X: np.ndarray) -> float:
+        """Largest shift of a feature's mean in X from the fitted mean, in fitted standard deviations."""
+        return float(np.max(np.abs(X.mean(axis=0) - self.scaler.mean_) / self.scaler.scale_))
+
+    def score(self, X: np.ndarray, config: ModelConfig, timer: StageTimer = NULL_TIMER,
+              spill: SpillFiles | None = None) -> np.ndarray:
+        """Score-only path: transform and decision_function, no fitting.
+        spill: X is a scratch np.memmap; scaled rows and scores go to scratch files (see fit_models)."""
+        with timer.stage("scale", len(X)):
+            X_scaled = self.scaler.transform(X) if spill is None else _scale_spilled(self.scaler, X, spill)
+        with timer.stage("score", len(X)):
+            if config.dedup_features:
+                rows = np.round(X_scaled, config.dedup_decimals) if config.dedup_decimals is not None else X_scaled
+                uniq, inverse, _ = _unique_rows(rows)
+                return score_in_blocks(self.forest, uniq, config.n_jobs)[inverse]
+            out = spill.array("scores", np.float64, (len(X),)) if spill is not None else None
+            return score_in_blocks(self.forest, X_scaled, config.n_jobs, config.score_block_size, out)
+
+
+@dataclass
+class ScoringBaseline:
+    """In/out slot for a per-source cached model (opt-in; see analyze_log). `model` is reused while
+    it is younger than max_age_seconds and the job's features drift at most max_drift (see
+    BaselineModel.drift); otherwise the job refits, replaces `model` and sets refit_reason
+    ("cold", "stale" or "drift") so the caller knows to store the new model."""
+    model: BaselineModel | None = None
+    max_age_seconds: float = 7 * 24 * 3600
+    max_drift: float = 0.5
+    refit_reason: str | None = None
+    drift: float | None = None
+
+    def reason_to_refit(self, X: np.ndarray, now: float) -> str | None:
+        if self.model is None:
+            return "cold"
+        if now - self.model.fitted_at > self.max_age_seconds:
+            return "stale"
+        self.drift = self.model.drift(X)
+        if self.drift > self.max_drift:
+            return "drift"
+        return None
+
+
+@dataclass
+class MinedLog:
+    """Step 1 output for one stream (or one byte range of a file): interned templates, per-line
+    columns, and the final template of every Drain3 cluster (used to merge ranges)."""
+    table: TemplateTable
+    store: LineColumns
+    cluster_templates: dict[int, str]
+
+
+def _native_keys(miner: NativeMiner, table: TemplateTable, tids: np.ndarray, lines: list[str],
+                 key_of_tid: dict[int, int]) -> np.ndarray:
+    """TemplateTable keys for NativeMiner template ids: each new template id is interned once, in
+    order of its first line (so keys and examples match mining line by line)."""
+    uniq, first, inverse = np.unique(tids, return_index=True, return_inverse=True)
+    for j in np.argsort(first, kind="stable"):
+        tid = int(uniq[j])
+        if tid not in key_of_tid:
+            cluster_id, template = miner.template_of(tid)
+            key_of_tid[tid] = table.key(cluster_id, template, lines[first[j]])
+    return np.fromiter((key_of_tid[t] for t in uniq.tolist()), dtype=np.int32, count=len(uniq))[inverse.ravel()]
+
+
+class _StreamMining:
+    """Mining state of one stream, kept across the calls of mine(): the miner, token masker,
+    template table (so examples stay the first line of the stream with each template), timestamp
+    format, the table keys of NativeMiner template ids and, when collapsing repeats, the open run."""
+
+    def __init__(self, miner: "TemplateMiner | NativeMiner", mining: MiningConfig):
+        self.miner = miner
+        self.masker = mining.make_masker()
+        self.native = isinstance(miner, NativeMiner)
+        self.key_of_tid: dict[int, int] = {}
+        self.extract_ts = TimestampExtractor()
+        self.table = TemplateTable()
+        self.collapser = RepeatCollapser() if mining.collapse_repeats else None
+        self.lines_mined = 0
+
+    def mine(self, log_lines: LogLinesSource, store: LineColumns, reservoir: ReservoirSampler | None = None,
+             timer: StageTimer = NULL_TIMER, progress: ProgressCallback | None = None):
+        """Mine `log_lines` and append their columns to `store`, one chunk at a time. When collapsing
+        repeats, `store` gets one record per run: the columns of its first line, the timestamp of its
+        last line and its count. A run's first and last lines are both mined (so Drain3 generalizes
+        the run's timestamps as it would over every line) and the run takes the last line's key."""
+        miner, masker, table, collapser = self.miner, self.masker, self.table, self.collapser
+        chunk: list[str] = []
+        chunk_keys: list[int] = []
+        chunk_last: list[str] = []
+        chunk_counts: list[int] = []
+
+        def flush_chunk():
+            with timer.stage("parse", len(chunk)):
+                text, starts = _join_lines(chunk)
+                ts = self.extract_ts.extract_many(chunk, text, starts)
+                if collapser is not None:
+                    counts = np.array(chunk_counts, dtype=np.int32)
+                    last_ts = ts.copy()
+                    runs = np.flatnonzero(counts > 1)
+                    if runs.size:
+                        last_ts[runs] = self.extract_ts.extract_many([chunk_last[i] for i in runs.tolist()])
+            with timer.stage("features", len(chunk)):
+                severity = severity_scores(chunk, text, starts)
+                lengths = np.fromiter(map(len, chunk), dtype=np.float64, count=len(chunk))
+                if collapser is None:
+                    store.append(ts, np.array(chunk_keys, dtype=np.int32), severity, lengths)
+                else:
+                    store.append(ts, np.array(chunk_keys, dtype=np.int32), severity, lengths, last_ts, counts)
+                if reservoir is not None:
+                    reservoir.add(len(chunk))
+            chunk.clear()
+            chunk_keys.clear()
+            chunk_last.clear()
+            chunk_counts.clear()
+
+        def mine_batch(batch: list[str]) -> list[int]:
+            """TemplateTable keys of a batch of raw lines."""
+            if masker is None:
+                masked = batch
+            else:
+                with timer.stage("mask", len(batch)):
+                    masked = masker.mask_batch(batch)
+            with timer.stage("mine", len(batch)):
+                if self.native:
+                    keys = _native_keys(miner, table, miner.add_many(masked), batch, self.key_of_tid).tolist()
+                    miner.forget_templates()
+                    return keys
+                keys = []
+                for line, content in zip(batch, masked):
+                    result = miner.add_log_message(content)
+                    keys.append(table.key(result["cluster_id"], result["template_mined"], line))
+                return keys
+
+        def mine_runs(runs: list[list]):
+            """Mine the first and (for runs of several lines) last line of each collapsed run."""
+            lines, last_of_run = [], []
+            for first, last, count in runs:
+                lines.append(first)
+                if count > 1:
+                    lines.append(last)
+                last_of_run.append(len(lines) - 1)
+            keys = mine_batch(lines)
+            chunk.extend(run[0] for run in runs)
+            chunk_keys.extend(keys[i] for i in last_of_run)
+            chunk_last.extend(run[1] for run in runs)
+            chunk_counts.extend(run[2] for run in runs)
+
+        batches = _iter_batches(log_lines)
+        while True:
+            with timer.stage("read"):
+                batch = next(batches, None)
+            if batch is None:
+                break
+            if collapser is None:
+                chunk_keys.extend(mine_batch(batch))
+                chunk.extend(batch)
+            else:
+                with timer.stage("collapse", len(batch)):
+                    runs = collapser.collapse(batch)
+                mine_runs(runs)
+            self.lines_mined += len(batch)
+            if progress is not None:
+                progress("mine", self.lines_mined)
+            if len(chunk) >= FEATURE_CHUNK_SIZE:
+                flush_chunk()
+        if collapser is not None:
+            mine_runs(collapser.finish())
+        if chunk:
+            flush_chunk()
+
+    def cluster_templates(self) -> dict[int, str]:
+        if self.native:
+            return self.miner.cluster_templates()
+        return {c.cluster_id: c.get_template() for c in self.miner.drain.clusters}
+
+
+def mine_log(log_lines: LogLinesSource, reservoir: ReservoirSampler | None = None,
+             timer: StageTimer = NULL_TIMER, miner: "TemplateMiner | NativeMiner | None" = None,
+             mining: MiningConfig | None = None, progress: ProgressCallback | None = None,
+             spill: SpillFiles | None = None) -> MinedLog:
+    """Stream lines: mine templates per line; numeric columns are built per chunk in bulk.
+    reservoir: if given, fed with every chunk (sample-fit mode).
+    timer: records the read, mask, mine, parse (timestamps) and features stages.
+    miner: a (warm) TemplateMiner or NativeMiner to mine with and keep growing; a fresh one when None.
+    mining: token masks, cluster bound and engine (see MiningConfig); max_clusters and engine only
+        apply to a fresh miner.
+    progress: called with ("mine", lines mined so far) after every batch.
+    spill: scratch files the line columns move to past the spill threshold (see LineColumns)."""
+    mining = mining or MiningConfig()
+    state = _StreamMining(miner if miner is not None else mining.make_miner(), mining)
+    store = LineColumns(spill=spill, repeats=mining.collapse_repeats)
+    state.mine(log_lines, store, reservoir, timer, progress)
+    return MinedLog(state.table, store, state.cluster_templates())
+
+
+class _ClusterMatcher:
+    """Global clusters for merge_mined. A part's cluster joins the first global cluster whose
+    template has the same token count and agrees on every token where neither side is a "<*>"
+    (Drain3's own wildcard), generalizing the global template where they differ; otherwise it
+    starts a new global cluster."""
+
+    def __init__(self):
+        self._by_length: dict[int, list[list]] = {}   # token count -> [[tokens, global id], ...]
+        self._tokens: dict[int, list] = {}            # global id -> its [tokens, global id] entry
+        self.count = 0
+
+    @staticmethod
+    def _generalize(known: list[str], tokens: list[str]) -> list[str] | None:
+        if len(known) != len(tokens):
+            return None
+        if not all(a == b or a == "<*>" or b == "<*>" for a, b in zip(known, tokens)):
+            return None
+        return [a if a == b else "<*>" for a, b in zip(known, tokens)]
+
+    def match(self, template: str) -> int:
+        tokens = template.split()
+        candidates = self._by_length.setdefault(len(tokens), [])
+        for entry in candidates:
+            merged = self._generalize(entry[0], tokens)
+            if merged is not None:
+                entry[0] = merged
+                return entry[1]
+        self.count += 1
+        entry = [tokens, self.count]
+        candidates.append(entry)
+        self._tokens[self.count] = entry
+        return self.count
+
+    def snapshot(self) -> dict[int, list[str]]:
+        return {gid: entry[0] for gid, entry in self._tokens.items()}
+
+    def label(self, known: list[str] | None, template: str) -> str:
+        """Template text a line of `template` would have had if its part had been mined after
+        the previous parts: the global cluster template it extends (as seen before this part),
+        generalized with it."""
+        merged = self._generalize(known, template.split()) if known is not None else None
+        return " ".join(merged) if merged is not None else template
+
+    def templates(self) -> dict[int, str]:
+        return {gid: " ".join(entry[0]) for gid, entry in self._tokens.items()}
+
+
+def merge_mined(parts: list[MinedLog], spill: SpillFiles | None = None) -> MinedLog:
+    """Concatenate mined parts of one file (in file order) into one MinedLog. Each part was mined
+    by its own Drain3 instance, so clusters are matched across parts by their final templates and
+    each part's early, not yet generalized templates are relabelled with the template its cluster
+    already had. Keys are re-interned in order, so examples stay the first line of the file with
+    each template. spill: scratch files the merged columns move to past the spill threshold."""
+    table = TemplateTable()
+    total = sum(len(p.store) for p in parts)
+    if spill is not None:
+        total = min(total, spill.config.max_memory_lines)
+    repeats = any(p.store.repeats for p in parts)
+    store = LineColumns(capacity=max(1, total), spill=spill, repeats=repeats)
+    clusters = _ClusterMatcher()
+    for part in parts:
+        before = clusters.snapshot()
+        global_id = {cid: clusters.match(template) for cid, template in part.cluster_templates.items()}
+        remap = np.empty(len(part.table), dtype=np.int32)
+        for k, (cluster_id, t) in enumerate(zip(part.table.cluster_of_key, part.table.template_of_key)):
+            template = part.table.templates[t]
+            gid = global_id.get(cluster_id) or clusters.match(template)
+            label = clusters.label(before.get(gid), template)
+            remap[k] = table.key(gid, label, part.table.examples[template])
+        s = part.store
+        if repeats:
+            count = s.count if s.repeats else np.ones(len(s), dtype=np.int32)
+            store.append(s.ts, remap[s.key], s.severity, s.length, s.ts if s.last_ts is None else s.last_ts, count)
+        else:
+            store.append(s.ts, remap[s.key], s.severity, s.length)
+    return MinedLog(table, store, clusters.templates())
+
+
+def score_mined(mined: MinedLog, window_size: int = 3, model: ModelConfig | None = None,
+                fit_rows: np.ndarray | None = None, timer: StageTimer = NULL_TIMER,
+                baseline: ScoringBaseline | None = None, progress: ProgressCallback | None = None,
+                spill: SpillFiles | None = None) -> list[dict]:
+    """Steps 2-6 on mined lines: feature matrix, Isolation Forest, aggregation per template.
+    fit_rows: rows to fit the scaler and forest on (sample-fit mode); all rows are scored.
+    timer: records the features, scale, fit, score and aggregate stages.
+    baseline: a cached model slot; scored without fitting when its model is fresh (see ScoringBaseline).
+    progress: called with ("score", n) before the features and ("aggregate", n) before aggregation.
+    spill: scratch files for the per-line arrays when there are more than spill.config.max_memory_lines
+        lines (see SpillConfig); in memory otherwise.
+    Collapsed repeats (MiningConfig.collapse_repeats) are scored once per run. The scaler and forest
+    are fitted on the runs' rows repeated once per line (see _line_rows; this replaces fit_rows), and
+    the threshold and incidents weight every run by its line count."""
+    config = model or ModelConfig()
+    n = len(mined.store)
+    lines = mined.store.lines
+    if lines < 10:
         return []
+    # Without a repeated line every run is one line: the plain per-line analysis
+    weights = mined.store.count if lines > n else None
+    if weights is not None:
+        fit_rows = _line_rows(weights, config.fit_sample_size or COLLAPSED_FIT_LINES, config.random_state)
+    if spill is not None and n <= spill.config.max_memory_lines:
+        spill = None
 
-    # 2. Numeric arrays only (no DataFrame)
-    severity_arr = np.array(severity_list, dtype=np.float64)
-    len_arr = np.array(len_list, dtype=np.float64)
-    ts_float = np.array(
-        [t.timestamp() if t is not None else np.nan for t in ts_list],
-        dtype=np.float64,
-    )
+    if progress is not None:
+        progress("score", lines)
+    with timer.stage("features"):
+        severity_arr, X_final = build_feature_matrix(mined, window_size, spill)
+
+    # 4. Isolation Forest (optionally fitted on a sample of rows only, or reused from a baseline)
+    reason = baseline.reason_to_refit(X_final, time()) if baseline is not None else "cold"
+    if reason is None:
+        scores = baseline.model.score(X_final, config, timer, spill)
+        anomaly_threshold = baseline.model.threshold
+    else:
+        scaler, forest, scores = fit_models(X_final, config, fit_rows, timer, spill)
+        if spill is None and weights is None:
+            anomaly_threshold = np.mean(scores) - 2 * np.std(scores)
+        else:
+            anomaly_threshold = _threshold_in_blocks(scores, spill.config.block_lines if spill else n, weights)
+        if baseline is not None:
+            baseline.model = BaselineModel(scaler, forest, float(anomaly_threshold), time(), n)
+            baseline.refit_reason = reason
+
+    # 5-6. Flag anomalies and aggregate them per template
+    if progress is not None:
+        progress("aggregate", lines)
+    with timer.stage("aggregate", n):
+        return aggregate_incidents(scores, severity_arr, mined.store.key, mined.table, anomaly_threshold, weights)
 
-    # Template frequency from cluster counts
-    cluster_counts = Counter(cluster_id_list)
-    template_freq = np.array([cluster_counts[c] / n for c in cluster_id_list], dtype=np.float64)
 
-    # Time delta: fill missing timestamps (ffill then bfill), vectorized (no Python loops)
-    if np.isnan(ts_float).all():
-        time_delta_log = np.zeros(n, dtype=np.float64)
+def _line_rows(counts: np.ndarray, size: int, seed: int) -> np.ndarray:
+    """Rows of collapsed runs to fit on, each repeated once per line of its run (np.repeat), so the
+    forest's subsamples see a storm as often as per-line fitting would; above `size` lines, the
+    rows of `size` lines drawn uniformly (with replacement)."""
+    lines = int(np.sum(counts, dtype=np.int64))
+    if lines <= size:
+        return np.repeat(np.arange(len(counts)), counts)
+    positions = np.sort(np.random.default_rng(seed).integers(0, lines, size))
+    return np.searchsorted(np.cumsum(counts, dtype=np.int64), positions, side="right")
+
+
+def _time_delta_log(ts: np.ndarray, previous: float = np.nan) -> np.ndarray:
+    """log1p of the absolute time since the previous line. Missing timestamps are filled (ffill then
+    bfill), vectorized (no Python loops); `previous` is the filled timestamp of the line before
+    `ts` (streaming), NaN at the start of a stream. All zeros when no timestamp is known."""
+    n = len(ts)
+    if not np.isnan(previous):
+        ts = np.concatenate(([previous], ts))
+    if np.isnan(ts).all():
+        return np.zeros(n, dtype=np.float64)
+    m = len(ts)
+    mask = np.isnan(ts)
+    # Forward fill
+    idx = np.where(~mask, np.arange(m), 0)
+    np.maximum.accumulate(idx, out=idx)
+    ts_filled = ts[idx]
+    # Backward fill for leading NaNs
+    mask = np.isnan(ts_filled)
+    if mask.any():
+        rev = ts_filled[::-1]
+        idx_rev = np.where(~np.isnan(rev), np.arange(m), 0)
+        np.maximum.accumulate(idx_rev, out=idx_rev)
+        ts_filled = rev[idx_rev][::-1].copy()
+    time_delta = np.abs(np.diff(ts_filled, prepend=ts_filled[0]))
+    return np.log1p(time_delta[m - n:])
+
+
+def _window_mean(freq: np.ndarray, window_size: int, previous: np.ndarray | None = None) -> np.ndarray:
+    """Mean of each line's value and the `window_size` values before it (fewer at the start of the
+    stream). previous: the values of the lines before `freq` (streaming), at most window_size of them."""
+    n = len(freq)
+    carried = 0 if previous is None else len(previous)
+    if carried:
+        freq = np.concatenate((previous, freq))
+    kernel = np.ones(window_size + 1)
+    window_sum = np.convolve(freq, kernel, mode='full')[carried:carried + n]
+    counts = np.minimum(np.arange(carried + 1, carried + n + 1), window_size + 1)
+    return window_sum / counts
+
+
+def _threshold_in_blocks(scores: np.ndarray, block_lines: int, weights: np.ndarray | None = None) -> float:
+    """np.mean(scores) - 2 * np.std(scores), summing squared deviations block by block instead of
+    in one temporary array the size of scores (equal up to float rounding).
+    weights: lines per score (collapsed repeats); mean and deviation are over lines."""
+    blocks = range(0, len(scores), block_lines)
+    if weights is None:
+        total = len(scores)
+        mean = float(np.mean(scores))
+        squares = sum(float(np.sum(np.square(scores[i:i + block_lines] - mean))) for i in blocks)
     else:
-        ts_filled = ts_float.copy()
-        mask = np.isnan(ts_filled)
-        # Forward fill
-        idx = np.where(~mask, np.arange(n), 0)
-        np.maximum.accumulate(idx, out=idx)
-        ts_filled = ts_filled[idx]
-        # Backward fill for leading NaNs
-        mask = np.isnan(ts_filled)
-        if mask.any():
-            rev = ts_filled[::-1]
-            idx_rev = np.where(~np.isnan(rev), np.arange(n), 0)
-            np.maximum.accumulate(idx_rev, out=idx_rev)
-            ts_filled = rev[idx_rev][::-1].copy()
-        time_delta = np.abs(np.diff(ts_filled, prepend=ts_filled[0]))
-        time_delta_log = np.log1p(time_delta)
+        total = float(np.sum(weights, dtype=np.float64))
+        mean = sum(float(np.dot(scores[i:i + block_lines], weights[i:i + block_lines])) for i in blocks) / total
+        squares = sum(float(np.dot(np.square(scores[i:i + block_lines] - mean), weights[i:i + block_lines]))
+                      for i in blocks)
+    return mean - 2 * math.sqrt(squares / total)
+
+
+def _run_timestamps(ts: np.ndarray, last_ts: np.ndarray | None) -> np.ndarray:
+    """Timestamps to take time deltas over: per-line timestamps as they are, or for collapsed
+    repeats the first and last timestamp of every run interleaved; the delta at each even position
+    is then a run's time since the last line of the run before it (fills as per line)."""
+    if last_ts is None:
+        return ts
+    both = np.empty(2 * len(ts), dtype=np.float64)
+    both[0::2] = ts
+    both[1::2] = last_ts
+    return both
+
+
+def _spilled_feature_matrix(mined: MinedLog, window_size: int, spill: SpillFiles) -> tuple[np.ndarray, np.ndarray]:
+    """build_feature_matrix into a scratch np.memmap, spill.config.block_lines rows at a time. Time
+    deltas and window means continue across blocks (as across streaming segments) and template
+    frequencies count the whole file, so X equals the in-memory matrix."""
+    table, store = mined.table, mined.store
+    n = len(store)
+    block = spill.config.block_lines
+    counts = store.count
+    step = 1 if counts is None else 2
+
+    key_counts = np.zeros(len(table), dtype=np.int64 if counts is None else np.float64)
+    for i in range(0, n, block):
+        key_counts += np.bincount(store.key[i:i + block], None if counts is None else counts[i:i + block], len(table))
+    cluster_of_key = np.array(table.cluster_of_key, dtype=np.int64)
+    cluster_counts = np.bincount(cluster_of_key, weights=key_counts)
+    freq_of_key = cluster_counts[cluster_of_key] / store.lines
+
+    X = spill.array("features", np.float64, (n, 5))
+    last_ts = np.nan
+    recent_freq = np.zeros(0, dtype=np.float64)
+    for i in range(0, n, block):
+        rows = slice(i, i + block)
+        ts = _run_timestamps(np.asarray(store.ts[rows]), None if counts is None else store.last_ts[rows])
+        template_freq = freq_of_key[store.key[rows]]
+        X[rows, 0] = store.severity[rows]
+        X[rows, 1] = _time_delta_log(ts, last_ts)[::step]
+        X[rows, 2] = store.length[rows].astype(np.float64) / 500.0
+        X[rows, 3] = template_freq
+        X[rows, 4] = _window_mean(template_freq, window_size, recent_freq)
+        ts_known = ts[~np.isnan(ts)]
+        if len(ts_known):
+            last_ts = float(ts_known[-1])
+        recent = np.concatenate((recent_freq, template_freq))
+        recent_freq = recent[max(0, len(recent) - window_size):]
+    return store.severity, X
+
+
+def build_feature_matrix(mined: MinedLog, window_size: int = 3,
+                         spill: SpillFiles | None = None) -> tuple[np.ndarray, np.ndarray]:
+    """(severity, X): the per-line severity column and the (n, 5) feature matrix of mined lines.
+    spill: build X in a scratch np.memmap block by block instead (severity is then the stored
+    float32 column).
+    Collapsed repeats get one row per run: template frequencies count every line of a run, the
+    time delta is the run's first line's and the window mean is over runs."""
+    if spill is not None:
+        return _spilled_feature_matrix(mined, window_size, spill)
+    table, store = mined.table, mined.store
+    counts = store.count
+
+    # 2. Numeric arrays only (no DataFrame)
+    severity_arr = store.severity.astype(np.float64)
+    len_arr = store.length.astype(np.float64)
+    ts_float = store.ts
+    key_arr = store.key
+
+    # Template frequency from cluster counts (lines per key, summed per cluster)
+    cluster_of_key = np.array(table.cluster_of_key, dtype=np.int64)
+    key_counts = np.bincount(key_arr, weights=counts, minlength=len(table))
+    cluster_counts = np.bincount(cluster_of_key, weights=key_counts)
+    template_freq = (cluster_counts[cluster_of_key] / store.lines)[key_arr]
+
+    time_delta_log = _time_delta_log(_run_timestamps(ts_float, store.last_ts))[::1 if counts is None else 2]
 
     # 3. Window mean of template_freq; build feature matrix (n, 5) without pandas
-    kernel = np.ones(window_size + 1)
-    window_sum = np.convolve(template_freq, kernel, mode='full')[:n]
-    counts = np.minimum(np.arange(1, n + 1), window_size + 1)
-    window_freq = window_sum / counts
+    window_freq = _window_mean(template_freq, window_size)
 
     X_final = np.column_stack((
         severity_arr,
@@ -152,62 +1775,282 @@ def analyze_log(log_lines: LogLinesSource, window_size: int = 3):
         template_freq,
         window_freq,
     ))
-    X_final_scaled = StandardScaler().fit_transform(X_final)
-
-    # 4. Isolation Forest
-    model = IsolationForest(contamination="auto", random_state=42)
-    model.fit(X_final_scaled)
-    scores = model.decision_function(X_final_scaled)
-    anomaly_threshold = np.mean(scores) - 2 * np.std(scores)
-
-    # 5. Flag anomalies; use arrays and template_list (no df)
-    results = []
-    for i in range(n):
-        score = scores[i]
-        is_model_anomaly = score < anomaly_threshold
-        is_high_severity = severity_arr[i] >= 3.0
-
-        if is_model_anomaly or is_high_severity:
-            template = template_list[i].strip() if isinstance(template_list[i], str) else str(template_list[i]).strip()
-            results.append({
-                "line_no": int(i) + 1,
-                "score": round(float(scores[i]), 4),
-                "is_anomaly": bool(is_model_anomaly),
-                "severity": float(severity_arr[i]),
-                "template": template,
-                "content": example_by_template.get(template, ""),
-            })
-
-    sorted_results = sorted(results, key=lambda x: x['score'])
-
-    # 6. Aggregate by Drain3 template: one incident per template (occurrences, avg_score, example_log)
-    aggregated_alerts = {}
-    for res in sorted_results:
-        tmpl = res['template']
-        if tmpl not in aggregated_alerts:
-            aggregated_alerts[tmpl] = {
-                "count": 0,
-                "severity": res['severity'],
-                "is_ml_anomaly": res['is_anomaly'],
-                "example_content": res['content'],
-                "avg_score": 0.0,
-                "scores": []
-            }
-        
-        aggregated_alerts[tmpl]["count"] += 1
-        aggregated_alerts[tmpl]["scores"].append(res['score'])
 
-    final_incidents = []
-    for tmpl, data in aggregated_alerts.items():
-        data["avg_score"] = sum(data["scores"]) / len(data["scores"])
-        del data["scores"]
+    return severity_arr, X_final
 
-        final_incidents.append({
-            "incident_template": tmpl,
-            "occurrences": data["count"],
-            "avg_score": round(data["avg_score"], 4),
-            "severity": data["severity"],
-            "example_log": data["example_content"]
-        })
-    
-    return sorted(final_incidents, key=lambda x: (x['severity'], x['occurrences']), reverse=True)
+
+def analyze_log(log_lines: LogLinesSource, window_size: int = 3, model: ModelConfig | None = None,
+                timer: StageTimer = NULL_TIMER, miner: TemplateMiner | None = None,
+                baseline: ScoringBaseline | None = None, mining: MiningConfig | None = None,
+                streaming: StreamingConfig | None = None, progress: ProgressCallback | None = None,
+                spill: SpillConfig | None = None):
+    """Run log anomaly pipeline: Drain3 templates, features, Isolation Forest, aggregate by template.
+    log_lines: list of strings, LineBatches or file-like (read line by line). No DataFrame: per-line
+    data lives in LineColumns (~20 bytes/line) and template text once per template in a TemplateTable.
+    model: forest/scaler settings (sample-fit, threads, dedup); defaults to ModelConfig().
+    timer: a StageTimer to collect per-stage durations and line counts (off by default).
+    miner: a warm TemplateMiner (e.g. restored per log source); mined in place. Fresh when None.
+    baseline: a per-source cached model slot; a fresh model skips the scaler/forest fit (score only),
+        otherwise the job refits and stores the new model in the slot.
+    mining: token masking and the Drain3 cluster bound (see MiningConfig); defaults to MiningConfig().
+    streaming: analyze in bounded-memory segments instead (see StreamingConfig and analyze_stream).
+    progress: a ProgressCallback for lines mined and stage transitions (e.g. to report a long job's
+        progress); called per batch, so it should be cheap and rate-limit whatever it sends.
+    spill: keep per-line arrays of files above a memory threshold in scratch np.memmap files (see
+        SpillConfig); ignored in streaming mode, whose memory is bounded already.
+    """
+    if streaming is not None:
+        incidents = []
+        for incidents in analyze_stream(log_lines, window_size, model, timer, miner, baseline, mining, streaming,
+                                        progress):
+            pass
+        return incidents
+    config = model or ModelConfig()
+    reservoir = ReservoirSampler(config.fit_sample_size, config.random_state) if config.fit_sample_size else None
+    files = SpillFiles(spill) if spill is not None else None
+    try:
+        mined = mine_log(log_lines, reservoir, timer, miner, mining, progress, files)
+        return score_mined(mined, window_size, config, reservoir.sample() if reservoir is not None else None, timer,
+                           baseline, progress, files)
+    finally:
+        if files is not None:
+            files.close()
+
+
+def analyze_mined_parts(parts: list[MinedLog], window_size: int = 3, model: ModelConfig | None = None,
+                        timer: StageTimer = NULL_TIMER, baseline: ScoringBaseline | None = None,
+                        progress: ProgressCallback | None = None, spill: SpillConfig | None = None):
+    """analyze_log over a file mined in parts (e.g. byte ranges mined in parallel): merge the parts,
+    then compute frequency/window/time features and the forest on the whole file. Templates can
+    differ slightly from mining the file sequentially (each part's Drain3 starts empty).
+    spill: the merged columns and features of large files go to scratch files (see SpillConfig)."""
+    config = model or ModelConfig()
+    files = SpillFiles(spill) if spill is not None else None
+    try:
+        if progress is not None:
+            progress("merge", sum(len(p.store) for p in parts))
+        with timer.stage("merge", sum(len(p.store) for p in parts)):
+            mined = merge_mined(parts, files)
+        fit_rows = None
+        n = len(mined.store)
+        if config.fit_sample_size and n > config.fit_sample_size:
+            rng = np.random.default_rng(config.random_state)
+            fit_rows = np.sort(rng.choice(n, config.fit_sample_size, replace=False))
+        return score_mined(mined, window_size, config, fit_rows, timer, baseline, progress, files)
+    finally:
+        if files is not None:
+            files.close()
+
+
+class StreamingAnalyzer:
+    """analyze_log one segment at a time, with bounded memory (see StreamingConfig). Kept between
+    segments: the miner and template table, running line counts per template key, the last
+    timestamp and the last window_size template frequencies, a reservoir of feature rows with the
+    model fitted on it, and running incident totals per template. Per-line columns live only while
+    their segment is processed.
+
+    Differences from analyze_log on the whole input: a line's template frequency counts the lines
+    up to the end of its segment (not the whole file), segments are scored by the model fitted so
+    far (on the reservoir; the anomaly threshold comes from the reservoir's scores), and incident
+    averages are summed per segment. Lines arriving before 10 lines have been seen wait for the
+    next segment (analyze_log returns no incidents below 10 lines).
+
+    Feed with add_segment(lines) (e.g. lines appended to a tailed file), or with add_lines() and
+    end_segment() to mine a segment's lines as they arrive; incidents() gives the incidents so far
+    in analyze_log's format."""
+
+    def __init__(self, window_size: int = 3, model: ModelConfig | None = None,
+                 streaming: StreamingConfig | None = None, timer: StageTimer = NULL_TIMER,
+                 miner: "TemplateMiner | NativeMiner | None" = None, baseline: ScoringBaseline | None = None,
+                 mining: MiningConfig | None = None, progress: ProgressCallback | None = None):
+        self.window_size = window_size
+        self.config = model or ModelConfig()
+        self.streaming = streaming or StreamingConfig()
+        self.timer = timer
+        self.progress = progress
+        self.baseline = baseline
+        mining = replace(mining or MiningConfig(), collapse_repeats=False)
+        self._mining = _StreamMining(miner if miner is not None else mining.make_miner(), mining)
+        self._segment = LineColumns()
+        self.lines = 0
+        self.segments = 0
+        self.model: BaselineModel | None = None
+        self._fixed_model = False
+        self._refit_reason = "cold"
+        self._baseline_checked = baseline is None
+        self._key_counts = np.zeros(0, dtype=np.int64)
+        self._last_ts = np.nan
+        self._recent_freq = np.zeros(0, dtype=np.float64)
+        self._reservoir = ReservoirSampler(self.streaming.reservoir_size, self.config.random_state)
+        self._rows = np.empty((self.streaming.reservoir_size, 5), dtype=np.float64)
+        self._pending: tuple[np.ndarray, np.ndarray, np.ndarray] | None = None  # unscored (keys, severity, X)
+        self._group_of_text: dict[str, int] = {}
+        self._texts: list[str] = []
+        self._group_of_template: list[int] = []
+        # group -> [occurrences, score sum, lowest rounded score, its severity, its stream position]
+        self._incidents: dict[int, list] = {}
+
+    def add_segment(self, log_lines: LogLinesSource):
+        """Mine, featurize, score and aggregate one segment (any LogLinesSource)."""
+        self.add_lines(log_lines)
+        self.end_segment()
+
+    def add_lines(self, log_lines: LogLinesSource):
+        """Mine lines into the open segment; only their numeric columns are kept."""
+        self._mining.mine(log_lines, self._segment, timer=self.timer, progress=self.progress)
+
+    @property
+    def open_lines(self) -> int:
+        """Lines mined into the open segment."""
+        return len(self._segment)
+
+    def end_segment(self):
+        """Featurize, score and aggregate the open segment."""
+        timer = self.timer
+        store, self._segment = self._segment, LineColumns()
+        n = len(store)
+        if n == 0:
+            return
+        self.segments += 1
+        if self.progress is not None:
+            self.progress("score", self._mining.lines_mined)
+        with timer.stage("features"):
+            severity, X = self._features(store)
+            slots, offsets = self._reservoir.add(n)
+            self._rows[slots] = X[offsets]
+        keys = store.key
+        start = self.lines - n
+        if self._pending is not None:
+            pending_keys, pending_severity, pending_X = self._pending
+            keys = np.concatenate((pending_keys, keys))
+            severity = np.concatenate((pending_severity, severity))
+            X = np.concatenate((pending_X, X))
+            start -= len(pending_keys)
+            self._pending = None
+        self._update_model(X)
+        if self.model is None:
+            self._pending = (keys, severity, X)
+            return
+        scores = self.model.score(X, self.config, timer)
+        with timer.stage("aggregate", len(keys)):
+            self._aggregate(scores, severity, keys, start)
+
+    def _features(self, store: LineColumns) -> tuple[np.ndarray, np.ndarray]:
+        """build_feature_matrix for one segment, continuing the stream's counts, time and window."""
+        table = self._mining.table
+        n = len(store)
+        key_arr = store.key
+        self.lines += n
+        counts = np.bincount(key_arr, minlength=len(table))
+        counts[:len(self._key_counts)] += self._key_counts
+        self._key_counts = counts
+        cluster_of_key = np.array(table.cluster_of_key, dtype=np.int64)
+        cluster_counts = np.bincount(cluster_of_key, weights=counts)
+        template_freq = (cluster_counts[cluster_of_key] / self.lines)[key_arr]
+
+        time_delta_log = _time_delta_log(store.ts, self._last_ts)
+        ts_known = store.ts[~np.isnan(store.ts)]
+        if len(ts_known):
+            self._last_ts = float(ts_known[-1])
+        window_freq = _window_mean(template_freq, self.window_size, self._recent_freq)
+        recent = np.concatenate((self._recent_freq, template_freq))
+        self._recent_freq = recent[max(0, len(recent) - self.window_size):]
+
+        severity_arr = store.severity.astype(np.float64)
+        X = np.column_stack((severity_arr, time_delta_log, store.length.astype(np.float64) / 500.0,
+                             template_freq, window_freq))
+        return severity_arr, X
+
+    def _update_model(self, X: np.ndarray):
+        """Fit on the reservoir for the first segment and every refit_segments segments after it,
+        unless the baseline's cached model is fresh (then it scores every segment)."""
+        if self._fixed_model:
+            return
+        if not self._baseline_checked:
+            self._baseline_checked = True
+            self._refit_reason = self.baseline.reason_to_refit(X, time())
+            if self._refit_reason is None:
+                self.model, self._fixed_model = self.baseline.model, True
+                return
+        refit = self.streaming.refit_segments
+        if self.model is not None and (not refit or (self.segments - 1) % refit):
+            return
+        rows = self._rows[:min(self.streaming.reservoir_size, self._reservoir.seen)]
+        if len(rows) < 10:
+            return
+        scaler, forest, scores = fit_models(rows, self.config, timer=self.timer)
+        self.model = BaselineModel(scaler, forest, float(np.mean(scores) - 2 * np.std(scores)), time(), len(rows))
+        if self.baseline is not None:
+            self.baseline.model = self.model
+            self.baseline.refit_reason = self._refit_reason
+
+    def _aggregate(self, scores: np.ndarray, severity: np.ndarray, keys: np.ndarray, start: int):
+        """aggregate_incidents for one segment, added to the running totals per template."""
+        flagged = np.flatnonzero((scores < self.model.threshold) | (severity >= 3.0))
+        if flagged.size == 0:
+            return
+        table = self._mining.table
+        for template in table.templates[len(self._group_of_template):]:
+            text = template.strip() if isinstance(template, str) else str(template).strip()
+            g = self._group_of_text.get(text)
+            if g is None:
+                g = self._group_of_text[text] = len(self._texts)
+                self._texts.append(text)
+            self._group_of_template.append(g)
+        group_of_key = np.asarray(self._group_of_template, dtype=np.int64)[np.asarray(table.template_of_key, dtype=np.int64)]
+
+        rounded = np.array([round(s, 4) for s in scores[flagged].tolist()], dtype=np.float64)
+        order = np.argsort(rounded, kind="stable")
+        flagged, rounded = flagged[order], rounded[order]
+        group = group_of_key[keys[flagged]]
+        present, first, counts = np.unique(group, return_index=True, return_counts=True)
+        by_group = rounded[np.argsort(group, kind="stable")]
+        ends = np.cumsum(counts)
+        for j, g in enumerate(present.tolist()):
+            count = int(counts[j])
+            score_sum = sum(by_group[ends[j] - count:ends[j]].tolist())
+            low, line = float(rounded[first[j]]), int(flagged[first[j]])
+            totals = self._incidents.get(g)
+            if totals is None:
+                self._incidents[g] = [count, score_sum, low, float(severity[line]), start + line]
+                continue
+            totals[0] += count
+            totals[1] += score_sum
+            if low < totals[2]:
+                totals[2:] = [low, float(severity[line]), start + line]
+
+    def incidents(self) -> list[dict]:
+        """Incidents of the lines scored so far, as analyze_log returns them."""
+        examples = self._mining.table.examples
+        ordered = sorted(self._incidents.items(), key=lambda item: (item[1][2], item[1][4]))
+        incidents = [{
+            "incident_template": self._texts[g],
+            "occurrences": count,
+            "avg_score": round(score_sum / count, 4),
+            "severity": severity,
+            "example_log": examples.get(self._texts[g], ""),
+        } for g, (count, score_sum, _, severity, _) in ordered]
+        return sorted(incidents, key=lambda x: (x['severity'], x['occurrences']), reverse=True)
+
+
+def analyze_stream(log_lines: LogLinesSource, window_size: int = 3, model: ModelConfig | None = None,
+                   timer: StageTimer = NULL_TIMER, miner: "TemplateMiner | NativeMiner | None" = None,
+                   baseline: ScoringBaseline | None = None, mining: MiningConfig | None = None,
+                   streaming: StreamingConfig | None = None, progress: ProgressCallback | None = None):
+    """analyze_log in segments of streaming.segment_lines lines (see StreamingAnalyzer): yields the
+    incidents so far after every segment; the last list is the result for the whole input."""
+    streaming = streaming or StreamingConfig()
+    analyzer = StreamingAnalyzer(window_size, model, streaming, timer, miner, baseline, mining, progress)
+    size = streaming.segment_lines
+    for batch in _iter_batches(log_lines):
+        while batch:
+            # Segments hold exactly segment_lines lines (the last one fewer)
+            take = size - analyzer.open_lines
+            analyzer.add_lines(LineBatches([batch[:take]]))
+            batch = batch[take:]
+            if analyzer.open_lines == size:
+                analyzer.end_segment()
+                yield analyzer.incidents()
+    if analyzer.open_lines:
+        analyzer.end_segment()
+        yield analyzer.incidents()
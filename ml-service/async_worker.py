@@ -0,0 +1,339 @@
+"""Asyncio worker mode (WORKER_MODE=async): worker.py's job pipeline with its I/O and CPU stages
+overlapped instead of run back to back.
+
+One event loop runs the RabbitMQ connection (pika's AsyncioConnection) and three stages:
+- download: HEAD the object (result cache, range mode) and stream it to a spool file. This runs for
+  the next jobs while the current one analyzes; up to ASYNC_PREFETCH_JOBS objects wait downloaded.
+- analyze: the CPU work runs in an executor: ANALYSIS_PROCESSES pool processes, or one thread. The
+  source's warm tree and cached model are saved as soon as the analysis ends, so the next job of the
+  same source starts from them even while this one is still being persisted.
+- complete: persisting incidents, deleting the object (in threads), then publishing the result and
+  acking (on the loop). This runs while the next job analyzes.
+
+Job messages, result notifications and correlationId propagation are those of worker.py. Objects for
+range mode are analyzed end to end by worker._run_analysis_task in the executor.
+"""
+import asyncio
+import functools
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from time import perf_counter
+
+import pika
+import structlog
+from pika.adapters.asyncio_connection import AsyncioConnection
+
+import metrics
+import worker
+from anomaly import NULL_TIMER, ModelConfig
+
+logger = structlog.get_logger()
+
+
+@dataclass
+class Job:
+    """One job message moving through the pipeline."""
+    delivery_tag: int
+    job_id: str
+    file_key: str
+    bucket: str
+    correlation_id: str | None = None
+    source_key: str | None = None
+    published: float | None = None     # AMQP timestamp property, when the publisher sets it
+    received: float = field(default_factory=time.time)
+    started: float | None = None       # perf_counter() when analysis started
+    timer: object = NULL_TIMER
+    content_key: str | None = None
+    spool_path: str | None = None
+    range_size: int | None = None      # analyzed in byte ranges by worker._run_analysis_task
+    status: str | None = None
+    incidents: list | None = None
+    error: str | None = None
+    handled: bool = False              # persisted (or copied from the result cache) and deleted already
+
+
+def prepare_job(job: Job):
+    """Download stage (in a thread): result cache lookup and range-mode check, then stream the
+    object to a spool file in ASYNC_SPOOL_DIR."""
+    job.content_key, cached, job.range_size = worker._check_object(job.job_id, job.bucket, job.file_key, job.timer,
+                                                                   job.source_key)
+    if cached is not None:
+        job.status, job.incidents, job.handled = "COMPLETED", cached, True
+        return
+    if job.range_size is not None:
+        return
+    logger.info("Fetching from S3", bucket=job.bucket, fileKey=job.file_key)
+    start = perf_counter()
+    fd, job.spool_path = tempfile.mkstemp(prefix="sentinel-", suffix=".spool", dir=worker.ASYNC_SPOOL_DIR)
+    with os.fdopen(fd, "wb") as spool:
+        obj = worker.with_retry(worker.s3_client.get_object, Bucket=job.bucket, Key=job.file_key)
+        for chunk in obj["Body"].iter_chunks(chunk_size=worker.S3_READ_CHUNK_BYTES):
+            spool.write(chunk)
+        size = spool.tell()
+    job.timer.add("fetch", perf_counter() - start, nbytes=size)
+
+
+def analyze_spooled(job_id: str, path: str, file_key: str, correlation_id: str = None, source_key: str = None,
+                    progress=None):
+    """Analyze stage (in the executor: a thread or a pool process): analyze a downloaded object and
+    save the source's tree and model right away. Returns (incidents, stages).
+    progress: the job's ProgressReporter in thread mode; pool processes make their own (worker.job_progress)."""
+    structlog.contextvars.clear_contextvars()
+    if correlation_id:
+        structlog.contextvars.bind_contextvars(correlationId=correlation_id)
+    timer = worker._new_timer()
+    config = ModelConfig()
+    progress = progress or worker.job_progress(job_id, correlation_id)
+    if progress is not None:
+        progress.total_bytes = os.path.getsize(path)
+    with open(path, "rb") as spool:
+        chunks = iter(lambda: spool.read(worker.S3_READ_CHUNK_BYTES), b"")
+        incidents, miner, baseline = worker._analyze_chunks(chunks, file_key, config, timer, source_key, progress)
+    worker._save_warm_miner(source_key, miner, timer)
+    worker._save_baseline(source_key, baseline, config, timer)
+    return incidents, getattr(timer, "stages", {})
+
+
+def _init_analysis_process(progress_queue=None):
+    """Initializer of the async worker's pool processes (see worker._init_analysis_process)."""
+    worker._init_analysis_process(progress_queue=progress_queue)
+
+
+def create_analysis_executor(progress_queue=None):
+    """ANALYSIS_PROCESSES spawned processes (putting PROGRESS payloads on `progress_queue`), or a
+    single thread when it is 0."""
+    if worker.ANALYSIS_PROCESSES <= 0:
+        return ThreadPoolExecutor(max_workers=1)
+    return ProcessPoolExecutor(
+        max_workers=worker.ANALYSIS_PROCESSES,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_analysis_process,
+        initargs=(progress_queue,),
+        max_tasks_per_child=worker.ANALYSIS_MAX_TASKS_PER_CHILD,
+    )
+
+
+class JobPipeline:
+    """The download, analyze and complete stages over one channel. on_message is the channel's
+    consumer callback; jobs flow through an unbounded incoming queue (the channel's prefetch bounds
+    it), a ready queue of `prefetch` downloaded jobs and `analyzers` analysis slots."""
+
+    def __init__(self, channel, executor, analyzers: int = 1, prefetch: int = 1, progress_queue=None):
+        self.channel = channel
+        self.executor = executor
+        self.progress_queue = progress_queue
+        self.analyzers = analyzers
+        self._incoming: asyncio.Queue[Job] = asyncio.Queue()
+        self._ready: asyncio.Queue[Job] = asyncio.Queue(maxsize=max(1, prefetch))
+        self._tasks: set[asyncio.Task] = set()
+        self._in_flight = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    @staticmethod
+    def prefetch_count(analyzers: int, prefetch: int) -> int:
+        """Unacked messages the pipeline can hold: one downloading, `prefetch` downloaded, and per
+        analysis slot one analyzing and one completing."""
+        return 1 + max(1, prefetch) + 2 * analyzers
+
+    def start(self):
+        self._spawn(self._download_loop())
+        for _ in range(self.analyzers):
+            self._spawn(self._analyze_loop())
+        if self.progress_queue is not None:
+            threading.Thread(target=self._forward_progress, args=(asyncio.get_running_loop(),), daemon=True).start()
+
+    def _publish_progress(self, loop, payload: dict):
+        loop.call_soon_threadsafe(worker.send_progress_notification, self.channel, payload)
+
+    def _forward_progress(self, loop):
+        """Daemon thread: publish the PROGRESS payloads of the pool processes on the event loop."""
+        while True:
+            self._publish_progress(loop, self.progress_queue.get())
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def drain(self):
+        """Wait until every received job has been acked."""
+        await self._idle.wait()
+
+    def on_message(self, channel, method, properties, body):
+        job_id, file_key, bucket, correlation_id, source_key = worker.parse_job(body)
+        structlog.contextvars.clear_contextvars()
+        if correlation_id:
+            structlog.contextvars.bind_contextvars(correlationId=correlation_id)
+        logger.info("Job received", jobId=job_id, fileKey=file_key, sourceKey=source_key)
+        if not job_id or not file_key:
+            logger.error("Rejected: missing jobId or fileKey")
+            channel.basic_ack(delivery_tag=method.delivery_tag)
+            return
+        metrics.JOBS_IN_FLIGHT.inc()
+        self._in_flight += 1
+        self._idle.clear()
+        self._incoming.put_nowait(Job(method.delivery_tag, job_id, file_key, bucket, correlation_id, source_key,
+                                      getattr(properties, "timestamp", None), timer=worker._new_timer()))
+
+    async def _download_loop(self):
+        while True:
+            job = await self._incoming.get()
+            with structlog.contextvars.bound_contextvars(correlationId=job.correlation_id):
+                try:
+                    await asyncio.to_thread(prepare_job, job)
+                except Exception as e:
+                    logger.error("Error in analysis task", error=str(e))
+                    job.status, job.error = "FAILED", str(e)
+            await self._ready.put(job)
+
+    async def _analyze_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            job = await self._ready.get()
+            with structlog.contextvars.bound_contextvars(correlationId=job.correlation_id):
+                if job.status is None:
+                    queue_wait = max(0.0, time.time() - (job.published or job.received))
+                    metrics.QUEUE_WAIT_SECONDS.observe(queue_wait, lane="jobs")
+                    job.started = perf_counter()
+                    await self._analyze(loop, job)
+                self._spawn(self._complete(job))
+
+    async def _analyze(self, loop, job: Job):
+        try:
+            if job.range_size is not None:
+                (_, job.status, job.incidents), stages = await loop.run_in_executor(
+                    self.executor, worker._run_analysis_in_child, job.job_id, job.file_key, job.bucket,
+                    job.correlation_id, job.source_key)
+                job.handled = True
+            else:
+                progress = None
+                if isinstance(self.executor, ThreadPoolExecutor):
+                    progress = worker.job_progress(job.job_id, job.correlation_id,
+                                                   functools.partial(self._publish_progress, loop))
+                job.incidents, stages = await loop.run_in_executor(
+                    self.executor, analyze_spooled, job.job_id, job.spool_path, job.file_key, job.correlation_id,
+                    job.source_key, progress)
+                job.status = "COMPLETED"
+            job.timer.merge(stages)
+        except BrokenProcessPool as e:
+            logger.error("Analysis process died", jobId=job.job_id, error=str(e))
+            self.executor = create_analysis_executor(self.progress_queue)
+            job.status, job.error = "FAILED", str(e)
+        except Exception as e:
+            logger.error("Error in analysis task", error=str(e))
+            job.status, job.error = "FAILED", str(e)
+
+    async def _complete(self, job: Job):
+        if job.spool_path is not None:
+            os.unlink(job.spool_path)
+            job.spool_path = None
+        with structlog.contextvars.bound_contextvars(correlationId=job.correlation_id):
+            if not job.handled:
+                try:
+                    if job.status == "COMPLETED":
+                        await asyncio.to_thread(worker._complete_job, job.job_id, job.bucket, job.file_key, job.incidents,
+                                                job.timer, job.content_key)
+                    else:
+                        await asyncio.to_thread(worker.with_retry, worker.update_job_status, job.job_id, "FAILED",
+                                                error=job.error, max_retries=2)
+                except Exception as e:
+                    logger.error("Error in analysis task", error=str(e))
+                    if job.status == "COMPLETED":
+                        job.status, job.incidents = "FAILED", None
+                        await asyncio.to_thread(worker.with_retry, worker.update_job_status, job.job_id, "FAILED",
+                                                error=str(e), max_retries=2)
+            metrics.observe_stages(getattr(job.timer, "stages", {}))
+            if job.started is not None:
+                metrics.JOB_SECONDS.observe(perf_counter() - job.started, lane="jobs")
+
+            start = perf_counter()
+            worker.send_result_notification(self.channel, job.job_id, job.status, job.incidents, job.correlation_id)
+            if worker.STAGE_TIMING:
+                metrics.STAGE_SECONDS.observe(perf_counter() - start, stage="notify")
+            self.channel.basic_ack(delivery_tag=job.delivery_tag)
+            metrics.JOBS_IN_FLIGHT.dec()
+            metrics.JOBS_TOTAL.inc(status=job.status)
+        self._in_flight -= 1
+        if self._in_flight == 0:
+            self._idle.set()
+
+
+async def _connect(params: pika.URLParameters):
+    """(connection, channel, closed): an open AsyncioConnection on the running loop, its channel, and a
+    future resolved with the reason when the connection closes."""
+    loop = asyncio.get_running_loop()
+    opened, closed = loop.create_future(), loop.create_future()
+
+    def on_open(connection):
+        connection.channel(on_open_callback=lambda channel: opened.done() or opened.set_result(channel))
+
+    def on_open_error(connection, error):
+        if not opened.done():
+            opened.set_exception(error if isinstance(error, BaseException) else ConnectionError(str(error)))
+
+    def on_close(connection, reason):
+        if not closed.done():
+            closed.set_result(reason)
+
+    connection = AsyncioConnection(params, on_open_callback=on_open, on_open_error_callback=on_open_error,
+                                   on_close_callback=on_close, custom_ioloop=loop)
+    return connection, await opened, closed
+
+
+def _call(method, **kwargs) -> asyncio.Future:
+    """Future of a pika channel method that reports completion through `callback`."""
+    future = asyncio.get_running_loop().create_future()
+    method(callback=lambda frame: future.done() or future.set_result(frame), **kwargs)
+    return future
+
+
+async def serve():
+    """Connect (retrying like worker.start_worker), declare the queues and run the pipeline until the
+    connection closes."""
+    params = pika.URLParameters(worker.RABBIT_URL)
+    for attempt in range(1, 6):
+        try:
+            connection, channel, closed = await _connect(params)
+            break
+        except Exception as e:
+            if attempt == 5:
+                logger.error("Function failed permanently", func="AsyncioConnection", attempts=5, error=str(e))
+                raise
+            logger.warning("Function failed, retrying", func="AsyncioConnection", attempt=attempt, max_retries=5,
+                           sleep_time=3 * attempt, error=str(e))
+            await asyncio.sleep(3 * attempt)
+
+    analyzers = max(1, worker.ANALYSIS_PROCESSES)
+    await _call(channel.queue_declare, queue=worker.JOBS_QUEUE_NAME, durable=True)
+    await _call(channel.queue_declare, queue=worker.RESULTS_QUEUE_NAME, durable=True)
+    await _call(channel.basic_qos, prefetch_count=JobPipeline.prefetch_count(analyzers, worker.ASYNC_PREFETCH_JOBS))
+
+    progress_queue = None
+    if worker.ANALYSIS_PROCESSES > 0 and worker.PROGRESS_INTERVAL_SECONDS > 0:
+        progress_queue = multiprocessing.get_context("spawn").Queue()
+    pipeline = JobPipeline(channel, create_analysis_executor(progress_queue), analyzers, worker.ASYNC_PREFETCH_JOBS,
+                           progress_queue)
+    pipeline.start()
+    channel.basic_consume(queue=worker.JOBS_QUEUE_NAME, on_message_callback=pipeline.on_message)
+    logger.info("Waiting for messages (async). CTRL+C to exit.", analyzers=analyzers, prefetch=worker.ASYNC_PREFETCH_JOBS)
+    try:
+        reason = await closed
+    finally:
+        pipeline.executor.shutdown(wait=False, cancel_futures=True)
+    raise ConnectionError(f"RabbitMQ connection closed: {reason}")
+
+
+def start_async_worker():
+    if not worker.RABBIT_URL or not worker.JOBS_QUEUE_NAME or not worker.RESULTS_QUEUE_NAME:
+        raise RuntimeError("Runtime is not initialized. Call init_runtime_from_env() first.")
+    if worker.METRICS_PORT is not None:
+        metrics.start_metrics_server(worker.METRICS_PORT)
+        logger.info("Serving metrics", port=worker.METRICS_PORT, path="/metrics")
+    asyncio.run(serve())
@@ -0,0 +1,204 @@
+"""Offline batch analysis of local log files, without RabbitMQ, S3 or PostgreSQL (e.g. backfills of
+archived logs).
+
+Files and directories (walked recursively, `--glob` filters names) are analyzed with analyze_log in
+a pool of spawned processes, one file per task. gzip, bz2 and zstd files are decompressed as they
+stream, as in the worker. Output is JSON Lines: one line per incident with its file (`--out`), and
+one line per analyzed file with its size, lines, seconds and per-stage timings (the checkpoint,
+`<out>.checkpoint.jsonl` by default).
+
+The checkpoint makes a backfill resumable. A file is skipped when the checkpoint already has it with
+the same size and modification time. Each checkpoint line also records the length of the incidents
+file after that file's incidents were written, so a run interrupted between the two writes cuts the
+incidents file back to the last checkpointed length. Files that failed are retried on the next run.
+
+Run from ml-service/:
+  python batch.py /archive/2025-01 /archive/2025-02 --out incidents.jsonl --processes 8
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from fnmatch import fnmatch
+from pathlib import Path
+from time import perf_counter
+
+from anomaly import LineBatches, MiningConfig, SpillConfig, StageTimer, StreamingConfig, analyze_log, resolve_masks
+from worker import iter_decompressed, iter_line_batches, logger
+
+READ_CHUNK_BYTES = 2 * 1024 * 1024
+
+
+def iter_input_files(paths: list[str], pattern: str = "*"):
+    """Files named by `paths`, with directories walked recursively in sorted order; names under a
+    directory must match `pattern` (files named directly always count)."""
+    for path in map(Path, paths):
+        if path.is_dir():
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    if fnmatch(name, pattern):
+                        yield Path(root) / name
+        else:
+            yield path
+
+
+def _file_id(path: Path) -> tuple[str, int, int]:
+    """(absolute path, size, mtime_ns): a checkpointed file is skipped only while all three match."""
+    stat = path.stat()
+    return str(path.resolve()), stat.st_size, stat.st_mtime_ns
+
+
+def analyze_file(path: str, mining: MiningConfig | None = None, streaming: StreamingConfig | None = None,
+                 spill: SpillConfig | None = None) -> dict:
+    """Runs in a pool process (or inline): analyze one local file. Returns its incidents with the
+    lines, seconds and per-stage timings, or the error when the file cannot be analyzed."""
+    timer = StageTimer()
+    start = perf_counter()
+    try:
+        with open(path, "rb") as f:
+            chunks = iter(lambda: f.read(READ_CHUNK_BYTES), b"")
+            lines = LineBatches(iter_line_batches(iter_decompressed(chunks, path, READ_CHUNK_BYTES)))
+            incidents = analyze_log(lines, timer=timer, mining=mining, streaming=streaming, spill=spill)
+    except Exception as e:
+        return {"error": f"{type(e).__name__}: {e}", "seconds": perf_counter() - start}
+    stages = {name: {**s, "seconds": round(s["seconds"], 4)} for name, s in timer.stages.items()}
+    return {
+        "incidents": incidents,
+        # With collapsed repeats the "mine" stage sees one or two lines per run; "collapse" sees them all
+        "lines": timer.stages.get("collapse", timer.stages.get("mine", {})).get("lines", 0),
+        "seconds": perf_counter() - start,
+        "stages": stages,
+    }
+
+
+class Checkpoint:
+    """The per-file JSON Lines log of a batch run: which files are done, and how long the incidents
+    file was after each one."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.done: set[tuple] = set()
+        self.out_length = 0
+        if path.exists():
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # a line cut short by an interrupted write
+                    if "error" not in record:
+                        self.done.add((record["file"], record["bytes"], record["mtime_ns"]))
+                        self.out_length = max(self.out_length, record["out_length"])
+
+    def is_done(self, file_id: tuple) -> bool:
+        return file_id in self.done
+
+
+def run_batch(paths: list[str], out: str, checkpoint: str | None = None, processes: int = 0, pattern: str = "*",
+              mining: MiningConfig | None = None, streaming: StreamingConfig | None = None,
+              spill: SpillConfig | None = None) -> dict:
+    """
+    Analyze every input file not yet in the checkpoint and append its incidents to `out`.
+    processes: size of the spawned process pool; 0 analyzes in this process.
+    Returns totals for this run: files analyzed, skipped and failed, lines, bytes, incidents, seconds.
+    """
+    out_path = Path(out)
+    state = Checkpoint(Path(checkpoint) if checkpoint else out_path.with_name(out_path.name + ".checkpoint.jsonl"))
+    # Incidents written after the last checkpointed file belong to a file that will be analyzed again
+    if out_path.exists() and out_path.stat().st_size > state.out_length:
+        logger.info("Truncating incidents written after the last checkpoint", out=str(out_path),
+                    length=state.out_length)
+        os.truncate(out_path, state.out_length)
+
+    totals = {"files": 0, "skipped": 0, "failed": 0, "lines": 0, "bytes": 0, "incidents": 0}
+    todo = []
+    for path in iter_input_files(paths, pattern):
+        file_id = _file_id(path)
+        if state.is_done(file_id):
+            totals["skipped"] += 1
+        else:
+            todo.append(file_id)
+    logger.info("Batch analysis", files=len(todo), skipped=totals["skipped"], processes=processes)
+
+    start = perf_counter()
+    with open(out_path, "a", encoding="utf-8") as out_file, open(state.path, "a", encoding="utf-8") as ckpt_file:
+
+        def record(file_id: tuple, result: dict):
+            name, size, mtime_ns = file_id
+            entry = {"file": name, "bytes": size, "mtime_ns": mtime_ns, "seconds": round(result["seconds"], 4)}
+            if "error" in result:
+                totals["failed"] += 1
+                entry["error"] = result["error"]
+                logger.error("File failed", file=name, error=result["error"])
+            else:
+                for incident in result["incidents"]:
+                    out_file.write(json.dumps({"file": name, **incident}) + "\n")
+                # The incidents are on disk before the checkpoint says the file is done
+                out_file.flush()
+                os.fsync(out_file.fileno())
+                entry.update(lines=result["lines"], incidents=len(result["incidents"]), stages=result["stages"],
+                             out_length=out_file.tell())
+                totals["files"] += 1
+                totals["lines"] += result["lines"]
+                totals["bytes"] += size
+                totals["incidents"] += len(result["incidents"])
+                logger.info("File analyzed", file=name, lines=result["lines"], incidents=len(result["incidents"]),
+                            seconds=entry["seconds"])
+            ckpt_file.write(json.dumps(entry) + "\n")
+            ckpt_file.flush()
+
+        if processes <= 0:
+            for file_id in todo:
+                record(file_id, analyze_file(file_id[0], mining, streaming, spill))
+        else:
+            with ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context("spawn")) as pool:
+                # At most two files per process are queued, so huge directories do not pile up futures
+                pending = {}
+                files = iter(todo)
+                while True:
+                    for file_id in files:
+                        pending[pool.submit(analyze_file, file_id[0], mining, streaming, spill)] = file_id
+                        if len(pending) >= 2 * processes:
+                            break
+                    if not pending:
+                        break
+                    finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        record(pending.pop(future), future.result())
+
+    totals["seconds"] = round(perf_counter() - start, 3)
+    return totals
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("paths", nargs="+", help="log files or directories (walked recursively)")
+    ap.add_argument("--out", required=True, help="incidents JSON Lines file (appended to)")
+    ap.add_argument("--checkpoint", help="checkpoint JSON Lines file (default: <out>.checkpoint.jsonl)")
+    ap.add_argument("--processes", type=int, default=os.cpu_count(), help="analysis processes (0 = this process)")
+    ap.add_argument("--glob", default="*", help="file name pattern inside directories")
+    ap.add_argument("--masks", default="", help="MINING_MASKS: a mask profile or comma-separated mask names")
+    ap.add_argument("--max-clusters", type=int, help="MINING_MAX_CLUSTERS")
+    ap.add_argument("--engine", default="drain3", help="MINING_ENGINE: drain3 or native")
+    ap.add_argument("--collapse-repeats", action="store_true",
+                    help="MINING_COLLAPSE_REPEATS: mine runs of lines repeated apart from their timestamp once")
+    ap.add_argument("--segment-lines", type=int, help="STREAMING_SEGMENT_LINES: analyze in bounded-memory segments")
+    ap.add_argument("--spill-memory-limit", type=int, help="SPILL_MEMORY_LIMIT_BYTES: per-line arrays above it go to disk")
+    ap.add_argument("--spill-dir", help="SPILL_DIR: scratch directory for spilled arrays")
+    args = ap.parse_args(argv)
+
+    mining = MiningConfig(masks=resolve_masks(args.masks), max_clusters=args.max_clusters, engine=args.engine,
+                          collapse_repeats=args.collapse_repeats)
+    streaming = StreamingConfig(segment_lines=args.segment_lines) if args.segment_lines else None
+    spill = SpillConfig(args.spill_memory_limit, args.spill_dir) if args.spill_memory_limit is not None else None
+    totals = run_batch(args.paths, args.out, args.checkpoint, args.processes, args.glob, mining, streaming, spill)
+    rate = totals["lines"] / totals["seconds"] if totals["seconds"] else 0.0
+    logger.info("Batch finished", **totals, linesPerSecond=round(rate))
+    return 1 if totals["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
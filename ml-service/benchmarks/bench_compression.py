@@ -0,0 +1,87 @@
+"""Compressed uploads: bytes stored/transferred and streaming read throughput per codec vs plain text.
+
+Reads go through the worker's path (iter_chunks -> iter_decompressed -> iter_line_batches) on Moto's
+in-process S3, so throughput is CPU-side (decompress + split), not network bandwidth. On a real link,
+transfer time shrinks by the compression ratio.
+
+Run from ml-service/:  python benchmarks/bench_compression.py [--mb 64] [--analyze-lines 100000]
+"""
+import argparse
+import bz2
+import gzip
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import boto3
+from moto import mock_aws
+
+_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(_root))
+sys.path.insert(0, str(_root / "tests"))
+
+import worker  # noqa: E402
+from anomaly import LineBatches, analyze_log  # noqa: E402
+from test_anomaly import generate_test_logs  # noqa: E402
+
+BUCKET = "bench"
+CHUNK = 2 * 1024 * 1024
+
+
+def codecs() -> dict:
+    found = {"plain": (lambda d: d, "log.txt"), "gzip": (gzip.compress, "log.txt.gz"), "bz2": (bz2.compress, "log.txt.bz2")}
+    if worker.ZstdFile is not None:
+        from compression import zstd
+        found["zstd"] = (zstd.compress, "log.txt.zst")
+    elif worker.zstandard is not None:
+        found["zstd"] = (worker.zstandard.ZstdCompressor().compress, "log.txt.zst")
+    return found
+
+
+def make_log(num_lines: int) -> bytes:
+    with tempfile.NamedTemporaryFile(suffix=".log") as f:
+        generate_test_logs(filename=f.name, num_lines=num_lines, seed=7)
+        return Path(f.name).read_bytes()
+
+
+def open_lines(s3, key) -> LineBatches:
+    body = s3.get_object(Bucket=BUCKET, Key=key)["Body"]
+    return LineBatches(worker.iter_line_batches(worker.iter_decompressed(body.iter_chunks(chunk_size=CHUNK), key, CHUNK)))
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--mb", type=int, default=64)
+    ap.add_argument("--analyze-lines", type=int, default=100_000)
+    args = ap.parse_args()
+
+    with mock_aws():
+        s3 = boto3.client("s3", region_name="us-east-1")
+        s3.create_bucket(Bucket=BUCKET)
+        sample = make_log(50_000)
+        data = sample * max(1, args.mb * 1024 * 1024 // len(sample))
+        mb = len(data) / 1e6
+        print(f"read only: {mb:.0f} MB uncompressed")
+        print(f"{'codec':<8}{'stored MB':>10}{'ratio':>8}{'lines/s':>14}{'MB/s (plain)':>14}")
+        for name, (compress, key) in codecs().items():
+            blob = compress(data)
+            s3.put_object(Bucket=BUCKET, Key=key, Body=blob)
+            t0 = time.perf_counter()
+            n = sum(len(batch) for batch in open_lines(s3, key))
+            dt = time.perf_counter() - t0
+            print(f"{name:<8}{len(blob) / 1e6:>10.1f}{len(data) / len(blob):>8.1f}{n / dt:>14,.0f}{mb / dt:>14.1f}")
+            s3.delete_object(Bucket=BUCKET, Key=key)
+
+        log = make_log(args.analyze_lines)
+        print(f"\nend to end analyze_log: {args.analyze_lines:,} lines")
+        for name, (compress, key) in codecs().items():
+            s3.put_object(Bucket=BUCKET, Key=key, Body=compress(log))
+            t0 = time.perf_counter()
+            analyze_log(open_lines(s3, key))
+            dt = time.perf_counter() - t0
+            print(f"{name:<8}{args.analyze_lines / dt:>14,.0f} lines/s")
+
+
+if __name__ == "__main__":
+    main()
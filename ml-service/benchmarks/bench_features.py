@@ -0,0 +1,59 @@
+"""Steps 1-2 of analyze_log without mining: per-line timestamp/severity/length vs chunked extraction.
+
+Run from ml-service/:  python benchmarks/bench_features.py [--lines 500000]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from anomaly import (  # noqa: E402
+    FEATURE_CHUNK_SIZE,
+    TimestampExtractor,
+    extract_line_features,
+    get_severity_score,
+)
+from bench_timestamps import FORMATS, make_lines  # noqa: E402
+
+
+def per_line(lines):
+    extract = TimestampExtractor()
+    ts = [extract(line) for line in lines]
+    severity = np.array([get_severity_score(line) for line in lines])
+    lengths = np.array([len(line) for line in lines], dtype=np.float64)
+    ts_float = np.array([t.timestamp() if t is not None else np.nan for t in ts])
+    return severity, lengths, ts_float
+
+
+def chunked(lines):
+    extract = TimestampExtractor()
+    parts = [extract_line_features(lines[i:i + FEATURE_CHUNK_SIZE], extract)
+             for i in range(0, len(lines), FEATURE_CHUNK_SIZE)]
+    return tuple(np.concatenate(col) for col in zip(*parts))
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--lines", type=int, default=500_000)
+    args = ap.parse_args()
+
+    print(f"{'format':<14}{'per-line l/s':>14}{'chunked l/s':>14}{'speedup':>10}")
+    for fmt in FORMATS:
+        lines = make_lines(fmt, args.lines)
+        t0 = time.perf_counter()
+        expected = per_line(lines)
+        t1 = time.perf_counter()
+        got = chunked(lines)
+        t2 = time.perf_counter()
+        for a, b in zip(expected, got):
+            np.testing.assert_array_equal(a, b)
+        before, after = len(lines) / (t1 - t0), len(lines) / (t2 - t1)
+        print(f"{fmt:<14}{before:>14,.0f}{after:>14,.0f}{after / before:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Per-line memory of analyze_log's step-1 state: the previous per-line Python lists vs LineColumns.
+
+Drain3 returns a freshly built template string for every line, which the old code kept in
+template_list next to one datetime per line. The benchmark replays that state (no mining) and
+reports tracemalloc bytes per line: peak (including buffer growth) and retained at the end.
+
+Run from ml-service/:  python benchmarks/bench_memory.py [--lines 1000000 10000000]
+"""
+import argparse
+import array
+import sys
+import tracemalloc
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from anomaly import FEATURE_CHUNK_SIZE, LineColumns, TemplateTable  # noqa: E402
+
+TEMPLATES = [
+    "INFO <*> Task <*> completed successfully in <*>",
+    "INFO <*> Heartbeat sent to master at <*>",
+    "INFO <*> Saved output to <*>",
+    "ERROR Worker-node-7: Connection refused to database at <*>",
+]
+START = datetime(2024, 1, 15)
+
+
+def old_layout(n: int) -> tuple[int, int]:
+    tracemalloc.start()
+    ts_list, cluster_id_list, template_list = [], [], []
+    severity_list, len_list = array.array("d"), array.array("d")
+    for i in range(n):
+        ts_list.append(START + timedelta(seconds=i))
+        cluster_id_list.append(i % 4 + 1)
+        template_list.append("".join(TEMPLATES[i % 4]))  # new str per line, as from Drain3
+        severity_list.append(0.0)
+        len_list.append(80.0)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak, current
+
+
+def new_layout(n: int) -> tuple[int, int]:
+    tracemalloc.start()
+    table, store = TemplateTable(), LineColumns()
+    keys = []
+    for i in range(n):
+        keys.append(table.key(i % 4 + 1, "".join(TEMPLATES[i % 4]), "raw line"))
+        if len(keys) == FEATURE_CHUNK_SIZE or i == n - 1:
+            m = len(keys)
+            store.append(np.arange(m, dtype=np.float64), np.array(keys, dtype=np.int32),
+                         np.zeros(m, dtype=np.float32), np.full(m, 80.0, dtype=np.float32))
+            keys.clear()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak, current
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--lines", type=int, nargs="+", default=[1_000_000])
+    args = ap.parse_args()
+
+    print(f"{'lines':>12}{'old peak':>10}{'new peak':>10}{'new kept':>10}  (bytes/line){'old MiB':>10}{'new MiB':>10}")
+    for n in args.lines:
+        (before, _), (after, kept) = old_layout(n), new_layout(n)
+        print(f"{n:>12,}{before / n:>10.1f}{after / n:>10.1f}{kept / n:>10.1f}{'':>14}{before / 2**20:>10.0f}{after / 2**20:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""Template mining with and without token masking / a cluster bound, on the Drain3 and native
+engines: throughput, miner memory and cluster count.
+
+Corpora: loggen's synthetic mix; "realistic" service logs full of high-cardinality tokens (client
+IP:port, request ids, UUIDs, hex addresses, durations, status codes) in the shapes of access,
+database, queue and GC lines; and "long tail", the same with 5% free-text validation messages of
+varying wording and length, which keep creating Drain3 clusters.
+
+"miner KB" is the memory the miner holds after mining the corpus (tracemalloc, separate run).
+
+Run from ml-service/:  python benchmarks/bench_mining.py [--lines 200k] [--max-clusters 500]
+                       [--engines drain3,native]
+"""
+import argparse
+import random
+import sys
+import tracemalloc
+import uuid
+from pathlib import Path
+
+_here = Path(__file__).resolve().parent
+sys.path.insert(0, str(_here.parent))
+sys.path.insert(0, str(_here))
+
+from anomaly import MASK_PROFILES, MiningConfig, StageTimer, analyze_log, mine_log  # noqa: E402
+from loggen import iter_log_lines, parse_count  # noqa: E402
+
+PATHS = ["/api/v1/users", "/api/v1/orders", "/api/v1/cart", "/healthz", "/api/v2/search", "/static/app.js"]
+QUEUES = ["billing", "email", "thumbnails", "audit"]
+WORDS = [f"{stem}{suffix}" for stem in ("field", "value", "user", "order", "item", "address", "country", "price",
+                                        "quantity", "currency", "coupon", "email", "phone", "name", "date")
+         for suffix in ("", "s", "_id", "_code", "_name", "_list")]
+
+
+def realistic_lines(num_lines: int, seed: int = 7, free_text: float = 0.0) -> list[str]:
+    rng = random.Random(seed)
+    lines = []
+    for i in range(num_lines):
+        ts = f"2024-03-01T12:{i // 60 % 60:02d}:{i % 60:02d}.{rng.randint(0, 999):03d}Z"
+        ip = f"10.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}:{rng.randint(1024, 65535)}"
+        req = f"{rng.getrandbits(64):016x}"
+        if rng.random() < free_text:
+            lines.append(f"{ts} WARN validation failed request_id={req}: " + " ".join(rng.choices(WORDS, k=rng.randint(3, 14))))
+            continue
+        r = rng.random()
+        if r < 0.45:
+            lines.append(f"{ts} INFO http request_id={req} client={ip} method=GET path={rng.choice(PATHS)} "
+                         f"status={rng.choice((200, 200, 200, 201, 304, 404))} bytes={rng.randint(80, 90000)} "
+                         f"took {rng.uniform(0.2, 900):.1f}ms")
+        elif r < 0.65:
+            lines.append(f"{ts} DEBUG db query trace={uuid.UUID(int=rng.getrandbits(128))} rows={rng.randint(0, 500)} "
+                         f"took {rng.randint(1, 250)}ms pool=0x{rng.getrandbits(40):x}")
+        elif r < 0.8:
+            lines.append(f"{ts} INFO queue {rng.choice(QUEUES)} consumer {req[:12]} acked message "
+                         f"{uuid.UUID(int=rng.getrandbits(128))} after {rng.randint(1, 30)} attempts")
+        elif r < 0.95:
+            lines.append(f"{ts} INFO gc pause young {rng.uniform(1, 40):.2f}ms heap {rng.randint(200, 4000)}MB "
+                         f"-> {rng.randint(100, 2000)}MB")
+        elif r < 0.999:
+            lines.append(f"{ts} WARN upstream {ip} slow response request_id={req} after {rng.uniform(1, 9):.2f}s")
+        else:
+            lines.append(f"{ts} ERROR worker crashed at 0x{rng.getrandbits(48):012x}: segmentation fault "
+                         f"request_id={req}")
+    return lines
+
+
+def run(lines: list[str], mining: MiningConfig) -> dict:
+    timer = StageTimer()
+    mined = mine_log(lines, timer=timer, mining=mining)
+    seconds = sum(timer.stages[s]["seconds"] for s in ("mask", "mine") if s in timer.stages)
+    return {
+        "lines_per_sec": len(lines) / seconds,
+        "mask_s": timer.stages.get("mask", {}).get("seconds", 0.0),
+        "clusters": len(mined.cluster_templates),
+        "templates": len(mined.table.templates),
+        "miner_kb": miner_memory(lines, mining) / 1024,
+        "incidents": len(analyze_log(lines, mining=mining)),
+    }
+
+
+def miner_memory(lines: list[str], mining: MiningConfig) -> int:
+    tracemalloc.start()
+    miner = mining.make_miner()
+    mined = mine_log(lines, miner=miner, mining=mining)
+    del mined
+    held = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return held
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--lines", default="200k")
+    ap.add_argument("--max-clusters", type=int, default=500)
+    ap.add_argument("--engines", default="drain3,native")
+    args = ap.parse_args()
+    n = parse_count(args.lines)
+
+    corpora = {"synthetic": list(iter_log_lines(n, "iso")), "realistic": realistic_lines(n),
+               "long tail": realistic_lines(n, free_text=0.05)}
+    configs = {
+        "no masks": {},
+        "default masks": {"masks": MASK_PROFILES["default"]},
+        f"masks + max {args.max_clusters}": {"masks": MASK_PROFILES["default"], "max_clusters": args.max_clusters},
+    }
+    print(f"{'corpus':<11}{'config':<22}{'engine':<8}{'mine l/s':>11}{'mask s':>8}{'miner KB':>10}"
+          f"{'clusters':>10}{'templates':>11}{'incidents':>10}")
+    for corpus, lines in corpora.items():
+        for name, settings in configs.items():
+            for engine in args.engines.split(","):
+                r = run(lines, MiningConfig(engine=engine, **settings))
+                print(f"{corpus:<11}{name:<22}{engine:<8}{r['lines_per_sec']:>11,.0f}{r['mask_s']:>8.2f}"
+                      f"{r['miner_kb']:>10,.0f}{r['clusters']:>10,}{r['templates']:>11,}{r['incidents']:>10}")
+
+
+if __name__ == "__main__":
+    main()
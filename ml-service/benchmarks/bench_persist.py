@@ -0,0 +1,93 @@
+"""Incident persistence: update_job_status with COPY vs the executemany INSERT fallback.
+
+Runs against a testcontainers PostgreSQL (same image and schema as tests/conftest.py), or an existing
+database via --url (tables are created if missing). Each case writes N incidents for a fresh job in
+one transaction, like a real COMPLETED update.
+
+Run from ml-service/:  python benchmarks/bench_persist.py [--counts 100 10k 100k] [--url postgresql://...]
+"""
+import argparse
+import sys
+import time
+from contextlib import nullcontext
+from pathlib import Path
+from unittest.mock import patch
+
+from sqlalchemy import create_engine, text
+
+_here = Path(__file__).resolve().parent
+sys.path.insert(0, str(_here.parent))
+sys.path.insert(0, str(_here))
+
+import worker  # noqa: E402
+from loggen import parse_count  # noqa: E402
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS "AnalysisJob" (id VARCHAR PRIMARY KEY, status VARCHAR, "incidentCount" INT)',
+    'CREATE TABLE IF NOT EXISTS "Incident" (id VARCHAR PRIMARY KEY, "jobId" VARCHAR, "incidentTemplate" VARCHAR, '
+    'occurrences INT, "avgScore" FLOAT, severity VARCHAR, "exampleLog" TEXT)',
+)
+
+
+def make_incidents(n: int) -> list[dict]:
+    return [{
+        "incident_template": f"<*> worker-{i % 97} failed to process request <*> after <*> ms: code {i}",
+        "occurrences": 1 + i % 50,
+        "avg_score": 0.5 + (i % 1000) / 2000,
+        "severity": ("LOW", "MEDIUM", "HIGH", "CRITICAL")[i % 4],
+        "example_log": f"2024-03-01 12:00:{i % 60:02d} ERROR worker-{i % 97} failed to process request {i} after {i % 900} ms",
+    } for i in range(n)]
+
+
+def run_case(engine, incidents: list[dict], method: str, job_id: str) -> float:
+    with engine.begin() as conn:
+        conn.execute(text('INSERT INTO "AnalysisJob" (id, status) VALUES (:id, \'PENDING\')'), {"id": job_id})
+    fallback = patch.object(worker, "_copy_incidents", return_value=False) if method == "executemany" else nullcontext()
+    with fallback:
+        start = time.perf_counter()
+        worker.update_job_status(job_id, "COMPLETED", incidents)
+        seconds = time.perf_counter() - start
+    with engine.connect() as conn:
+        stored = conn.execute(text('SELECT count(*) FROM "Incident" WHERE "jobId" = :id'), {"id": job_id}).scalar()
+    assert stored == len(incidents), (method, stored)
+    return seconds
+
+
+def bench(url: str, counts: list[int], repeat: int):
+    engine = create_engine(url)
+    with engine.begin() as conn:
+        for statement in SCHEMA:
+            conn.execute(text(statement))
+    worker.db_engine = engine
+
+    print(f"{'incidents':>10}{'executemany s':>15}{'copy s':>10}{'speedup':>9}")
+    for n in counts:
+        incidents = make_incidents(n)
+        best = {}
+        for method in ("executemany", "copy"):
+            best[method] = min(run_case(engine, incidents, method, f"bench-{method}-{n}-{r}") for r in range(repeat))
+        print(f"{n:>10,}{best['executemany']:>15.3f}{best['copy']:>10.3f}{best['executemany'] / best['copy']:>8.1f}x")
+    with engine.begin() as conn:
+        conn.execute(text('DELETE FROM "Incident" WHERE "jobId" LIKE \'bench-%\''))
+        conn.execute(text('DELETE FROM "AnalysisJob" WHERE id LIKE \'bench-%\''))
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--counts", nargs="+", default=["100", "10k", "100k"])
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--url", help="existing PostgreSQL URL; default starts postgres:15-alpine with testcontainers")
+    args = ap.parse_args()
+    counts = [parse_count(c) for c in args.counts]
+
+    if args.url:
+        bench(args.url, counts, args.repeat)
+        return
+    from testcontainers.postgres import PostgresContainer
+
+    with PostgresContainer("postgres:15-alpine") as postgres:
+        bench(postgres.get_connection_url(), counts, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""S3 ingestion: StreamingBody.iter_lines + per-line decode (old path) vs bulk chunked reader.
+
+Uses Moto's in-process S3 as a local stand-in, so absolute throughput reflects Python-side
+overhead (read, split, decode) rather than network bandwidth.
+
+1) Read only: lines/sec and MB/s draining the body into lines.
+2) End to end: analyze_log lines/sec fed by each reader.
+
+Run from ml-service/:  python benchmarks/bench_s3_ingest.py [--mb 64] [--analyze-lines 200000]
+"""
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import boto3
+from moto import mock_aws
+
+_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(_root))
+sys.path.insert(0, str(_root / "tests"))
+
+from anomaly import LineBatches, analyze_log  # noqa: E402
+from test_anomaly import generate_test_logs  # noqa: E402
+from worker import iter_line_batches  # noqa: E402
+
+BUCKET = "bench"
+
+
+def old_reader(s3, key):
+    body = s3.get_object(Bucket=BUCKET, Key=key)["Body"]
+    return (line.decode("utf-8", errors="replace") for line in body.iter_lines())
+
+
+def bulk_reader(s3, key, chunk_bytes):
+    body = s3.get_object(Bucket=BUCKET, Key=key)["Body"]
+    return LineBatches(iter_line_batches(body.iter_chunks(chunk_size=chunk_bytes)))
+
+
+def make_log(num_lines: int) -> bytes:
+    with tempfile.NamedTemporaryFile(suffix=".log") as f:
+        generate_test_logs(filename=f.name, num_lines=num_lines, seed=7)
+        return Path(f.name).read_bytes()
+
+
+def drain(source) -> int:
+    n = 0
+    if isinstance(source, LineBatches):
+        for batch in source:
+            n += len(batch)
+    else:
+        for line in source:
+            line.strip()
+            n += 1
+    return n
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--mb", type=int, default=64, help="size of the read-only test object")
+    ap.add_argument("--analyze-lines", type=int, default=200_000)
+    ap.add_argument("--chunk-mb", type=float, nargs="+", default=[1, 2, 8])
+    args = ap.parse_args()
+
+    with mock_aws():
+        s3 = boto3.client("s3", region_name="us-east-1")
+        s3.create_bucket(Bucket=BUCKET)
+
+        sample = make_log(50_000)
+        data = sample * max(1, args.mb * 1024 * 1024 // len(sample))
+        s3.put_object(Bucket=BUCKET, Key="read.log", Body=data)
+        mb = len(data) / 1e6
+        print(f"read only: {mb:.0f} MB")
+        print(f"{'reader':<22}{'lines/s':>14}{'MB/s':>10}")
+        readers = [("iter_lines + decode", None)] + [(f"bulk {c:g} MiB chunks", int(c * 1024 * 1024)) for c in args.chunk_mb]
+
+        def open_reader(key, chunk_bytes):
+            return old_reader(s3, key) if chunk_bytes is None else bulk_reader(s3, key, chunk_bytes)
+
+        for name, chunk_bytes in readers:
+            t0 = time.perf_counter()
+            n = drain(open_reader("read.log", chunk_bytes))
+            dt = time.perf_counter() - t0
+            print(f"{name:<22}{n / dt:>14,.0f}{mb / dt:>10.1f}")
+
+        log = make_log(args.analyze_lines)
+        s3.put_object(Bucket=BUCKET, Key="analyze.log", Body=log)
+        print(f"\nend to end analyze_log: {args.analyze_lines:,} lines")
+        for name, chunk_bytes in readers:
+            t0 = time.perf_counter()
+            analyze_log(open_reader("analyze.log", chunk_bytes))
+            dt = time.perf_counter() - t0
+            print(f"{name:<22}{args.analyze_lines / dt:>14,.0f} lines/s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Sample-fit / full-score mode: fit and score time vs rows, and incident drift vs the full fit.
+
+1) Timing on synthetic feature matrices: full fit vs reservoir + sample fit, and plain vs
+   block-parallel scoring.
+2) Incident differences against the full-fit baseline on logs from tests/test_anomaly.py's
+   generate_test_logs.
+
+Run from ml-service/:  python benchmarks/bench_sample_fit.py [--rows 1000000 4000000] [--log-lines 50000]
+"""
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(_root))
+sys.path.insert(0, str(_root / "tests"))
+
+from anomaly import ModelConfig, ReservoirSampler, analyze_log, score_in_blocks  # noqa: E402
+from test_anomaly import generate_test_logs  # noqa: E402
+
+
+def synthetic_features(n: int, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    X = np.column_stack((
+        rng.choice([0.0, 1.0, 3.0], n, p=[0.9, 0.08, 0.02]),
+        np.log1p(rng.exponential(1.0, n)),
+        rng.normal(0.16, 0.03, n),
+        rng.choice([0.4, 0.3, 0.2, 0.1], n),
+        rng.uniform(0.1, 0.4, n),
+    ))
+    return X
+
+
+def timed(fn):
+    t0 = time.perf_counter()
+    out = fn()
+    return out, time.perf_counter() - t0
+
+
+def bench_timing(rows: list[int], sample: int, n_jobs: int, max_samples):
+    full_cfg = ModelConfig(max_samples=max_samples)
+    fast_cfg = ModelConfig(max_samples=max_samples, fit_sample_size=sample, n_jobs=n_jobs)
+    print(f"fit_sample_size={sample:,}  max_samples={max_samples}  n_jobs={n_jobs}")
+    print(f"{'rows':>12}{'full fit s':>12}{'sample fit s':>14}{'score s':>10}{'block score s':>15}")
+    for n in rows:
+        X = synthetic_features(n)
+        full, t_full = timed(lambda: full_cfg.make_forest().fit(X))
+
+        def fit_sampled():
+            reservoir = ReservoirSampler(sample)
+            for start in range(0, n, 65_536):
+                reservoir.add(min(65_536, n - start))
+            return fast_cfg.make_forest().fit(X[reservoir.sample()])
+
+        _, t_fast = timed(fit_sampled)
+        _, t_score = timed(lambda: full.decision_function(X))
+        _, t_block = timed(lambda: score_in_blocks(full, X, n_jobs))
+        print(f"{n:>12,}{t_full:>12.2f}{t_fast:>14.2f}{t_score:>10.2f}{t_block:>15.2f}")
+
+
+def bench_incident_drift(log_lines: int, samples: list[int]):
+    print(f"\nincident drift vs full fit ({log_lines:,} generator lines)")
+    print(f"{'seed':>6}{'sample':>10}{'full':>6}{'mode':>6}{'only full':>11}{'only mode':>11}")
+    for seed in (1, 42, 123):
+        with tempfile.NamedTemporaryFile(suffix=".log") as f:
+            generate_test_logs(filename=f.name, num_lines=log_lines, seed=seed)
+            lines = Path(f.name).read_text(encoding="utf-8").strip().split("\n")
+        base = {r["incident_template"] for r in analyze_log(lines)}
+        for sample in samples:
+            got = {r["incident_template"] for r in analyze_log(lines, model=ModelConfig(fit_sample_size=sample))}
+            print(f"{seed:>6}{sample:>10,}{len(base):>6}{len(got):>6}{len(base - got):>11}{len(got - base):>11}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--rows", type=int, nargs="+", default=[1_000_000, 4_000_000])
+    ap.add_argument("--sample", type=int, default=256_000)
+    ap.add_argument("--n-jobs", type=int, default=-1)
+    ap.add_argument("--max-samples", default="auto", help='"auto", an int, or a float fraction')
+    ap.add_argument("--log-lines", type=int, default=50_000)
+    args = ap.parse_args()
+    max_samples = args.max_samples
+    if max_samples != "auto":
+        max_samples = float(max_samples) if "." in max_samples else int(max_samples)
+    bench_timing(args.rows, args.sample, args.n_jobs, max_samples)
+    bench_incident_drift(args.log_lines, [2_000, 10_000, 25_000])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""analyze_log on the whole input vs streaming segments (analyze_stream): peak memory, time to the
+first result, total time and how the final incidents compare.
+
+Lines are generated lazily (loggen), so the input itself takes no memory; peak memory is the
+tracemalloc peak of the analysis. "same incidents" counts incident templates present in both
+results; "same occurrences" those that also have the same occurrence count.
+
+Run from ml-service/:  python benchmarks/bench_streaming.py [--lines 200k 1M] [--segment-lines 100k]
+"""
+import argparse
+import sys
+import tracemalloc
+from pathlib import Path
+from time import perf_counter
+
+_here = Path(__file__).resolve().parent
+sys.path.insert(0, str(_here.parent))
+sys.path.insert(0, str(_here))
+
+from anomaly import StreamingConfig, analyze_log, analyze_stream  # noqa: E402
+from loggen import iter_log_lines, parse_count  # noqa: E402
+
+
+def run_batch(n: int) -> dict:
+    tracemalloc.start()
+    start = perf_counter()
+    incidents = analyze_log(iter_log_lines(n, "iso"))
+    seconds = perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {"peak_mb": peak / 2**20, "first_s": seconds, "total_s": seconds, "incidents": incidents}
+
+
+def run_streaming(n: int, streaming: StreamingConfig) -> dict:
+    tracemalloc.start()
+    start = perf_counter()
+    first = None
+    incidents = []
+    for incidents in analyze_stream(iter_log_lines(n, "iso"), streaming=streaming):
+        if first is None:
+            first = perf_counter() - start
+    seconds = perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {"peak_mb": peak / 2**20, "first_s": first, "total_s": seconds, "incidents": incidents}
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--lines", nargs="+", default=["200k", "1M"])
+    ap.add_argument("--segment-lines", default="100k")
+    ap.add_argument("--reservoir", default="50k")
+    args = ap.parse_args()
+    streaming = StreamingConfig(segment_lines=parse_count(args.segment_lines), reservoir_size=parse_count(args.reservoir))
+
+    print(f"{'lines':>10}{'mode':>11}{'peak MB':>10}{'first s':>10}{'total s':>10}{'incidents':>11}"
+          f"{'same incidents':>16}{'same occurrences':>18}")
+    for n in map(parse_count, args.lines):
+        batch = run_batch(n)
+        stream = run_streaming(n, streaming)
+        occurrences = {i["incident_template"]: i["occurrences"] for i in batch["incidents"]}
+        same = [i for i in stream["incidents"] if i["incident_template"] in occurrences]
+        same_occ = sum(1 for i in same if occurrences[i["incident_template"]] == i["occurrences"])
+        for mode, r in (("full", batch), ("streaming", stream)):
+            extra = f"{len(same):>16}{same_occ:>18}" if mode == "streaming" else ""
+            print(f"{n:>10,}{mode:>11}{r['peak_mb']:>10.1f}{r['first_s']:>10.1f}{r['total_s']:>10.1f}"
+                  f"{len(r['incidents']):>11}{extra}")
+
+
+if __name__ == "__main__":
+    main()
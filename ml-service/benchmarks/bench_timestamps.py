@@ -0,0 +1,52 @@
+"""Per-format timestamp extraction throughput: extract_timestamp_robust vs TimestampExtractor.
+
+Run from ml-service/:  python benchmarks/bench_timestamps.py [--lines 200000]
+"""
+import argparse
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from anomaly import TimestampExtractor, extract_timestamp_robust  # noqa: E402
+
+START = datetime(2024, 1, 15, 14, 22, 33)
+
+FORMATS = {
+    "epoch": lambda t: f"{int(t.timestamp())} INFO Process heartbeat",
+    "apache": lambda t: f"127.0.0.1 - - [{t.strftime('%d/%b/%Y:%H:%M:%S')} +0100] \"GET /index.html HTTP/1.1\" 200",
+    "syslog": lambda t: f"{t.strftime('%b')} {t.day:2d} {t.strftime('%H:%M:%S')} host systemd[1]: Starting session",
+    "iso": lambda t: f"{t.strftime('%Y-%m-%d %H:%M:%S')} INFO Worker-node-3: Task completed in 120ms",
+    "iso-slash-yy": lambda t: f"{t.strftime('%y/%m/%d %H:%M:%S')} INFO Worker-node-3: Task completed in 120ms",
+    "compact": lambda t: f"{t.strftime('%Y%m%d%H%M%S')} Service-Update-Finished",
+}
+
+
+def make_lines(fmt: str, n: int) -> list[str]:
+    return [FORMATS[fmt](START + timedelta(seconds=i)) for i in range(n)]
+
+
+def lines_per_sec(fn, lines) -> float:
+    t0 = time.perf_counter()
+    for line in lines:
+        fn(line)
+    return len(lines) / (time.perf_counter() - t0)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--lines", type=int, default=200_000)
+    args = ap.parse_args()
+
+    print(f"{'format':<14}{'robust l/s':>14}{'fast l/s':>14}{'speedup':>10}")
+    for fmt in FORMATS:
+        lines = make_lines(fmt, args.lines)
+        before = lines_per_sec(extract_timestamp_robust, lines)
+        after = lines_per_sec(TimestampExtractor(), lines)
+        print(f"{fmt:<14}{before:>14,.0f}{after:>14,.0f}{after / before:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Scalable synthetic log generator for benchmarks: the message mix of tests' generate_test_logs
+(task / heartbeat / saved output / request lines, with injected ERROR, WARN, FATAL and dump lines)
+under any timestamp format of bench_timestamps, written in blocks so 10M-line files are cheap.
+
+Run from ml-service/:  python benchmarks/loggen.py out.log --lines 1000000 --format iso
+"""
+import argparse
+import random
+from datetime import datetime, timedelta
+
+START = datetime(2024, 1, 15, 14, 22, 33)
+
+# Timestamp prefix per format (same formats as bench_timestamps.FORMATS)
+PREFIXES = {
+    "epoch": lambda t: f"{int(t.timestamp())}",
+    "apache": lambda t: f"127.0.0.1 - - [{t:%d/%b/%Y:%H:%M:%S} +0100]",
+    "syslog": lambda t: f"{t:%b} {t.day:2d} {t:%H:%M:%S} host",
+    "iso": lambda t: f"{t:%Y-%m-%d %H:%M:%S}",
+    "iso-slash-yy": lambda t: f"{t:%y/%m/%d %H:%M:%S}",
+    "compact": lambda t: f"{t:%Y%m%d%H%M%S}",
+}
+
+LEVELS = ["INFO", "INFO", "INFO", "INFO", "DEBUG", "INFO"]
+COMPONENTS = ["Worker-node-", "Executor-", "Storage-module-", "Network-stack-"]
+ANOMALIES = [
+    "ERROR Worker-node-7: Connection refused to database at 192.168.1.50:5432",
+    "WARN Storage-module-2: Disk usage on /dev/sda1 is 98%. Performance may degrade.",
+    "FATAL Network-stack-1: Unexpected kernel panic in packet processing thread! NullPointerException at 0x44FF22",
+    "INFO Executor-12: " + "DEBUG_DUMP " * 20 + "END_OF_DUMP",
+]
+
+
+def _message(rng: random.Random) -> str:
+    level = rng.choice(LEVELS)
+    comp = rng.choice(COMPONENTS) + str(rng.randint(1, 20))
+    r = rng.random()
+    if r < 0.4:
+        return f"{level} {comp}: Task {rng.randint(1000, 9000)} completed successfully in {rng.randint(10, 500)}ms"
+    if r < 0.7:
+        return f"{level} {comp}: Heartbeat sent to master at 10.0.0.{rng.randint(1, 254)}"
+    if r < 0.9:
+        return f"{level} {comp}: Saved output to hdfs://cluster-name/data/part-{rng.randint(10000, 99999)}.parquet"
+    return f"{level} {comp}: Received request from user_{rng.randint(1, 100)} for resource_{rng.randint(100, 200)}"
+
+
+def iter_log_lines(num_lines: int, fmt: str = "iso-slash-yy", seed: int = 7, anomaly_every: int = 2500):
+    """Lines (without newline): one per second from START; every `anomaly_every`-th line (offset
+    by half a period) is one of ANOMALIES, cycling."""
+    rng = random.Random(seed)
+    prefix = PREFIXES[fmt]
+    for i in range(num_lines):
+        t = START + timedelta(seconds=i)
+        if i % anomaly_every == anomaly_every // 2:
+            msg = ANOMALIES[(i // anomaly_every) % len(ANOMALIES)]
+        else:
+            msg = _message(rng)
+        yield f"{prefix(t)} {msg}"
+
+
+def write_log(path: str, num_lines: int, fmt: str = "iso-slash-yy", seed: int = 7,
+              anomaly_every: int = 2500, block: int = 100_000) -> str:
+    lines = iter_log_lines(num_lines, fmt, seed, anomaly_every)
+    with open(path, "w", encoding="utf-8") as f:
+        while True:
+            chunk = [line for _, line in zip(range(block), lines)]
+            if not chunk:
+                break
+            f.write("\n".join(chunk))
+            f.write("\n")
+    return path
+
+
+def parse_count(text: str) -> int:
+    """'10k' -> 10_000, '1M' -> 1_000_000, '250000' -> 250_000."""
+    text = text.strip().lower()
+    scale = {"k": 1_000, "m": 1_000_000}.get(text[-1:], 1)
+    return int(float(text[:-1] if scale > 1 else text) * scale)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("path")
+    ap.add_argument("--lines", default="100k")
+    ap.add_argument("--format", choices=sorted(PREFIXES), default="iso-slash-yy")
+    ap.add_argument("--seed", type=int, default=7)
+    args = ap.parse_args()
+    write_log(args.path, parse_count(args.lines), args.format, args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+"""Benchmark suite for analyze_log and the worker pipeline, with a saved baseline and a regression gate.
+
+Each case (timestamp format x line count) runs in a fresh process so peak RSS is per case:
+generate a log with loggen, upload it to Moto S3 (or read it from disk), stream it through the
+worker's reader into analyze_log with a StageTimer, then persist the incidents with the worker's
+update_job_status into SQLite. Everything runs offline.
+
+Stages: read (S3 fetch + decompress + line split), mine (Drain3), parse (timestamps), features,
+scale, fit, score, aggregate, persist.
+
+Run from ml-service/:
+  python benchmarks/suite.py run --sizes 10k 100k --formats all --out results.json
+  python benchmarks/suite.py compare benchmarks/baseline.json results.json --threshold 0.15
+"""
+import argparse
+import json
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+_here = Path(__file__).resolve().parent
+sys.path.insert(0, str(_here.parent))
+sys.path.insert(0, str(_here))
+
+from loggen import PREFIXES, parse_count, write_log  # noqa: E402
+
+STAGES = ("read", "mine", "parse", "features", "scale", "fit", "score", "aggregate", "persist")
+CHUNK = 2 * 1024 * 1024
+
+
+def _rss_mb() -> float:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * resource.getpagesize() / 2**20
+
+
+def _chunks_from_file(path: str):
+    with open(path, "rb") as f:
+        while chunk := f.read(CHUNK):
+            yield chunk
+
+
+def run_case(num_lines: int, fmt: str, source: str) -> dict:
+    """One benchmark case in this process; returns its result record."""
+    import boto3
+    from moto import mock_aws
+    from sqlalchemy import create_engine, text
+
+    import worker
+    from anomaly import LineBatches, StageTimer, analyze_log
+
+    with tempfile.TemporaryDirectory() as tmp, mock_aws():
+        path = write_log(str(Path(tmp) / "bench.log"), num_lines, fmt)
+        size = Path(path).stat().st_size
+
+        if source == "s3":
+            s3 = boto3.client("s3", region_name="us-east-1")
+            s3.create_bucket(Bucket="bench")
+            s3.put_object(Bucket="bench", Key="bench.log", Body=Path(path).read_bytes())
+
+            def open_chunks():
+                body = s3.get_object(Bucket="bench", Key="bench.log")["Body"]
+                return worker.iter_decompressed(body.iter_chunks(chunk_size=CHUNK), "bench.log", CHUNK)
+        else:
+            def open_chunks():
+                return _chunks_from_file(path)
+
+        worker.db_engine = create_engine(f"sqlite:///{tmp}/bench.db")
+        with worker.db_engine.begin() as conn:
+            conn.execute(text('CREATE TABLE "AnalysisJob" (id VARCHAR PRIMARY KEY, status VARCHAR, "incidentCount" INT)'))
+            conn.execute(text('CREATE TABLE "Incident" (id VARCHAR PRIMARY KEY, "jobId" VARCHAR, "incidentTemplate" VARCHAR, '
+                              'occurrences INT, "avgScore" FLOAT, severity VARCHAR, "exampleLog" TEXT)'))
+            conn.execute(text('INSERT INTO "AnalysisJob" (id, status) VALUES (\'bench\', \'PENDING\')'))
+
+        rss_before = _rss_mb()
+        timer = StageTimer()
+        t0 = time.perf_counter()
+        incidents = analyze_log(LineBatches(worker.iter_line_batches(open_chunks())), timer=timer)
+        with timer.stage("persist", len(incidents)):
+            worker.update_job_status("bench", "COMPLETED", incidents)
+        seconds = time.perf_counter() - t0
+
+    return {
+        "format": fmt,
+        "lines": num_lines,
+        "source": source,
+        "bytes": size,
+        "seconds": round(seconds, 4),
+        "lines_per_sec": round(num_lines / seconds, 1),
+        "incidents": len(incidents),
+        "stages": {name: round(timer.stages[name]["seconds"], 4) for name in STAGES if name in timer.stages},
+        "rss_before_mb": round(rss_before, 1),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def case_key(record: dict) -> str:
+    return f"{record['format']}/{record['lines']}/{record['source']}"
+
+
+def cmd_case(args):
+    record = run_case(parse_count(args.lines), args.format, args.source)
+    Path(args.json_out).write_text(json.dumps(record))
+
+
+def cmd_run(args):
+    formats = sorted(PREFIXES) if args.formats == ["all"] else args.formats
+    results = {}
+    print(f"{'case':<28}{'lines/s':>12}{'peak MB':>9}  " + " ".join(f"{s:>9}" for s in STAGES))
+    for size in args.sizes:
+        for fmt in formats:
+            best = None
+            for _ in range(args.repeat):
+                with tempfile.NamedTemporaryFile(suffix=".json") as out:
+                    subprocess.run(
+                        [sys.executable, __file__, "case", "--lines", size, "--format", fmt,
+                         "--source", args.source, "--json-out", out.name],
+                        check=True, stdout=subprocess.DEVNULL,
+                    )
+                    record = json.loads(Path(out.name).read_text())
+                if best is None or record["lines_per_sec"] > best["lines_per_sec"]:
+                    best = record
+            results[case_key(best)] = best
+            stage_s = " ".join(f"{best['stages'].get(s, 0):>9.3f}" for s in STAGES)
+            print(f"{case_key(best):<28}{best['lines_per_sec']:>12,.0f}{best['peak_rss_mb']:>9.0f}  {stage_s}")
+    if args.out:
+        payload = {"python": platform.python_version(), "machine": platform.machine(), "cases": results}
+        Path(args.out).write_text(json.dumps(payload, indent=2) + "\n")
+        print(f"wrote {args.out}")
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> tuple[list[str], list[str]]:
+    """(report lines, regressed case keys): a case regresses when its lines/sec drops by more than
+    `threshold` (fraction) against the baseline. Cases missing from either side are reported only."""
+    report, regressed = [], []
+    for key in sorted(set(baseline["cases"]) | set(current["cases"])):
+        base, cur = baseline["cases"].get(key), current["cases"].get(key)
+        if base is None or cur is None:
+            report.append(f"{key:<28}{'only in ' + ('current' if base is None else 'baseline'):>36}")
+            continue
+        ratio = cur["lines_per_sec"] / base["lines_per_sec"]
+        status = "REGRESSED" if ratio < 1.0 - threshold else "ok"
+        if status != "ok":
+            regressed.append(key)
+        slow = [s for s in STAGES if s in base["stages"] and s in cur["stages"]
+                and cur["stages"][s] > 0.05 and cur["stages"][s] > base["stages"][s] * (1.0 + threshold)]
+        report.append(f"{key:<28}{base['lines_per_sec']:>12,.0f}{cur['lines_per_sec']:>12,.0f}{ratio:>8.2f}  {status}"
+                      + (f"  slower: {', '.join(slow)}" if slow else ""))
+    return report, regressed
+
+
+def cmd_compare(args):
+    baseline = json.loads(Path(args.baseline).read_text())
+    current = json.loads(Path(args.current).read_text())
+    report, regressed = compare(baseline, current, args.threshold)
+    print(f"{'case':<28}{'base l/s':>12}{'cur l/s':>12}{'ratio':>8}")
+    print("\n".join(report))
+    if regressed:
+        print(f"{len(regressed)} case(s) regressed by more than {args.threshold:.0%}")
+        sys.exit(1)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = ap.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run", help="run cases and optionally save results as JSON")
+    run.add_argument("--sizes", nargs="+", default=["10k", "100k"], help="line counts, e.g. 10k 100k 1M 10M")
+    run.add_argument("--formats", nargs="+", default=["all"], help=f"'all' or any of {', '.join(sorted(PREFIXES))}")
+    run.add_argument("--source", choices=["s3", "file"], default="s3")
+    run.add_argument("--repeat", type=int, default=1, help="runs per case; the fastest is kept")
+    run.add_argument("--out")
+    run.set_defaults(func=cmd_run)
+
+    cmp = sub.add_parser("compare", help="exit 1 if throughput regressed past --threshold")
+    cmp.add_argument("baseline")
+    cmp.add_argument("current")
+    cmp.add_argument("--threshold", type=float, default=0.15)
+    cmp.set_defaults(func=cmd_compare)
+
+    case = sub.add_parser("case", help=argparse.SUPPRESS)
+    case.add_argument("--lines", required=True)
+    case.add_argument("--format", required=True, choices=sorted(PREFIXES))
+    case.add_argument("--source", choices=["s3", "file"], default="s3")
+    case.add_argument("--json-out", required=True)
+    case.set_defaults(func=cmd_case)
+
+    args = ap.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
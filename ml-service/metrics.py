@@ -0,0 +1,172 @@
+"""Minimal Prometheus text-format metrics for the worker: counters, gauges and histograms with labels,
+served on a local /metrics endpoint from a daemon thread (no prometheus_client dependency)."""
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DURATION_BUCKETS = (0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(pairs) -> str:
+    pairs = list(pairs)
+    return "{" + ",".join(f'{k}="{_escape(str(v))}"' for k, v in pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values: dict[tuple, object] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> list[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> list[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_labels(zip(self.labelnames, key))} {value:g}" for key, value in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple = (), buckets: tuple = DURATION_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def count(self, **labels) -> int:
+        state = self._values.get(self._key(labels))
+        return state[2] if state else 0
+
+    def samples(self) -> list[str]:
+        with self._lock:
+            items = sorted((key, ([*counts], total, n)) for key, (counts, total, n) in self._values.items())
+        lines = []
+        for key, (counts, total, n) in items:
+            pairs = list(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, c in zip(self.buckets, counts):
+                cumulative += c
+                lines.append(f"{self.name}_bucket{_labels(pairs + [('le', f'{bound:g}')])} {cumulative}")
+            lines.append(f"{self.name}_bucket{_labels(pairs + [('le', '+Inf')])} {n}")
+            lines.append(f"{self.name}_sum{_labels(pairs)} {total:g}")
+            lines.append(f"{self.name}_count{_labels(pairs)} {n}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: list[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(m.render() for m in self._metrics) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "sentinel_ml_stage_duration_seconds", "Wall time per job and pipeline stage.", ("stage",)))
+STAGE_LINES = REGISTRY.register(Counter(
+    "sentinel_ml_stage_lines_total", "Log lines processed per pipeline stage.", ("stage",)))
+STAGE_BYTES = REGISTRY.register(Counter(
+    "sentinel_ml_stage_bytes_total", "Bytes processed per pipeline stage.", ("stage",)))
+QUEUE_WAIT_SECONDS = REGISTRY.register(Histogram(
+    "sentinel_ml_queue_wait_seconds", "Time from publish (or delivery) until analysis starts.", ("lane",)))
+JOB_SECONDS = REGISTRY.register(Histogram(
+    "sentinel_ml_job_duration_seconds", "Wall time per job from the start of analysis to its result.", ("lane",)))
+JOBS_IN_FLIGHT = REGISTRY.register(Gauge(
+    "sentinel_ml_jobs_in_flight", "Jobs received and not yet acknowledged."))
+JOBS_TOTAL = REGISTRY.register(Counter(
+    "sentinel_ml_jobs_total", "Finished jobs by status.", ("status",)))
+
+
+def observe_stages(stages: dict):
+    """Record a job's StageTimer.stages ({name: {seconds, calls, lines, bytes}})."""
+    for name, s in stages.items():
+        STAGE_SECONDS.observe(s["seconds"], stage=name)
+        if s["lines"]:
+            STAGE_LINES.inc(s["lines"], stage=name)
+        if s["bytes"]:
+            STAGE_BYTES.inc(s["bytes"], stage=name)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # scrapes are not worth a log line each
+
+
+def start_metrics_server(port: int, host: str = "0.0.0.0", registry: Registry = REGISTRY) -> ThreadingHTTPServer:
+    """Serve `registry` on http://host:port/metrics from a daemon thread; returns the server."""
+    handler = type("MetricsHandler", (_MetricsHandler,), {"registry": registry})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
@@ -0,0 +1,44 @@
+"""Cached baseline models per log source: the scaler, Isolation Forest and anomaly threshold fitted
+by one job, reused by later jobs of the same source to score without fitting (see ScoringBaseline).
+
+Entries are pickles of the BaselineModel with a header (cache format version, scikit-learn version,
+model settings). An entry written by another version or for other settings loads as a miss, so the
+next job refits. Pickles are only read from the worker's own cache directory or Redis.
+"""
+import io
+import pickle
+
+import sklearn
+
+from anomaly import BaselineModel, MiningConfig, ModelConfig
+
+MODEL_CACHE_VERSION = 1
+
+
+def model_key(config: ModelConfig, window_size: int = 3, mining: MiningConfig | None = None) -> tuple:
+    """Settings a cached model must have been fitted with to be reused: the forest's, and those that
+    change the feature rows it was fitted on (window size, template mining, feature deduplication)."""
+    mining = mining or MiningConfig()
+    return (window_size, config.n_estimators, config.max_samples, config.random_state,
+            config.dedup_features, config.dedup_decimals,
+            mining.masks, mining.max_clusters, mining.engine, mining.collapse_repeats)
+
+
+def _header(key: tuple) -> dict:
+    return {"version": MODEL_CACHE_VERSION, "sklearn": sklearn.__version__, "key": key}
+
+
+def dump_baseline(model: BaselineModel, key: tuple) -> bytes:
+    # Header and model are separate pickles, so a mismatched entry is rejected without unpickling
+    # estimators from another scikit-learn version
+    return pickle.dumps(_header(key)) + pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def load_baseline(state: bytes | None, key: tuple) -> BaselineModel | None:
+    """The cached model, or None when missing or written by another version / for other settings."""
+    if state is None:
+        return None
+    buf = io.BytesIO(state)
+    if pickle.load(buf) != _header(key):
+        return None
+    return pickle.load(buf)
@@ -0,0 +1,214 @@
+"""In-project Drain template miner: the clustering of Drain3's Drain (fixed-depth prefix tree, token
+similarity, "<*>" generalization, optional LRU cluster bound) with Drain3's default settings, built
+for batch mining in analyze_log.
+
+Differences from drain3.TemplateMiner, none of which change the clusters or templates:
+- add_many(lines) mines a whole batch and returns one int32 template id per line instead of a
+  result dict per call. A template id names one version of a cluster's template (see template_of), so
+  callers intern a version once rather than every line.
+- Similarity is counted in C (map over operator.eq); a matched line only builds a new template when
+  it differs from the current one at a non-wildcard position.
+- Template tokens are interned, so clusters share one string object per distinct token.
+- State is a pickle of the tree and clusters (see dump / load), not Drain3's jsonpickle snapshot.
+"""
+import pickle
+import sys
+import zlib
+from collections import OrderedDict
+from operator import eq
+
+import numpy as np
+
+PARAM = "<*>"
+_STATE_MAGIC = b"sentinel-native-miner/1\n"
+
+
+class _Node:
+    __slots__ = ("children", "cluster_ids")
+
+    def __init__(self):
+        self.children: dict = {}
+        self.cluster_ids: list[int] = []
+
+
+class _Cluster:
+    __slots__ = ("cluster_id", "tokens", "params", "size", "tid")
+
+    def __init__(self, cluster_id: int, tokens: tuple, tid: int):
+        self.cluster_id = cluster_id
+        self.tokens = tokens
+        self.params = tokens.count(PARAM)
+        self.size = 1
+        self.tid = tid
+
+
+class NativeMiner:
+    """Drain with depth 4, similarity threshold 0.4, 100 children per node and numeric tokens
+    parametrized (drain3.TemplateMinerConfig defaults). max_clusters: keep at most this many clusters,
+    evicting the least recently matched one."""
+
+    def __init__(self, max_clusters: int | None = None, depth: int = 4, sim_th: float = 0.4,
+                 max_children: int = 100):
+        if depth < 3:
+            raise ValueError("depth must be at least 3")
+        self.max_clusters = max_clusters
+        self.depth = depth
+        self.sim_th = sim_th
+        self.max_children = max_children
+        self.root = _Node()
+        self.clusters: dict[int, _Cluster] = {} if max_clusters is None else OrderedDict()
+        self.clusters_counter = 0
+        self._templates: dict[int, tuple[int, tuple]] = {}  # template id -> (cluster id, tokens)
+        self._next_tid = 0
+
+    def __getstate__(self):
+        # Template ids only live as long as the miner; a restored miner numbers them afresh
+        return {k: v for k, v in self.__dict__.items() if k != "_templates"}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._templates = {}
+        self._next_tid = 0
+        for cluster in self.clusters.values():
+            cluster.tid = self._new_template(cluster)
+
+    def _new_template(self, cluster: _Cluster) -> int:
+        tid = self._next_tid
+        self._next_tid += 1
+        self._templates[tid] = (cluster.cluster_id, cluster.tokens)
+        return tid
+
+    def template_of(self, tid: int) -> tuple[int, str]:
+        """(cluster id, template text) of a template id returned by add_many (and not forgotten since)."""
+        cluster_id, tokens = self._templates[tid]
+        return cluster_id, " ".join(tokens)
+
+    def forget_templates(self):
+        """Drop superseded template ids (older templates of a cluster, evicted clusters). Ids are never
+        reused, so callers that already resolved them can keep using their own mapping."""
+        self._templates = {c.tid: self._templates[c.tid] for c in self.clusters.values()}
+
+    def cluster_templates(self) -> dict[int, str]:
+        """Current template of every cluster, by cluster id."""
+        return {cid: " ".join(self.clusters[cid].tokens) for cid in sorted(self.clusters)}
+
+    def add_many(self, lines: list[str]) -> np.ndarray:
+        """Mine `lines` in order; the template id of every line's cluster right after the line was added."""
+        roots = self.root.children
+        clusters = self.clusters
+        lru = self.max_clusters is not None
+        descents = self.depth - 3  # prefix tree levels below the token-count level (Drain's max_node_depth - 1)
+        sim_th = self.sim_th
+        out = []
+        for line in lines:
+            tokens = line.split()
+            n = len(tokens)
+            cluster = None
+            node = roots.get(n)
+            if node is not None:
+                if n == 0:
+                    cluster = clusters.get(node.cluster_ids[0])
+                else:
+                    for token in tokens[:min(descents, n - 1)]:
+                        children = node.children
+                        node = children.get(token)
+                        if node is None:
+                            node = children.get(PARAM)
+                            if node is None:
+                                break
+                    if node is not None:
+                        cluster, same = self._best_match(node.cluster_ids, tokens, n, sim_th)
+            if cluster is None:
+                cluster = self._create(tokens, n)
+            else:
+                if n and same != n - cluster.params:
+                    cluster.tokens = tuple(t if t == s else PARAM for t, s in zip(cluster.tokens, tokens))
+                    cluster.params = cluster.tokens.count(PARAM)
+                    cluster.tid = self._new_template(cluster)
+                cluster.size += 1
+                if lru:
+                    clusters.move_to_end(cluster.cluster_id)
+            out.append(cluster.tid)
+        return np.array(out, dtype=np.int32)
+
+    def _best_match(self, cluster_ids: list[int], tokens: list[str], n: int, sim_th: float):
+        """Drain's fast_match: the candidate with the most equal non-wildcard tokens (ties: more
+        wildcards), if that share reaches sim_th; and its count of equal non-wildcard tokens."""
+        clusters = self.clusters
+        literal_params = PARAM in tokens
+        best, best_same, best_params = None, -1, -1
+        for cid in cluster_ids:
+            cluster = clusters.get(cid)
+            if cluster is None:
+                continue
+            same = sum(map(eq, cluster.tokens, tokens))
+            if literal_params and cluster.params:
+                # A "<*>" in the line equal to a wildcard does not count as similar
+                same -= sum(1 for t, s in zip(cluster.tokens, tokens) if t == PARAM and s == PARAM)
+            if same > best_same or (same == best_same and cluster.params > best_params):
+                best, best_same, best_params = cluster, same, cluster.params
+        if best is None or best_same / n < sim_th:
+            return None, 0
+        return best, best_same
+
+    def _create(self, tokens: list[str], n: int) -> _Cluster:
+        self.clusters_counter += 1
+        cluster = _Cluster(self.clusters_counter, tuple(map(sys.intern, tokens)), -1)
+        cluster.tid = self._new_template(cluster)
+        if self.max_clusters is not None and len(self.clusters) >= self.max_clusters:
+            self.clusters.popitem(last=False)
+        self.clusters[cluster.cluster_id] = cluster
+        self._add_to_tree(cluster, n)
+        return cluster
+
+    def _add_to_tree(self, cluster: _Cluster, n: int):
+        """Drain's add_seq_to_prefix_tree (same node creation and max_children rules)."""
+        node = self.root.children.get(n)
+        if node is None:
+            node = self.root.children[n] = _Node()
+        if n == 0:
+            node.cluster_ids = [cluster.cluster_id]
+            return
+        max_node_depth = self.depth - 2
+        children_limit = self.max_children
+        depth = 1
+        for token in cluster.tokens:
+            if depth >= max_node_depth or depth >= n:
+                node.cluster_ids = [cid for cid in node.cluster_ids if cid in self.clusters]
+                node.cluster_ids.append(cluster.cluster_id)
+                break
+            children = node.children
+            if token in children:
+                node = children[token]
+            elif any(ch.isdigit() for ch in token):
+                node = children.get(PARAM) or children.setdefault(PARAM, _Node())
+            elif PARAM in children:
+                node = children.setdefault(token, _Node()) if len(children) < children_limit else children[PARAM]
+            elif len(children) + 1 < children_limit:
+                node = children[token] = _Node()
+            elif len(children) + 1 == children_limit:
+                node = children[PARAM] = _Node()
+            else:
+                node = children[PARAM]
+            depth += 1
+
+    def dump(self) -> bytes:
+        """Snapshot of the tree and clusters (zlib-compressed pickle)."""
+        return _STATE_MAGIC + zlib.compress(pickle.dumps(self, protocol=pickle.HIGHEST_PROTOCOL))
+
+    @classmethod
+    def load(cls, state: bytes, max_clusters: int | None = None) -> "NativeMiner":
+        """A miner restored from dump(), keeping at most `max_clusters` clusters (least recently
+        matched evicted first). Raises ValueError for anything that is not a native miner snapshot."""
+        if not state.startswith(_STATE_MAGIC):
+            raise ValueError("not a native miner state")
+        miner = pickle.loads(zlib.decompress(state[len(_STATE_MAGIC):]))
+        if not isinstance(miner, cls):
+            raise ValueError("not a native miner state")
+        miner.max_clusters = max_clusters
+        clusters = miner.clusters
+        miner.clusters = {} if max_clusters is None else OrderedDict()
+        miner.clusters.update(clusters)
+        while max_clusters is not None and len(miner.clusters) > max_clusters:
+            miner.clusters.popitem(last=False)
+        return miner
@@ -0,0 +1,120 @@
+"""Small per-source byte stores with size caps and LRU/TTL eviction: warm Drain3 state
+(template_state.py) and cached baseline models (model_cache.py) are kept in them."""
+import hashlib
+import os
+import tempfile
+
+
+class FileStateStore:
+    """One file per source under `directory`, named by a hash of the source key plus `suffix`.
+    Loads refresh a file's mtime; saves evict the least recently used files beyond `max_sources`.
+    States larger than `max_bytes` are not saved (and any older state is dropped), so a source
+    whose state keeps growing falls back to a cold start instead of an ever larger file."""
+
+    def __init__(self, directory: str, max_bytes: int = 64 * 1024 * 1024, max_sources: int = 256,
+                 suffix: str = ".state"):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_sources = max_sources
+        self.suffix = suffix
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, source: str) -> str:
+        return os.path.join(self.directory, hashlib.sha256(source.encode("utf-8")).hexdigest() + self.suffix)
+
+    def load(self, source: str) -> bytes | None:
+        path = self._path(source)
+        try:
+            with open(path, "rb") as f:
+                state = f.read()
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return state
+
+    def save(self, source: str, state: bytes) -> bool:
+        """Store `state` for `source`; False (and the old state removed) when it exceeds max_bytes."""
+        path = self._path(source)
+        if len(state) > self.max_bytes:
+            self.delete(source)
+            return False
+        # Write-then-rename: a concurrent job of the same source reads the old or the new state, never half of one
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(state)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        self._evict()
+        return True
+
+    def delete(self, source: str):
+        try:
+            os.unlink(self._path(source))
+        except FileNotFoundError:
+            pass
+
+    def _evict(self):
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(self.suffix):
+                try:
+                    entries.append((entry.stat().st_mtime, entry.path))
+                except FileNotFoundError:
+                    pass
+        entries.sort()
+        for _, path in entries[:max(0, len(entries) - self.max_sources)]:
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+
+
+class RedisStateStore:
+    """State per source in a Redis-compatible server (any client with get/set/expire/delete).
+    Every load and save refreshes the key's TTL, so sources idle for `ttl_seconds` expire; with
+    maxmemory-policy allkeys-lru the server also evicts the least recently used sources."""
+
+    def __init__(self, client, prefix: str = "sentinel:state:", max_bytes: int = 64 * 1024 * 1024,
+                 ttl_seconds: int = 30 * 24 * 3600):
+        self.client = client
+        self.prefix = prefix
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+
+    def load(self, source: str) -> bytes | None:
+        key = self.prefix + source
+        state = self.client.get(key)
+        if state is not None:
+            self.client.expire(key, self.ttl_seconds)
+        return state
+
+    def save(self, source: str, state: bytes) -> bool:
+        if len(state) > self.max_bytes:
+            self.delete(source)
+            return False
+        self.client.set(self.prefix + source, state, ex=self.ttl_seconds)
+        return True
+
+    def delete(self, source: str):
+        self.client.delete(self.prefix + source)
+
+
+def store_from_env(prefix: str, kind: str, env=os.environ):
+    """{prefix}_URL=redis://... or {prefix}_DIR=/path selects the store (None when neither is set);
+    {prefix}_MAX_BYTES, {prefix}_MAX_SOURCES (files) and {prefix}_TTL_SECONDS (Redis) set its limits.
+    `kind` separates stores sharing a server or directory ("drain3" -> *.drain3, sentinel:drain3:*)."""
+    max_bytes = int(env.get(f"{prefix}_MAX_BYTES", str(64 * 1024 * 1024)))
+    url = env.get(f"{prefix}_URL")
+    if url:
+        import redis  # optional dependency, only needed for a Redis store
+
+        return RedisStateStore(redis.Redis.from_url(url), prefix=f"sentinel:{kind}:", max_bytes=max_bytes,
+                               ttl_seconds=int(env.get(f"{prefix}_TTL_SECONDS", str(30 * 24 * 3600))))
+    directory = env.get(f"{prefix}_DIR")
+    if directory:
+        return FileStateStore(directory, max_bytes=max_bytes, suffix=f".{kind}",
+                              max_sources=int(env.get(f"{prefix}_MAX_SOURCES", "256")))
+    return None
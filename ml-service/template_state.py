@@ -0,0 +1,46 @@
+"""Warm-start Drain3 state per log source: a job's miner starts from the parse tree saved by the
+previous job of the same source, and the grown tree is saved back after mining.
+
+State bytes are Drain3's own snapshot format (jsonpickle of the Drain tree, zlib + base64), produced
+and restored by TemplateMiner.save_state/load_state through a MemoryBufferPersistence. The miner has
+no persistence handler while mining, so Drain3 does not snapshot on every new cluster. With the
+native engine (MiningConfig.engine) the state is NativeMiner.dump's snapshot instead; a state saved by
+the other engine fails to load, and the job mines cold.
+"""
+from drain3 import TemplateMiner
+from drain3.memory_buffer_persistence import MemoryBufferPersistence
+from drain3.template_miner_config import TemplateMinerConfig
+
+from native_miner import NativeMiner
+
+
+def load_miner(state: bytes | None, max_clusters: int | None = None,
+               engine: str = "drain3") -> TemplateMiner | NativeMiner:
+    """A miner of `engine` restored from `state` (cold when None), keeping at most `max_clusters`
+    clusters (see MiningConfig)."""
+    if engine == "native":
+        return NativeMiner.load(state, max_clusters) if state else NativeMiner(max_clusters=max_clusters)
+    buffer = MemoryBufferPersistence()
+    buffer.state = state
+    config = TemplateMinerConfig()
+    config.drain_max_clusters = max_clusters
+    miner = TemplateMiner(persistence_handler=buffer if state else None, config=config)
+    miner.persistence_handler = None
+    return miner
+
+
+def dump_miner(miner: TemplateMiner | NativeMiner) -> bytes:
+    """The miner's snapshot bytes."""
+    if isinstance(miner, NativeMiner):
+        return miner.dump()
+    buffer = MemoryBufferPersistence()
+    miner.persistence_handler = buffer
+    try:
+        miner.save_state("job finished")
+    finally:
+        miner.persistence_handler = None
+    return buffer.state
+
+
+def cluster_count(miner: TemplateMiner | NativeMiner) -> int:
+    return len(miner.clusters) if isinstance(miner, NativeMiner) else len(miner.drain.clusters)
@@ -37,6 +37,13 @@ def postgres_url():
                     severity VARCHAR, 
                     "exampleLog" TEXT
                 );
+                CREATE TABLE "AnalysisResultCache" (
+                    "contentKey" VARCHAR PRIMARY KEY,
+                    "jobId" VARCHAR,
+                    "createdAt" TIMESTAMP(3),
+                    "lastUsedAt" TIMESTAMP(3),
+                    hits INT
+                );
             """))
         yield url
 
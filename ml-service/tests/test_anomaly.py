@@ -2,11 +2,44 @@
 import random
 from datetime import datetime, timedelta
 
+import numpy as np
+import pytest
+
+import anomaly
 from anomaly import (
+    MASK_PROFILES,
+    LineBatches,
+    LineColumns,
+    MiningConfig,
+    ModelConfig,
+    RepeatCollapser,
+    ReservoirSampler,
+    ScoringBaseline,
+    SpillConfig,
+    SpillFiles,
+    StageTimer,
+    StreamingAnalyzer,
+    StreamingConfig,
+    TemplateTable,
+    TimestampExtractor,
+    TokenMasker,
+    aggregate_incidents,
+    analyze_mined_parts,
     analyze_log,
+    analyze_stream,
+    build_feature_matrix,
+    detect_timestamp_format,
     extract_timestamp_robust,
+    fit_score,
+    fit_score_deduplicated,
     get_severity_score,
+    merge_mined,
+    mine_log,
+    resolve_masks,
+    score_in_blocks,
+    severity_scores,
 )
+from sklearn.ensemble import IsolationForest
 
 
 def generate_test_logs(filename="test_system.log", num_lines=2000, seed=None):
@@ -135,6 +168,774 @@ class TestExtractTimestampRobust:
         assert ts.year == 2024
 
 
+class TestTimestampExtractor:
+    """Format sniffing and fast-path parsers must agree with extract_timestamp_robust."""
+
+    START = datetime(2024, 1, 15, 14, 22, 33)
+
+    FORMATS = {
+        "epoch": lambda t: f"{int(t.timestamp())} INFO Process heartbeat",
+        "apache": lambda t: f"127.0.0.1 - - [{t.strftime('%d/%b/%Y:%H:%M:%S')} +0100] 'GET /index.html' 200",
+        "syslog": lambda t: f"{t.strftime('%b')} {t.day:2d} {t.strftime('%H:%M:%S')} systemd[1]: Starting session",
+        "iso": lambda t: f"{t.strftime('%Y-%m-%dT%H:%M:%S')}.250Z INFO Service: ok",
+        "compact": lambda t: f"{t.strftime('%Y%m%d%H%M%S')} Service-Update-Finished",
+    }
+
+    def _lines(self, fmt, n=200):
+        return [self.FORMATS[fmt](self.START + timedelta(minutes=7 * i)) for i in range(n)]
+
+    def test_detects_each_known_format(self):
+        for fmt in self.FORMATS:
+            assert detect_timestamp_format(self._lines(fmt, 20)) == fmt
+
+    def test_fast_path_matches_robust_for_each_format(self):
+        for fmt in self.FORMATS:
+            lines = self._lines(fmt)
+            extract = TimestampExtractor(sample_size=16)
+            assert [extract(line) for line in lines] == [extract_timestamp_robust(line) for line in lines]
+            assert extract.format == fmt
+
+    def test_ambiguous_slash_dates_follow_robust_order(self):
+        """YY/MM/DD lines (as written by the generator) keep dateutil's day/month/year resolution."""
+        lines = [(self.START + timedelta(hours=i)).strftime("%y/%m/%d %H:%M:%S") + " INFO Worker-1: ok" for i in range(100)]
+        extract = TimestampExtractor(sample_size=10)
+        assert [extract(line) for line in lines] == [extract_timestamp_robust(line) for line in lines]
+        assert extract.format == "iso"
+
+    def test_miss_falls_back_to_robust(self):
+        extract = TimestampExtractor(sample_size=8)
+        for line in self._lines("iso", 8):
+            extract(line)
+        odd = "Jan  5 14:22:33 systemd[1]: format changed mid-stream"
+        assert extract(odd) == extract_timestamp_robust(odd)
+        assert extract("no timestamp here") is None
+
+    def test_no_common_format_stays_on_robust_path(self):
+        extract = TimestampExtractor(sample_size=4)
+        for line in ["ERROR a", "WARN b", "INFO c", "DEBUG d"]:
+            assert extract(line) is None
+        assert extract.format is None
+
+
+class TestBulkFeatureExtraction:
+    """Chunked extraction must produce the same columns as the per-line functions."""
+
+    @staticmethod
+    def _per_line_epochs(lines):
+        extract = TimestampExtractor()
+        return np.array([np.nan if ts is None else ts.timestamp() for ts in map(extract, lines)])
+
+    def test_extract_many_matches_per_line_for_each_format(self):
+        start = datetime(2024, 3, 30, 22, 0, 0)
+        formats = dict(TestTimestampExtractor.FORMATS)
+        formats["slash"] = lambda t: t.strftime("%y/%m/%d %H:%M:%S.%f") + " INFO ok"
+        formats["dot"] = lambda t: t.strftime("%d.%m.%Y %H:%M:%S") + " [DEBUG] ok"
+        for fmt, make in formats.items():
+            lines = [make(start + timedelta(seconds=97 * i)) for i in range(1000)]
+            lines[300:306] = [
+                "garbage", "2024-02-30 10:00:00 bad", "Feb 30 10:00:00 bad", "20240231101010 bad",
+                "x" * 60 + " [15/Jan/2024:14:22:33 +0100] too far right", "2024-01-15 14:22:33.5Z other layout",
+            ]
+            extract = TimestampExtractor()
+            # split so that format detection finishes in the middle of the first chunk
+            bulk = np.concatenate([extract.extract_many(lines[:100]), extract.extract_many(lines[100:])])
+            np.testing.assert_array_equal(bulk, self._per_line_epochs(lines), err_msg=fmt)
+
+    def test_severity_scores_match_per_line(self):
+        rng = random.Random(0)
+        words = ["fatal", "Error", "warn", "exception", "FAIL", "failure", "info", "WARNING: NullPointerException"]
+        lines = [" ".join(rng.choice(words) for _ in range(rng.randint(0, 4))) for _ in range(2000)]
+        np.testing.assert_array_equal(severity_scores(lines), [get_severity_score(line) for line in lines])
+
+    def test_severity_scores_with_case_expanding_characters(self):
+        """'ß'.upper() == 'SS' shifts offsets; result must still match per-line scoring."""
+        lines = ["straße ERROR", "ok", "Warn: maß", "fatal"]
+        np.testing.assert_array_equal(severity_scores(lines), [3.0, 0.0, 1.0, 5.0])
+
+    def test_analyze_log_independent_of_chunk_size(self, tmp_path, monkeypatch):
+        log_file = tmp_path / "test_system.log"
+        generate_test_logs(filename=str(log_file), num_lines=2000, seed=7)
+        lines = log_file.read_text(encoding="utf-8").strip().split("\n")
+        expected = analyze_log(lines)
+        monkeypatch.setattr(anomaly, "FEATURE_CHUNK_SIZE", 97)
+        assert analyze_log(lines) == expected
+
+
+class TestLineStore:
+    """LineColumns buffers and TemplateTable interning used by analyze_log."""
+
+    def test_line_columns_grow_and_keep_values(self):
+        store = LineColumns(capacity=4)
+        for start in range(0, 30, 10):
+            r = np.arange(start, start + 10)
+            store.append(r.astype(np.float64), r, r / 2, r * 3)
+        assert len(store) == 30
+        np.testing.assert_array_equal(store.ts, np.arange(30))
+        np.testing.assert_array_equal(store.key, np.arange(30))
+        np.testing.assert_array_equal(store.severity, np.arange(30) / 2)
+        assert store.key.dtype == np.int32 and store.severity.dtype == np.float32
+        assert store.ts.dtype == np.float64 and store.length.dtype == np.float32
+
+    def test_template_table_interns_pairs_and_keeps_first_example(self):
+        table = TemplateTable()
+        a = table.key(1, "Task <*> done", "Task 1 done")
+        assert table.key(1, "Task <*> done", "Task 2 done") == a
+        b = table.key(2, "Task <*> done", "Task 3 done")  # same text, other cluster
+        assert b != a
+        assert table.templates == ["Task <*> done"]
+        assert table.template_of_key == [0, 0] and table.cluster_of_key == [1, 2]
+        assert table.examples == {"Task <*> done": "Task 1 done"}
+
+
+def _reference_aggregate(scores, severity_arr, key_arr, table, anomaly_threshold):
+    """Per-line flagging and aggregation as analyze_log did it before aggregate_incidents."""
+    results = []
+    for i in range(len(scores)):
+        is_model_anomaly = scores[i] < anomaly_threshold
+        if is_model_anomaly or severity_arr[i] >= 3.0:
+            template = table.templates[table.template_of_key[key_arr[i]]].strip()
+            results.append({
+                "score": round(float(scores[i]), 4),
+                "severity": float(severity_arr[i]),
+                "template": template,
+                "content": table.examples.get(template, ""),
+            })
+    aggregated = {}
+    for res in sorted(results, key=lambda x: x["score"]):
+        data = aggregated.setdefault(res["template"], {
+            "severity": res["severity"], "example_content": res["content"], "scores": []})
+        data["scores"].append(res["score"])
+    final_incidents = [{
+        "incident_template": tmpl,
+        "occurrences": len(data["scores"]),
+        "avg_score": round(sum(data["scores"]) / len(data["scores"]), 4),
+        "severity": data["severity"],
+        "example_log": data["example_content"],
+    } for tmpl, data in aggregated.items()]
+    return sorted(final_incidents, key=lambda x: (x["severity"], x["occurrences"]), reverse=True)
+
+
+class TestAggregateIncidents:
+    """aggregate_incidents must reproduce the per-line flag/sort/aggregate output exactly."""
+
+    @staticmethod
+    def _table():
+        table = TemplateTable()
+        texts = ["Task <*> done", " Task <*> done", "Heartbeat <*>", "Connection refused <*>", "Disk <*> full"]
+        for k, text in enumerate(texts * 2):  # the same text under two clusters
+            table.key(k, text, f"example {k}")
+        return table
+
+    def test_matches_reference_on_random_inputs(self):
+        rng = np.random.default_rng(0)
+        table = self._table()
+        for _ in range(20):
+            n = int(rng.integers(50, 5000))
+            # coarse scores force many ties after rounding
+            scores = np.round(rng.normal(0.05, 0.1, n), int(rng.integers(3, 6)))
+            severity = rng.choice([0.0, 1.0, 3.0, 3.5, 5.0], size=n, p=[0.7, 0.1, 0.1, 0.05, 0.05])
+            keys = rng.integers(0, len(table), size=n).astype(np.int32)
+            threshold = float(np.mean(scores) - 2 * np.std(scores))
+            assert aggregate_incidents(scores, severity, keys, table, threshold) == \
+                _reference_aggregate(scores, severity, keys, table, threshold)
+
+    def test_nothing_flagged_returns_empty(self):
+        scores = np.zeros(20)
+        assert aggregate_incidents(scores, np.zeros(20), np.zeros(20, dtype=np.int32), self._table(), -1.0) == []
+
+
+class TestDeduplicatedForest:
+    """Weighted Isolation Forest on distinct feature rows (analyze_log dedup_features)."""
+
+    @staticmethod
+    def _features(seed=3, n=5000):
+        rng = np.random.default_rng(seed)
+        common = rng.integers(0, 4, size=(n, 5)).astype(np.float64)
+        common[rng.random(n) < 0.01] += 6.0  # rare outliers
+        return common
+
+    def test_identical_rows_share_a_score_and_all_lines_are_scored(self):
+        X = self._features()
+        scores = fit_score_deduplicated(IsolationForest(random_state=42), X)
+        assert scores.shape == (len(X),)
+        _, inverse = np.unique(X, axis=0, return_inverse=True)
+        for row in range(5):
+            assert np.ptp(scores[inverse.ravel() == row]) == 0
+
+    def test_scores_within_documented_tolerance_of_full_fit(self):
+        X = self._features()
+        full = IsolationForest(random_state=42).fit(X).decision_function(X)
+        for decimals in (None, 2):
+            dedup = fit_score_deduplicated(IsolationForest(random_state=42), X, decimals)
+            assert np.abs(dedup - full).mean() < 0.03
+            assert np.abs(dedup - full).max() < 0.15
+
+    def test_analyze_log_with_dedup_keeps_high_severity_incidents(self, tmp_path):
+        log_file = tmp_path / "test_system.log"
+        generate_test_logs(filename=str(log_file), num_lines=2000, seed=42)
+        lines = log_file.read_text(encoding="utf-8").strip().split("\n")
+        high = lambda res: {r["incident_template"] for r in res if r["severity"] >= 3.0}
+        assert high(analyze_log(lines, model=ModelConfig(dedup_features=True))) == high(analyze_log(lines))
+
+
+class TestSampleFitFullScore:
+    """Reservoir-sampled fit and block-parallel scoring (ModelConfig.fit_sample_size / n_jobs)."""
+
+    def test_reservoir_is_uniform_and_bounded(self):
+        hits = np.zeros(1000)
+        for seed in range(300):
+            sampler = ReservoirSampler(50, seed=seed)
+            for size in (7, 300, 1, 692):
+                sampler.add(size)
+            sample = sampler.sample()
+            assert len(sample) == 50 and len(np.unique(sample)) == 50
+            assert sample.min() >= 0 and sample.max() < 1000
+            hits[sample] += 1
+        # every position is kept with probability 50/1000: 15 expected hits each
+        assert abs(hits[:500].mean() - hits[500:].mean()) < 2.0
+
+    def test_reservoir_smaller_stream_keeps_everything(self):
+        sampler = ReservoirSampler(100)
+        sampler.add(30)
+        sampler.add(20)
+        np.testing.assert_array_equal(sampler.sample(), np.arange(50))
+
+    def test_block_scoring_equals_single_call(self):
+        X = np.random.default_rng(0).normal(size=(5000, 5))
+        model = IsolationForest(random_state=42).fit(X)
+        np.testing.assert_array_equal(score_in_blocks(model, X, n_jobs=4, block_size=700), model.decision_function(X))
+
+    def test_sample_covering_all_rows_matches_full_fit(self):
+        X = np.random.default_rng(1).normal(size=(3000, 5))
+        full = fit_score(X, ModelConfig())
+        np.testing.assert_array_equal(fit_score(X, ModelConfig(n_jobs=2, score_block_size=500), np.arange(3000)), full)
+
+    def test_analyze_log_sample_fit_keeps_high_severity_incidents(self, tmp_path):
+        log_file = tmp_path / "test_system.log"
+        generate_test_logs(filename=str(log_file), num_lines=2000, seed=42)
+        lines = log_file.read_text(encoding="utf-8").strip().split("\n")
+        high = lambda res: {r["incident_template"] for r in res if r["severity"] >= 3.0}
+        config = ModelConfig(fit_sample_size=500, n_jobs=2, score_block_size=256)
+        assert high(analyze_log(lines, model=config)) == high(analyze_log(lines))
+        assert analyze_log(lines, model=ModelConfig(fit_sample_size=10_000)) == analyze_log(lines)
+
+
+class TestMinedParts:
+    """Mining a file in parts (as per byte range) and merging matches mining it as one stream."""
+
+    def _lines(self, tmp_path, seed):
+        log_file = tmp_path / "parts.log"
+        generate_test_logs(filename=str(log_file), num_lines=3000, seed=seed)
+        return log_file.read_text(encoding="utf-8").strip().split("\n")
+
+    def test_single_part_is_unchanged(self, tmp_path):
+        lines = self._lines(tmp_path, 1)
+        assert analyze_mined_parts([mine_log(lines)]) == analyze_log(lines)
+
+    @pytest.mark.parametrize("parts", [2, 5])
+    @pytest.mark.parametrize("seed", [42, 123])
+    def test_split_matches_sequential(self, tmp_path, parts, seed):
+        lines = self._lines(tmp_path, seed)
+        bounds = [len(lines) * i // parts for i in range(parts + 1)]
+        mined = [mine_log(lines[bounds[i]:bounds[i + 1]]) for i in range(parts)]
+        assert analyze_mined_parts(mined) == analyze_log(lines)
+
+    def test_merge_keeps_cluster_counts_and_first_examples(self, tmp_path):
+        lines = self._lines(tmp_path, 42)
+        whole = mine_log(lines)
+        merged = merge_mined([mine_log(lines[:1000]), mine_log(lines[1000:])])
+        assert len(merged.store) == len(lines)
+        np.testing.assert_array_equal(merged.store.ts, whole.store.ts)
+        per_cluster = lambda m: sorted(np.bincount(np.array(m.table.cluster_of_key)[m.store.key]).tolist())
+        assert per_cluster(merged) == per_cluster(whole)
+        shared = set(whole.table.examples) & set(merged.table.examples)
+        assert shared
+        assert all(merged.table.examples[t] == whole.table.examples[t] for t in shared)
+
+
+class TestStageTimer:
+    """Per-stage timing hooks in analyze_log."""
+
+    def test_records_every_stage_without_changing_results(self, tmp_path):
+        log_file = tmp_path / "timed.log"
+        generate_test_logs(filename=str(log_file), num_lines=2000, seed=42)
+        lines = log_file.read_text(encoding="utf-8").strip().split("\n")
+        timer = StageTimer()
+        assert analyze_log(lines, timer=timer) == analyze_log(lines)
+        assert set(timer.stages) == {"read", "mine", "parse", "features", "scale", "fit", "score", "aggregate"}
+        assert timer.stages["mine"]["lines"] == len(lines)
+        assert all(stage["seconds"] >= 0 for stage in timer.stages.values())
+
+
+class TestScoringBaseline:
+    """A cached model scores later jobs without fitting; cold, stale and drifted slots refit."""
+
+    @staticmethod
+    def _lines(tmp_path, seed, num_lines=3000):
+        log_file = tmp_path / f"gen_{seed}.log"
+        generate_test_logs(filename=str(log_file), num_lines=num_lines, seed=seed)
+        return log_file.read_text(encoding="utf-8").strip().split("\n")
+
+    def test_cold_slot_fits_and_keeps_results(self, tmp_path):
+        lines = self._lines(tmp_path, 42)
+        baseline = ScoringBaseline()
+        assert analyze_log(lines, baseline=baseline) == analyze_log(lines)
+        assert baseline.refit_reason == "cold" and baseline.model.rows == len(lines)
+
+    def test_reused_model_scores_without_fitting(self, tmp_path):
+        lines = self._lines(tmp_path, 42)
+        baseline = ScoringBaseline()
+        fitted = analyze_log(lines, baseline=baseline)
+
+        reused = ScoringBaseline(model=baseline.model)
+        timer = StageTimer()
+        assert analyze_log(lines, timer=timer, baseline=reused) == fitted
+        assert reused.refit_reason is None and reused.drift == pytest.approx(0.0, abs=1e-9)
+        assert "fit" not in timer.stages and "score" in timer.stages
+
+    def test_next_job_of_same_source_reuses_model(self, tmp_path):
+        baseline = ScoringBaseline()
+        analyze_log(self._lines(tmp_path, 1), baseline=baseline)
+        next_job = ScoringBaseline(model=baseline.model)
+        results = analyze_log(self._lines(tmp_path, 2), baseline=next_job)
+        assert next_job.refit_reason is None
+        assert any(r["severity"] >= 3.0 for r in results)
+
+    def test_stale_and_drifted_models_refit(self, tmp_path):
+        baseline = ScoringBaseline()
+        analyze_log(self._lines(tmp_path, 1), baseline=baseline)
+
+        stale = ScoringBaseline(model=baseline.model, max_age_seconds=0.0)
+        analyze_log(self._lines(tmp_path, 2), baseline=stale)
+        assert stale.refit_reason == "stale" and stale.model is not baseline.model
+
+        storm = self._lines(tmp_path, 3)
+        storm[::3] = [f"25/01/15 10:00:00 ERROR db-{i % 7}: connection refused" for i in range(len(storm[::3]))]
+        drifted = ScoringBaseline(model=baseline.model)
+        analyze_log(storm, baseline=drifted)
+        assert drifted.refit_reason == "drift" and drifted.drift > drifted.max_drift
+
+
+def _line_templates(mined):
+    """Template text of every mined line."""
+    table = mined.table
+    return [table.templates[table.template_of_key[key]] for key in np.asarray(mined.store.key).tolist()]
+
+
+class TestMiningConfig:
+    """Token masking before Drain3 and the bounded cluster count."""
+
+    MASKER = TokenMasker(MASK_PROFILES["default"])
+
+    @pytest.mark.parametrize("line,masked", [
+        ("2024-01-15 10:00:03 INFO Task 75 done in 60ms", "2024-01-15 10:00:03 INFO Task <NUM> done in <DURATION>"),
+        ("1705314665 refused by 192.168.1.50:5432.", "<NUM> refused by <IP>."),
+        ("GET /users/550e8400-e29b-41d4-a716-446655440000 status=500", "GET /users/<UUID> status=<NUM>"),
+        ("panic at 0x44FF22 req-8f3a9c21d0 token aB3dE9fG2hJkL0mN1pQ", "panic at <HEX> req-<HEX> token <ID>"),
+        ("Worker-node-5: saved part-74129.parquet (v2.3.1, -3)", "Worker-node-5: saved part-74129.parquet (v2.3.1, <NUM>)"),
+    ])
+    def test_default_masks(self, line, masked):
+        assert self.MASKER.mask(line) == masked
+
+    def test_batch_matches_per_line(self):
+        lines = ["7 first", "", "at 10.0.0.1", "no digits here", "took 1.5s"]
+        assert self.MASKER.mask_batch(lines) == [self.MASKER.mask(line) for line in lines]
+        lines.insert(2, "trace 7\n  at 10.0.0.2")
+        assert self.MASKER.mask_batch(lines) == [self.MASKER.mask(line) for line in lines]
+
+    @pytest.mark.parametrize("engine", ["drain3", "native"])
+    def test_line_with_embedded_newline_keeps_line_boundaries(self, engine):
+        lines = [f"job {i} took {i % 7}ms on node-{i % 3}" for i in range(80)]
+        lines[3] = "trace start 7\n  at 10.0.0.1 frame 12"
+        lines[20] = "retry\nretry"
+        mined = mine_log(lines, mining=MiningConfig(masks=MASK_PROFILES["default"], engine=engine))
+        expected = mine_log([self.MASKER.mask(line) for line in lines])
+        assert len(mined.store) == len(lines)
+        assert _line_templates(mined) == _line_templates(expected)
+
+    def test_resolve_masks(self):
+        assert resolve_masks("default") == MASK_PROFILES["default"]
+        assert resolve_masks("ip, uuid") == ("ip", "uuid")
+        assert resolve_masks("") == ()
+        with pytest.raises(ValueError):
+            resolve_masks("ip,mac")
+
+    def test_masking_merges_templates_and_keeps_raw_examples(self):
+        """Short lines made mostly of ids stay below Drain3's similarity threshold unless masked."""
+        lines = [f"lookup {i:08x}-aaaa-bbbb-cccc-{i:012x} 10.0.{i % 9}.{i % 250} {i % 90}ms" for i in range(200)]
+        assert len(mine_log(lines).cluster_templates) > 50
+        masked = mine_log(lines, mining=MiningConfig(masks=MASK_PROFILES["default"]))
+        assert masked.table.templates == ["lookup <UUID> <IP> <DURATION>"]
+        assert masked.table.examples["lookup <UUID> <IP> <DURATION>"] == lines[0]
+
+    def test_max_clusters_bounds_drain(self):
+        lines = [f"25/01/15 10:00:00 WARN field_{i} " + "x " * (i % 40) for i in range(400)]
+        mined = mine_log(lines, mining=MiningConfig(max_clusters=10))
+        assert len(mined.cluster_templates) == 10
+        assert len(mined.store) == len(lines)
+        assert analyze_log(lines, mining=MiningConfig(max_clusters=10))
+
+    def test_default_config_keeps_results(self, tmp_path):
+        log_file = tmp_path / "mining.log"
+        generate_test_logs(filename=str(log_file), num_lines=2000, seed=42)
+        lines = log_file.read_text(encoding="utf-8").strip().split("\n")
+        timer = StageTimer()
+        assert analyze_log(lines, mining=MiningConfig(), timer=timer) == analyze_log(lines)
+        assert "mask" not in timer.stages
+
+
+class TestStreaming:
+    """Segment-by-segment analysis with bounded state."""
+
+    @staticmethod
+    def _lines(tmp_path, seed, num_lines=3000):
+        log_file = tmp_path / f"gen_{seed}.log"
+        generate_test_logs(filename=str(log_file), num_lines=num_lines, seed=seed)
+        return log_file.read_text(encoding="utf-8").strip().split("\n")
+
+    def test_single_segment_matches_analyze_log(self, tmp_path):
+        lines = self._lines(tmp_path, 42)
+        assert analyze_log(lines, streaming=StreamingConfig(segment_lines=len(lines))) == analyze_log(lines)
+
+    def test_time_and_window_continue_across_segments(self, tmp_path):
+        mined = mine_log(self._lines(tmp_path, 1, 500))
+        _, X = build_feature_matrix(mined)
+        ts = mined.store.ts.copy()
+        ts[:5] = np.nan
+        ts[240:260] = np.nan
+        whole = anomaly._time_delta_log(ts)
+        head = anomaly._time_delta_log(ts[:250])
+        tail = anomaly._time_delta_log(ts[250:], previous=ts[:250][~np.isnan(ts[:250])][-1])
+        np.testing.assert_allclose(np.concatenate((head, tail)), whole)
+        freq = X[:, 3]
+        split = [anomaly._window_mean(freq[:2], 3), anomaly._window_mean(freq[2:100], 3, freq[:2]),
+                 anomaly._window_mean(freq[100:], 3, freq[97:100])]
+        np.testing.assert_allclose(np.concatenate(split), X[:, 4])
+
+    def test_partial_results_per_segment(self, tmp_path):
+        lines = self._lines(tmp_path, 123)
+        results = list(analyze_stream(lines, streaming=StreamingConfig(segment_lines=1000)))
+        assert len(results) == 3
+        assert any(r["severity"] >= 3.0 for r in results[-1])
+        totals = [{r["incident_template"]: r["occurrences"] for r in result} for result in results]
+        for before, after in zip(totals, totals[1:]):
+            assert all(after.get(t, 0) >= count for t, count in before.items())
+
+    def test_state_is_bounded(self, tmp_path):
+        lines = self._lines(tmp_path, 7)
+        analyzer = StreamingAnalyzer(streaming=StreamingConfig(segment_lines=500, reservoir_size=200))
+        for i in range(0, len(lines), 500):
+            analyzer.add_segment(lines[i:i + 500])
+        assert analyzer.lines == len(lines) and analyzer.segments == 6
+        assert analyzer.model.rows == 200 and len(analyzer._recent_freq) == 3
+        assert analyzer.incidents()
+
+    def test_lines_before_a_model_wait_for_next_segment(self):
+        analyzer = StreamingAnalyzer()
+        analyzer.add_segment(["25/01/15 10:00:00 FATAL Worker-1: Kernel panic"])
+        assert analyzer.model is None and analyzer.incidents() == []
+        analyzer.add_segment([f"25/01/15 10:00:{i:02d} INFO Worker-1: Task completed in {i}ms" for i in range(1, 20)])
+        assert any(r["example_log"].endswith("Kernel panic") for r in analyzer.incidents())
+
+    def test_fresh_baseline_scores_every_segment(self, tmp_path):
+        lines = self._lines(tmp_path, 42)
+        cold = ScoringBaseline()
+        analyze_log(lines, baseline=cold, streaming=StreamingConfig(segment_lines=1000))
+        assert cold.refit_reason == "cold" and cold.model is not None
+
+        reused = ScoringBaseline(model=cold.model)
+        timer = StageTimer()
+        analyze_log(lines, timer=timer, baseline=reused, streaming=StreamingConfig(segment_lines=1000))
+        assert reused.refit_reason is None and reused.model is cold.model
+        assert "fit" not in timer.stages
+
+    def test_invalid_settings(self):
+        with pytest.raises(ValueError):
+            StreamingConfig(segment_lines=0)
+
+
+class TestSpill:
+    """Per-line arrays above the memory threshold live in scratch np.memmap files with unchanged results."""
+
+    @staticmethod
+    def _lines(tmp_path, seed=42, num_lines=3000):
+        log_file = tmp_path / f"gen_{seed}.log"
+        generate_test_logs(filename=str(log_file), num_lines=num_lines, seed=seed)
+        return log_file.read_text(encoding="utf-8").strip().split("\n")
+
+    @staticmethod
+    def _spill(tmp_path, lines=1000):
+        scratch = tmp_path / "scratch"
+        scratch.mkdir(exist_ok=True)
+        return SpillConfig(memory_limit_bytes=lines * anomaly.IN_MEMORY_BYTES_PER_LINE, directory=str(scratch),
+                           block_lines=700)
+
+    def test_line_columns_move_to_files_past_threshold(self, tmp_path):
+        files = SpillFiles(self._spill(tmp_path, lines=5))
+        store = LineColumns(capacity=2, spill=files)
+        store.append(np.array([1.0, np.nan]), np.array([0, 1]), np.array([3.0, 0.0]), np.array([10.0, 20.0]))
+        assert not store.spilled and files.directory is None
+        store.append(np.arange(4.0), np.arange(4), np.zeros(4), np.full(4, 7.0))
+        store.append(np.array([9.0]), np.array([5]), np.array([5.0]), np.array([1.0]))
+        assert store.spilled and isinstance(store.key, np.memmap)
+        np.testing.assert_array_equal(store.ts, [1.0, np.nan, 0.0, 1.0, 2.0, 3.0, 9.0])
+        np.testing.assert_array_equal(store.key, [0, 1, 0, 1, 2, 3, 5])
+        np.testing.assert_array_equal(store.severity, [3.0, 0.0, 0.0, 0.0, 0.0, 0.0, 5.0])
+        np.testing.assert_array_equal(store.length, [10.0, 20.0, 7.0, 7.0, 7.0, 7.0, 1.0])
+        files.close()
+        assert list((tmp_path / "scratch").iterdir()) == []
+
+    def test_spilled_features_match_in_memory(self, tmp_path):
+        lines = self._lines(tmp_path, seed=1)
+        files = SpillFiles(self._spill(tmp_path))
+        severity, X = build_feature_matrix(mine_log(lines, spill=files), spill=files)
+        expected_severity, expected_X = build_feature_matrix(mine_log(lines))
+        assert isinstance(X, np.memmap)
+        np.testing.assert_array_equal(severity, expected_severity)
+        np.testing.assert_array_equal(X, expected_X)
+        files.close()
+
+    @pytest.mark.parametrize("config", [ModelConfig(), ModelConfig(fit_sample_size=500, n_jobs=2, score_block_size=400)])
+    def test_results_match_and_scratch_is_removed(self, tmp_path, config):
+        lines = self._lines(tmp_path)
+        assert analyze_log(lines, model=config, spill=self._spill(tmp_path)) == analyze_log(lines, model=config)
+        assert list((tmp_path / "scratch").iterdir()) == []
+
+    def test_mined_parts_and_cached_model(self, tmp_path):
+        lines = self._lines(tmp_path, seed=123)
+        parts = [mine_log(lines[:1200]), mine_log(lines[1200:])]
+        assert analyze_mined_parts(parts, spill=self._spill(tmp_path)) == analyze_mined_parts(parts)
+
+        cold = ScoringBaseline()
+        analyze_log(lines, baseline=cold)
+        reused = ScoringBaseline(model=cold.model)
+        timer = StageTimer()
+        assert analyze_log(lines, timer=timer, baseline=reused, spill=self._spill(tmp_path)) == analyze_log(
+            lines, baseline=ScoringBaseline(model=cold.model))
+        assert reused.refit_reason is None and "fit" not in timer.stages
+        assert list((tmp_path / "scratch").iterdir()) == []
+
+    def test_scratch_is_removed_on_failure(self, tmp_path, monkeypatch):
+        def fail(*args):
+            raise RuntimeError("aggregation failed")
+
+        monkeypatch.setattr(anomaly, "aggregate_incidents", fail)
+        with pytest.raises(RuntimeError):
+            analyze_log(self._lines(tmp_path), spill=self._spill(tmp_path))
+        assert list((tmp_path / "scratch").iterdir()) == []
+
+    def test_invalid_settings(self):
+        with pytest.raises(ValueError):
+            SpillConfig(block_lines=0)
+
+
+class TestCollapseRepeats:
+    """MiningConfig(collapse_repeats=True): runs of lines repeated apart from their timestamp are one record."""
+
+    COLLAPSE = MiningConfig(collapse_repeats=True)
+
+    @staticmethod
+    def _lines(tmp_path, seed=42, num_lines=3000, storm=0):
+        """Generated lines with `storm` copies of one error, one second apart, after line 1000."""
+        log_file = tmp_path / f"gen_{seed}.log"
+        generate_test_logs(filename=str(log_file), num_lines=num_lines, seed=seed)
+        lines = log_file.read_text(encoding="utf-8").strip().split("\n")
+        start = datetime(2026, 1, 1)
+        lines[1000:1000] = [f"{(start + timedelta(seconds=i)).strftime('%y/%m/%d %H:%M:%S')} ERROR Worker-node-3: "
+                            "Retry 5 failed: connection reset by peer" for i in range(storm)]
+        return lines
+
+    def test_runs_continue_across_batches(self):
+        collapser = RepeatCollapser()
+        assert collapser.collapse(["10:00:01 a", "10:00:02 a", "10:00:03 retry 5", "10:00:04 retry 6"]) == [
+            ["10:00:01 a", "10:00:02 a", 2], ["10:00:03 retry 5", "10:00:03 retry 5", 1]]
+        assert collapser.collapse(["10:00:05 retry 6", "10:00:06 retry 6"]) == []
+        assert collapser.collapse(["2026-01-01T10:00:07Z retry 6"]) == [["10:00:04 retry 6", "10:00:06 retry 6", 3]]
+        assert collapser.finish() == [["2026-01-01T10:00:07Z retry 6", "2026-01-01T10:00:07Z retry 6", 1]]
+        assert collapser.finish() == []
+
+    def test_records_keep_last_timestamp_and_count(self, tmp_path):
+        lines = self._lines(tmp_path, storm=500)
+        batches = LineBatches([lines[i:i + 700] for i in range(0, len(lines), 700)])
+        mined = mine_log(batches, mining=self.COLLAPSE)
+        store = mined.store
+        assert store.lines == len(lines) and store.n == len(lines) - 499
+        run = int(np.flatnonzero(store.count == 500)[0])
+        assert store.last_ts[run] - store.ts[run] == 499
+        others = np.flatnonzero(store.count == 1)
+        np.testing.assert_array_equal(store.last_ts[others], store.ts[others])
+
+    def test_results_unchanged_without_repeats(self, tmp_path):
+        lines = self._lines(tmp_path, seed=7)
+        assert mine_log(lines, mining=self.COLLAPSE).store.n == len(lines)
+        assert analyze_log(lines, mining=self.COLLAPSE) == analyze_log(lines)
+        lines[100:100] = ["retry\nretry", "25/01/15 10:00:00 ERROR trace\n  at frame 1"]
+        assert mine_log(lines, mining=self.COLLAPSE).store.n == len(lines)
+        assert analyze_log(lines, mining=self.COLLAPSE) == analyze_log(lines)
+
+    def test_occurrences_count_every_line(self, tmp_path):
+        lines = self._lines(tmp_path, storm=2000)
+        timer = StageTimer()
+        incidents = analyze_log(lines, timer=timer, mining=self.COLLAPSE)
+        expected = analyze_log(lines)
+        storm = [i for i in incidents if "Retry" in i["incident_template"]]
+        # Per line, Drain3 keeps the storm's first line as its own template until the second arrives
+        assert [i["occurrences"] for i in storm] == [2000]
+        assert sum(i["occurrences"] for i in expected if "Retry" in i["incident_template"]) == 2000
+        assert timer.stages["collapse"]["lines"] == len(lines) and timer.stages["mine"]["lines"] < len(lines) - 1900
+        assert {i["incident_template"] for i in incidents if i["severity"] >= 3.0} - {storm[0]["incident_template"]} == {
+            i["incident_template"] for i in expected if i["severity"] >= 3.0 and "Retry" not in i["incident_template"]}
+
+    def test_spill_and_mined_parts(self, tmp_path):
+        lines = self._lines(tmp_path, seed=123, storm=800)
+        scratch = tmp_path / "scratch"
+        scratch.mkdir()
+        spill = SpillConfig(memory_limit_bytes=1000 * anomaly.IN_MEMORY_BYTES_PER_LINE, directory=str(scratch),
+                            block_lines=700)
+        collapsed = analyze_log(lines, mining=self.COLLAPSE)
+        assert analyze_log(lines, mining=self.COLLAPSE, spill=spill) == collapsed
+        assert list(scratch.iterdir()) == []
+
+        parts = [mine_log(lines[:1400], mining=self.COLLAPSE), mine_log(lines[1400:])]
+        merged = anomaly.merge_mined(parts)
+        assert merged.store.lines == len(lines) and merged.store.count[-1] == 1
+        assert sum(i["occurrences"] for i in analyze_mined_parts(parts) if "Retry" in i["incident_template"]) == 800
+
+
+    @staticmethod
+    def _log_with_runs(tmp_path, seed, num_lines=2000):
+        """Generated lines with runs repeated apart from their timestamp injected at random places, each
+        followed by a near repeat (another digit changes), and lines carrying their own newline (half
+        of the runs and some single lines). Returns the lines and (first line number, count) of every
+        run."""
+        rng = random.Random(seed)
+        log_file = tmp_path / f"runs_{seed}.log"
+        generate_test_logs(filename=str(log_file), num_lines=num_lines, seed=seed)
+        base = log_file.read_text(encoding="utf-8").strip().split("\n")
+        start = datetime(2026, 1, 1)
+        lines, runs = [], []
+
+        def inject(k):
+            count = rng.choice([2, 3, 17, 64, 300])
+            runs.append((len(lines), count))
+            for j in range(count + 1):
+                stamp = (start + timedelta(seconds=len(lines))).strftime("%y/%m/%d %H:%M:%S")
+                retry = k if j < count else k + 1
+                trace = f"\n  at Worker.run(Worker.java:{k})" if k % 2 else ""
+                lines.append(f"{stamp} ERROR Worker-node-{k}: Retry {retry} failed: connection reset by peer{trace}")
+
+        positions = rng.sample(range(num_lines), 30)
+        runs_at, newlines_at = set(positions[:20]), set(positions[20:])
+        for i, line in enumerate(base):
+            if i in runs_at:
+                inject(i)
+            elif i in newlines_at:
+                lines.append("retry\nretry")
+            lines.append(line)
+        inject(num_lines)
+        lines.pop()  # the stream ends inside the last run
+        return lines, runs
+
+    @staticmethod
+    def _expanded(mined):
+        """Per-line view of mined records: the runs of 2+ lines, each record's first line number and
+        count, and per line the final template of its cluster, severity and length."""
+        store = mined.store
+        counts = np.asarray(store.count) if store.repeats else np.ones(len(store), dtype=np.int64)
+        starts = np.cumsum(counts) - counts
+        template_of_key = np.array([mined.cluster_templates[c] for c in mined.table.cluster_of_key], dtype=object)
+        runs = [(int(s), int(c)) for s, c in zip(starts, counts) if c > 1]
+        return (runs, starts, counts, np.repeat(template_of_key[np.asarray(store.key)], counts),
+                np.repeat(np.asarray(store.severity), counts), np.repeat(np.asarray(store.length), counts))
+
+    def _assert_expands_to(self, collapsed, per_line, runs, spill=None):
+        got_runs, starts, counts, templates, severity, length = self._expanded(collapsed)
+        _, _, _, line_templates, line_severity, line_length = self._expanded(per_line)
+        assert got_runs == runs and counts.sum() == len(per_line.store)
+        assert list(templates) == list(line_templates)
+        np.testing.assert_array_equal(severity, line_severity)
+        np.testing.assert_array_equal(length, line_length)
+        ts = np.asarray(per_line.store.ts)
+        np.testing.assert_array_equal(collapsed.store.ts, ts[starts])
+        np.testing.assert_array_equal(collapsed.store.last_ts, ts[starts + counts - 1])
+        # A record's time delta is its first line's, and template frequency counts every line
+        _, X = build_feature_matrix(collapsed, spill=spill)
+        _, X_line = build_feature_matrix(per_line)
+        np.testing.assert_allclose(X[:, 1], X_line[starts, 1])
+        np.testing.assert_allclose(np.repeat(X[:, 3], counts), X_line[:, 3])
+
+    @staticmethod
+    def _batches(lines, runs, rng):
+        """Random batch sizes, with boundaries inside several runs."""
+        bounds = set(rng.sample(range(1, len(lines)), 30))
+        bounds.update(s + c // 2 for s, c in runs[::3] if c > 1)
+        bounds = sorted(bounds)
+        return LineBatches([lines[a:b] for a, b in zip([0] + bounds, bounds + [len(lines)])])
+
+    @pytest.mark.parametrize("engine", ["drain3", "native"])
+    @pytest.mark.parametrize("seed", [1, 2, 3])
+    def test_expanded_records_match_per_line_mining(self, tmp_path, monkeypatch, engine, seed):
+        monkeypatch.setattr(anomaly, "FEATURE_CHUNK_SIZE", 97)  # records are flushed in many chunks
+        lines, runs = self._log_with_runs(tmp_path, seed)
+        batches = self._batches(lines, runs, random.Random(seed))
+        collapsed = mine_log(batches, mining=MiningConfig(engine=engine, collapse_repeats=True))
+        self._assert_expands_to(collapsed, mine_log(lines, mining=MiningConfig(engine=engine)), runs)
+
+    def test_expanded_records_with_spill_and_range_parts(self, tmp_path):
+        lines, runs = self._log_with_runs(tmp_path, seed=4)
+        scratch = tmp_path / "scratch"
+        scratch.mkdir()
+        files = SpillFiles(SpillConfig(memory_limit_bytes=300 * anomaly.IN_MEMORY_BYTES_PER_LINE,
+                                       directory=str(scratch), block_lines=250))
+        collapsed = mine_log(self._batches(lines, runs, random.Random(4)), mining=self.COLLAPSE, spill=files)
+        assert collapsed.store.spilled
+        self._assert_expands_to(collapsed, mine_log(lines), runs, spill=files)
+        files.close()
+        assert list(scratch.iterdir()) == []
+
+        # A run cut by the range boundary becomes one record on each side
+        s, c = next(run for run in runs if run[1] >= 17)
+        cut = s + c // 2
+        parts = [mine_log(lines[:cut], mining=self.COLLAPSE), mine_log(lines[cut:], mining=self.COLLAPSE)]
+        split = sorted([run for run in runs if run != (s, c)] + [(s, c // 2), (cut, c - c // 2)])
+        self._assert_expands_to(anomaly.merge_mined(parts),
+                                anomaly.merge_mined([mine_log(lines[:cut]), mine_log(lines[cut:])]), split)
+
+    def test_streaming_segments_mine_every_line(self, tmp_path):
+        lines, _ = self._log_with_runs(tmp_path, seed=5)
+        streaming = StreamingConfig(segment_lines=700)  # 300-line runs cross segment boundaries
+        assert analyze_log(lines, mining=self.COLLAPSE, streaming=streaming) == analyze_log(lines, streaming=streaming)
+
+class TestProgress:
+    """analyze_log's progress callback: per batch while mining, once per later stage."""
+
+    @staticmethod
+    def _lines(tmp_path, num_lines=3000):
+        log_file = tmp_path / "gen.log"
+        generate_test_logs(filename=str(log_file), num_lines=num_lines, seed=42)
+        return log_file.read_text(encoding="utf-8").strip().split("\n")
+
+    def test_reports_lines_and_stages(self, tmp_path):
+        lines = self._lines(tmp_path)
+        calls = []
+        batches = LineBatches([lines[i:i + 500] for i in range(0, len(lines), 500)])
+        incidents = analyze_log(batches, progress=lambda stage, n: calls.append((stage, n)))
+
+        assert incidents == analyze_log(lines)
+        mined = [n for stage, n in calls if stage == "mine"]
+        assert mined == list(range(500, len(lines) + 1, 500))
+        assert calls[len(mined):] == [("score", len(lines)), ("aggregate", len(lines))]
+
+    def test_streaming_reports_each_segment(self, tmp_path):
+        lines = self._lines(tmp_path)
+        stages = []
+        analyze_log(lines, streaming=StreamingConfig(segment_lines=1000),
+                    progress=lambda stage, n: stages.append((stage, n)))
+        assert [call for call in stages if call[0] == "score"] == [("score", 1000), ("score", 2000), ("score", 3000)]
+        assert stages[-1] == ("score", 3000)
+
+
+
 class TestGetSeverityScore:
     """Severity scoring (ERROR=3, WARN=1, FATAL=5, EXCEPTION=3.5)."""
 
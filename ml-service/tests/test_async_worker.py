@@ -0,0 +1,142 @@
+"""
+Unit tests for the asyncio worker pipeline (async_worker.py) against Moto S3 and SQLite, with an
+in-memory channel instead of RabbitMQ.
+"""
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import text
+
+import async_worker
+import worker
+from test_worker import sqlite_db  # noqa: F401  (fixture)
+
+
+class FakeChannel:
+    """Records publishes and acks (called on the event loop, like pika's channel)."""
+
+    def __init__(self):
+        self.published: list[dict] = []
+        self.acked: list[int] = []
+
+    def basic_publish(self, exchange, routing_key, body):
+        self.published.append(json.loads(body))
+
+    def basic_ack(self, delivery_tag):
+        self.acked.append(delivery_tag)
+
+
+def _message(job_id, file_key, correlation_id=None):
+    return json.dumps({"pattern": "jobs", "data": {"jobId": job_id, "fileKey": file_key, "bucket": "sentinel-logs",
+                                                    "correlationId": correlation_id}}).encode()
+
+
+def _run(channel, messages, prefetch=1):
+    async def main():
+        pipeline = async_worker.JobPipeline(channel, ThreadPoolExecutor(max_workers=1), prefetch=prefetch)
+        pipeline.start()
+        for tag, body in enumerate(messages, 1):
+            pipeline.on_message(channel, SimpleNamespace(delivery_tag=tag), SimpleNamespace(timestamp=None), body)
+        await asyncio.wait_for(pipeline.drain(), 60)
+        pipeline.executor.shutdown()
+    asyncio.run(main())
+
+
+def _analyze_object(s3, bucket, key):
+    from anomaly import analyze_log
+
+    return analyze_log(s3.get_object(Bucket=bucket, Key=key)["Body"].read().decode("utf-8").strip().split("\n"))
+
+
+@pytest.fixture
+def jobs_in_s3(mock_s3, sqlite_db, tmp_path, monkeypatch):  # noqa: F811
+    from test_anomaly import generate_test_logs
+
+    s3, bucket = mock_s3
+    monkeypatch.setattr(worker, "s3_client", s3)
+    monkeypatch.setattr(worker, "RESULTS_QUEUE_NAME", "results")
+    monkeypatch.setattr(worker, "ASYNC_SPOOL_DIR", str(tmp_path))
+    for job_id, seed in (("job-1", 1), ("job-2", 2)):
+        log_file = tmp_path / f"{job_id}.log"
+        generate_test_logs(filename=str(log_file), num_lines=2000, seed=seed)
+        s3.put_object(Bucket=bucket, Key=f"logs/{job_id}.log", Body=log_file.read_bytes())
+    return s3, bucket
+
+
+class TestJobPipeline:
+    """Jobs go through download, analysis and completion with the blocking worker's results."""
+
+    def test_jobs_complete_like_blocking_worker(self, jobs_in_s3, sqlite_db, tmp_path):  # noqa: F811
+        s3, bucket = jobs_in_s3
+        expected = _analyze_object(s3, bucket, "logs/job-1.log")
+        channel = FakeChannel()
+        _run(channel, [_message("job-1", "logs/job-1.log", "corr-1"), _message("job-2", "logs/job-2.log", "corr-2")])
+
+        assert sorted(channel.acked) == [1, 2]
+        progress = [m["data"] for m in channel.published if m["data"]["status"] == "PROGRESS"]
+        assert {(p["jobId"], p["stage"], p["correlationId"]) for p in progress} >= {("job-1", "mine", "corr-1"),
+                                                                                   ("job-1", "aggregate", "corr-1")}
+        assert channel.published[-1]["data"]["status"] != "PROGRESS"
+        by_job = {m["data"]["jobId"]: m for m in channel.published if m["data"]["status"] != "PROGRESS"}
+        assert by_job["job-1"] == {"pattern": "results", "data": {
+            "jobId": "job-1", "status": "COMPLETED", "incidentCount": len(expected), "correlationId": "corr-1"}}
+        assert by_job["job-2"]["data"]["status"] == "COMPLETED"
+        with sqlite_db.connect() as conn:
+            statuses = dict(conn.execute(text('SELECT id, status FROM "AnalysisJob"')).fetchall())
+            templates = conn.execute(text('SELECT "incidentTemplate" FROM "Incident" WHERE "jobId" = \'job-1\'')).scalars()
+            assert statuses == {"job-1": "COMPLETED", "job-2": "COMPLETED"}
+            assert sorted(templates) == sorted(i["incident_template"] for i in expected)
+        assert s3.list_objects_v2(Bucket=bucket).get("KeyCount", 0) == 0
+        assert list(tmp_path.glob("*.spool")) == []
+
+    def test_next_job_downloads_and_previous_completes_during_analysis(self, jobs_in_s3, monkeypatch):
+        events = []
+        lock = threading.Lock()
+
+        def record(name, job_id):
+            with lock:
+                events.append((name, job_id))
+
+        prepare, analyze, complete = async_worker.prepare_job, async_worker.analyze_spooled, worker._complete_job
+
+        def slow_prepare(job):
+            prepare(job)
+            record("downloaded", job.job_id)
+
+        def slow_analyze(job_id, *args):
+            record("analysis started", job_id)
+            time.sleep(0.5)
+            result = analyze(job_id, *args)
+            record("analysis done", job_id)
+            return result
+
+        def slow_complete(job_id, *args):
+            time.sleep(0.5)
+            complete(job_id, *args)
+            record("completed", job_id)
+
+        monkeypatch.setattr(async_worker, "prepare_job", slow_prepare)
+        monkeypatch.setattr(async_worker, "analyze_spooled", slow_analyze)
+        monkeypatch.setattr(worker, "_complete_job", slow_complete)
+        _run(FakeChannel(), [_message("job-1", "logs/job-1.log"), _message("job-2", "logs/job-2.log")])
+
+        assert events.index(("downloaded", "job-2")) < events.index(("analysis done", "job-1"))
+        assert events.index(("analysis started", "job-2")) < events.index(("completed", "job-1"))
+
+    def test_failed_job_is_reported(self, jobs_in_s3, sqlite_db):  # noqa: F811
+        channel = FakeChannel()
+        _run(channel, [_message("job-2", "logs/missing.log", "corr-2"), b'{"data": {"jobId": "job-1"}}'])
+        assert sorted(channel.acked) == [1, 2]
+        assert channel.published == [{"pattern": "results", "data": {
+            "jobId": "job-2", "status": "FAILED", "incidentCount": 0, "correlationId": "corr-2"}}]
+        with sqlite_db.connect() as conn:
+            assert conn.execute(text('SELECT status FROM "AnalysisJob" WHERE id = \'job-2\'')).scalar() == "FAILED"
+
+    def test_prefetch_count_covers_every_stage(self):
+        assert async_worker.JobPipeline.prefetch_count(analyzers=1, prefetch=1) == 4
+        assert async_worker.JobPipeline.prefetch_count(analyzers=4, prefetch=2) == 11
@@ -0,0 +1,82 @@
+"""
+Unit tests for the offline batch CLI (batch.py) on local files.
+"""
+import gzip
+import json
+
+import pytest
+
+import batch
+from anomaly import analyze_log
+from test_anomaly import generate_test_logs
+
+
+def _read_jsonl(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+@pytest.fixture
+def archive(tmp_path):
+    """Two plain logs and a gzipped one in nested directories, plus a file the glob skips."""
+    root = tmp_path / "archive"
+    (root / "b").mkdir(parents=True)
+    for name, seed in (("a.log", 1), ("b/c.log", 2)):
+        generate_test_logs(filename=str(root / name), num_lines=2000, seed=seed)
+    generate_test_logs(filename=str(tmp_path / "d.log"), num_lines=2000, seed=3)
+    (root / "b" / "d.log.gz").write_bytes(gzip.compress((tmp_path / "d.log").read_bytes()))
+    (root / "notes.txt").write_text("not a log\n")
+    return root
+
+
+class TestRunBatch:
+    """Incidents per file match analyze_log; the checkpoint makes runs resumable."""
+
+    def test_incidents_and_stats_per_file(self, archive, tmp_path):
+        out = tmp_path / "incidents.jsonl"
+        totals = batch.run_batch([str(archive)], str(out), pattern="*.log*")
+
+        assert totals["files"] == 3 and totals["failed"] == 0 and totals["lines"] == 6000
+        incidents = _read_jsonl(out)
+        plain = (archive / "a.log").read_text(encoding="utf-8").strip().split("\n")
+        mine = [{k: v for k, v in i.items() if k != "file"} for i in incidents if i["file"].endswith("a.log")]
+        assert mine == analyze_log(plain)
+        assert {i["file"].rsplit("/", 1)[1] for i in incidents} == {"a.log", "c.log", "d.log.gz"}
+
+        stats = _read_jsonl(tmp_path / "incidents.jsonl.checkpoint.jsonl")
+        assert [s["file"].rsplit("/", 1)[1] for s in stats] == ["a.log", "c.log", "d.log.gz"]
+        assert all(s["lines"] == 2000 and "mine" in s["stages"] for s in stats)
+        assert stats[-1]["out_length"] == out.stat().st_size
+        assert sum(s["incidents"] for s in stats) == len(incidents)
+
+    def test_resume_skips_done_files_and_drops_partial_output(self, archive, tmp_path):
+        out = tmp_path / "incidents.jsonl"
+        batch.run_batch([str(archive / "a.log")], str(out))
+        first = out.read_bytes()
+        # Interrupted after writing another file's incidents, before its checkpoint line
+        with open(out, "a") as f:
+            f.write('{"file": "partial"}\n')
+
+        totals = batch.run_batch([str(archive)], str(out), pattern="*.log*")
+        assert totals["skipped"] == 1 and totals["files"] == 2
+        assert out.read_bytes().startswith(first)
+        assert all(i["file"] != "partial" for i in _read_jsonl(out))
+
+        (archive / "a.log").write_text((archive / "a.log").read_text() + "2025-01-15 10:00:00 INFO x\n")
+        assert batch.run_batch([str(archive)], str(out), pattern="*.log*")["files"] == 1  # changed file again
+
+    def test_failed_file_is_retried(self, archive, tmp_path):
+        out = tmp_path / "incidents.jsonl"
+        broken = archive / "broken.log.gz"
+        broken.write_bytes(b"\x1f\x8b not gzip")
+        totals = batch.run_batch([str(broken)], str(out))
+        assert totals["failed"] == 1
+        assert "error" in _read_jsonl(tmp_path / "incidents.jsonl.checkpoint.jsonl")[0]
+        assert batch.run_batch([str(broken)], str(out))["failed"] == 1
+
+    def test_process_pool_matches_inline(self, archive, tmp_path):
+        inline, pooled = tmp_path / "inline.jsonl", tmp_path / "pooled.jsonl"
+        batch.run_batch([str(archive)], str(inline), pattern="*.log*")
+        assert batch.main([str(archive), "--out", str(pooled), "--processes", "2", "--glob", "*.log*"]) == 0
+        key = lambda i: (i["file"], i["incident_template"])  # noqa: E731
+        assert sorted(_read_jsonl(pooled), key=key) == sorted(_read_jsonl(inline), key=key)
@@ -21,7 +21,7 @@ def setup_worker_env(postgres_url, rabbitmq_url, mock_s3):
 
     # Clean up the database after each test to isolate tests
     with worker.db_engine.begin() as conn:
-        conn.execute(text('TRUNCATE TABLE "Incident", "AnalysisJob";'))
+        conn.execute(text('TRUNCATE TABLE "Incident", "AnalysisJob", "AnalysisResultCache";'))
 
 
 @patch("worker.analyze_log") # Mock ML model
@@ -80,4 +80,89 @@ def test_run_analysis_task_integration(mock_analyze_log, setup_worker_env):
 
     # Check if the file was deleted from S3
     response = s3_client.list_objects_v2(Bucket=bucket_name)
-    assert "Contents" not in response  # Empty bucket means the file was deleted
\ No newline at end of file
+    assert "Contents" not in response  # Empty bucket means the file was deleted
+
+def test_update_job_status_copies_incidents(setup_worker_env):
+    """
+    On psycopg2 incidents are streamed with COPY in the same transaction as the job update:
+    escapes and NULLs survive, and every row lands.
+    """
+    db_engine, _, _ = setup_worker_env
+    job_id = "test-job-copy"
+    with db_engine.begin() as conn:
+        conn.execute(text('INSERT INTO "AnalysisJob" (id, status) VALUES (:id, :status)'), {"id": job_id, "status": "PENDING"})
+
+    incidents = [
+        {"incident_template": "tab\there \\N back\\slash", "occurrences": 2, "avg_score": 0.7,
+         "severity": "HIGH", "example_log": "multi\nline\r\nexample"},
+        {"incident_template": "no example", "occurrences": 1, "avg_score": 0.5, "severity": "LOW", "example_log": None},
+    ] + [
+        {"incident_template": f"template {i}", "occurrences": i, "avg_score": 0.55,
+         "severity": "MEDIUM", "example_log": f"example {i}"}
+        for i in range(5000)
+    ]
+
+    worker.update_job_status(job_id, "COMPLETED", incidents)
+
+    with db_engine.connect() as conn:
+        job = conn.execute(text('SELECT status, "incidentCount" FROM "AnalysisJob" WHERE id = :id'), {"id": job_id}).fetchone()
+        assert (job.status, job.incidentCount) == ("COMPLETED", len(incidents))
+        count = conn.execute(text('SELECT count(*) FROM "Incident" WHERE "jobId" = :id'), {"id": job_id}).scalar()
+        assert count == len(incidents)
+        tricky = conn.execute(text('SELECT "exampleLog" FROM "Incident" WHERE "incidentTemplate" = :t'),
+                              {"t": "tab\there \\N back\\slash"}).scalar()
+        assert tricky == "multi\nline\r\nexample"
+        missing = conn.execute(text('SELECT "exampleLog" FROM "Incident" WHERE "incidentTemplate" = \'no example\'')).fetchone()
+        assert missing.exampleLog is None
+
+
+def test_copy_matches_executemany(setup_worker_env, monkeypatch):
+    """
+    COPY and the executemany INSERT store the same rows for text full of COPY's special characters
+    (tabs, line breaks, backslashes, \\N, escape-like sequences, JSON, NUL) and NULLs.
+    """
+    from test_worker import TestIncidentPersistence
+
+    db_engine, _, _ = setup_worker_env
+    incidents = TestIncidentPersistence._random_incidents(seed=7)
+    with db_engine.begin() as conn:
+        for job_id in ("job-copy", "job-insert"):
+            conn.execute(text('INSERT INTO "AnalysisJob" (id, status) VALUES (:id, :status)'), {"id": job_id, "status": "PENDING"})
+
+    worker.update_job_status("job-copy", "COMPLETED", incidents)
+    monkeypatch.setattr(worker, "_copy_incidents", lambda conn, job_id, incidents: False)
+    worker.update_job_status("job-insert", "COMPLETED", incidents)
+
+    def stored(job_id):
+        with db_engine.connect() as conn:
+            rows = conn.execute(text('SELECT "incidentTemplate", occurrences, "avgScore", severity, "exampleLog" '
+                                     'FROM "Incident" WHERE "jobId" = :id'), {"id": job_id}).fetchall()
+        return sorted(map(tuple, rows), key=repr)
+
+    assert stored("job-copy") == stored("job-insert")
+    assert len(stored("job-copy")) == len(incidents)
+
+def test_result_cache_copies_incidents(setup_worker_env):
+    """A cached result is copied to a new job in PostgreSQL with fresh incident ids."""
+    db_engine, _, _ = setup_worker_env
+    with db_engine.begin() as conn:
+        for job_id in ("job-original", "job-duplicate"):
+            conn.execute(text('INSERT INTO "AnalysisJob" (id, status) VALUES (:id, :status)'), {"id": job_id, "status": "PENDING"})
+
+    incidents = [
+        {"incident_template": f"template {i}", "occurrences": i + 1, "avg_score": 0.5,
+         "severity": "HIGH", "example_log": f"example {i}"}
+        for i in range(3)
+    ]
+    worker.update_job_status("job-original", "COMPLETED", incidents)
+    worker.remember_result("job-original", "content-key")
+
+    copied = worker.copy_cached_result("job-duplicate", "content-key")
+    assert sorted(i["incident_template"] for i in copied) == ["template 0", "template 1", "template 2"]
+    assert worker.copy_cached_result("job-duplicate", "other-key") is None
+
+    with db_engine.connect() as conn:
+        job = conn.execute(text('SELECT status, "incidentCount" FROM "AnalysisJob" WHERE id = :id'), {"id": "job-duplicate"}).fetchone()
+        assert (job.status, job.incidentCount) == ("COMPLETED", 3)
+        ids = conn.execute(text('SELECT count(DISTINCT id) FROM "Incident"')).scalar()
+        assert ids == 6
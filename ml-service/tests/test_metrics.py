@@ -0,0 +1,77 @@
+"""
+Unit tests for the worker's Prometheus text-format metrics.
+"""
+import urllib.error
+import urllib.request
+
+import pytest
+
+import metrics
+
+
+class TestRender:
+    """Exposition format: HELP/TYPE headers, labels, cumulative histogram buckets."""
+
+    def test_counter_and_gauge(self):
+        registry = metrics.Registry()
+        jobs = registry.register(metrics.Counter("jobs_total", "Jobs.", ("status",)))
+        in_flight = registry.register(metrics.Gauge("in_flight", "In flight."))
+        jobs.inc(status="COMPLETED")
+        jobs.inc(2, status="FAILED")
+        in_flight.inc()
+        in_flight.inc()
+        in_flight.dec()
+
+        text = registry.render()
+        assert "# TYPE jobs_total counter" in text
+        assert 'jobs_total{status="COMPLETED"} 1' in text
+        assert 'jobs_total{status="FAILED"} 2' in text
+        assert "# TYPE in_flight gauge\nin_flight 1\n" in text
+
+    def test_histogram_buckets_are_cumulative(self):
+        hist = metrics.Histogram("stage_seconds", "Stage time.", ("stage",), buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 0.5, 3.0):
+            hist.observe(value, stage="fit")
+
+        samples = hist.samples()
+        assert 'stage_seconds_bucket{stage="fit",le="0.1"} 1' in samples
+        assert 'stage_seconds_bucket{stage="fit",le="1"} 3' in samples
+        assert 'stage_seconds_bucket{stage="fit",le="+Inf"} 4' in samples
+        assert 'stage_seconds_sum{stage="fit"} 4.05' in samples
+        assert hist.count(stage="fit") == 4
+
+    def test_label_values_are_escaped(self):
+        counter = metrics.Counter("c", "C.", ("stage",))
+        counter.inc(stage='a"b\\c')
+        assert counter.samples() == ['c{stage="a\\"b\\\\c"} 1']
+
+    def test_observe_stages(self):
+        before = metrics.STAGE_SECONDS.count(stage="mine")
+        lines_before = metrics.STAGE_LINES.value(stage="mine")
+        metrics.observe_stages({"mine": {"seconds": 0.2, "calls": 3, "lines": 1000, "bytes": 0}})
+        assert metrics.STAGE_SECONDS.count(stage="mine") == before + 1
+        assert metrics.STAGE_LINES.value(stage="mine") == lines_before + 1000
+        assert metrics.STAGE_BYTES.value(stage="mine") == 0
+
+
+class TestMetricsServer:
+    """The /metrics endpoint serves the registry; other paths are 404."""
+
+    @pytest.fixture
+    def server(self):
+        registry = metrics.Registry()
+        registry.register(metrics.Counter("up_total", "Up.")).inc()
+        server = metrics.start_metrics_server(0, host="127.0.0.1", registry=registry)
+        yield f"http://127.0.0.1:{server.server_address[1]}"
+        server.shutdown()
+        server.server_close()
+
+    def test_scrape(self, server):
+        with urllib.request.urlopen(f"{server}/metrics", timeout=5) as resp:
+            assert resp.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+            assert "up_total 1" in resp.read().decode()
+
+    def test_unknown_path(self, server):
+        with pytest.raises(urllib.error.HTTPError) as err:
+            urllib.request.urlopen(f"{server}/", timeout=5)
+        assert err.value.code == 404
@@ -0,0 +1,53 @@
+"""
+Unit tests for cached baseline model entries (model_cache.py).
+"""
+import pickle
+
+from anomaly import MASK_PROFILES, MiningConfig, ModelConfig, ScoringBaseline, analyze_log
+from model_cache import dump_baseline, load_baseline, model_key
+
+
+def _fitted_model(tmp_path):
+    from test_anomaly import generate_test_logs
+
+    log_file = tmp_path / "gen.log"
+    generate_test_logs(filename=str(log_file), num_lines=2000, seed=7)
+    baseline = ScoringBaseline()
+    analyze_log(log_file.read_text(encoding="utf-8").strip().split("\n"), baseline=baseline)
+    return baseline.model
+
+
+class TestModelCacheEntries:
+    """Entries round-trip and are rejected when written for other settings or another version."""
+
+    def test_round_trip(self, tmp_path):
+        model = _fitted_model(tmp_path)
+        key = model_key(ModelConfig())
+        loaded = load_baseline(dump_baseline(model, key), key)
+        assert loaded.threshold == model.threshold and loaded.fitted_at == model.fitted_at
+        assert (loaded.scaler.mean_ == model.scaler.mean_).all()
+
+    def test_key_ignores_threads_but_not_forest_settings(self):
+        assert model_key(ModelConfig(n_jobs=4)) == model_key(ModelConfig())
+        assert model_key(ModelConfig(n_estimators=50)) != model_key(ModelConfig())
+        assert model_key(ModelConfig(), window_size=5) != model_key(ModelConfig())
+
+    def test_key_includes_feature_settings(self):
+        """Mining and deduplication change the feature rows, so models fitted under others are not reused."""
+        default = model_key(ModelConfig())
+        assert model_key(ModelConfig(), mining=MiningConfig()) == default
+        mining = [MiningConfig(masks=MASK_PROFILES["default"]), MiningConfig(max_clusters=100),
+                  MiningConfig(engine="native"), MiningConfig(collapse_repeats=True)]
+        dedup = [ModelConfig(dedup_features=True), ModelConfig(dedup_features=True, dedup_decimals=3)]
+        keys = [model_key(ModelConfig(), mining=m) for m in mining] + [model_key(c) for c in dedup]
+        assert len({default, *keys}) == len(keys) + 1
+
+    def test_mismatched_entries_are_misses(self, tmp_path):
+        model = _fitted_model(tmp_path)
+        state = dump_baseline(model, model_key(ModelConfig()))
+        assert load_baseline(state, model_key(ModelConfig(n_estimators=50))) is None
+        assert load_baseline(None, model_key(ModelConfig())) is None
+
+        header = {"version": 0, "sklearn": "0.0", "key": model_key(ModelConfig())}
+        old = pickle.dumps(header) + b"not a model pickle"
+        assert load_baseline(old, model_key(ModelConfig())) is None
@@ -0,0 +1,101 @@
+"""
+Unit tests for the native template miner (native_miner.py): parity with Drain3 and state snapshots.
+"""
+import random
+import tempfile
+
+import numpy as np
+import pytest
+
+from anomaly import MASK_PROFILES, MiningConfig, analyze_log, mine_log
+from native_miner import NativeMiner
+from template_state import cluster_count, dump_miner, load_miner
+
+
+def _lines(n: int, seed: int) -> list[str]:
+    from test_anomaly import generate_test_logs
+
+    with tempfile.NamedTemporaryFile("r", suffix=".log") as f:
+        generate_test_logs(filename=f.name, num_lines=n, seed=seed)
+        return f.read().strip().split("\n")
+
+
+def _long_tail_lines(n: int, seed: int) -> list[str]:
+    """Free text of varying length and wording, with literal "<*>" and numbers: many clusters, many
+    first tokens (past the 100 children of a tree node) and templates that keep generalizing."""
+    rng = random.Random(seed)
+    words = [f"w{i % 7}x" if i % 3 else f"word{i}" for i in range(150)] + ["<*>", "42", "a1", ""]
+    return [" ".join(rng.choices(words, k=rng.randint(0, 9))) for _ in range(n)]
+
+
+def _assert_same_mining(lines: list[str], **settings):
+    drain3 = mine_log(lines, mining=MiningConfig(**settings))
+    native = mine_log(lines, mining=MiningConfig(engine="native", **settings))
+    assert native.table.templates == drain3.table.templates
+    assert native.table.cluster_of_key == drain3.table.cluster_of_key
+    assert native.table.examples == drain3.table.examples
+    assert np.array_equal(native.store.key, drain3.store.key)
+    assert list(native.cluster_templates.items()) == list(drain3.cluster_templates.items())
+
+
+class TestDrain3Parity:
+    """The native engine mines the same clusters, templates and per-line keys as Drain3."""
+
+    @pytest.mark.parametrize("seed", [1, 42, 123])
+    @pytest.mark.parametrize("settings", [{}, {"masks": MASK_PROFILES["default"]}, {"max_clusters": 5}],
+                             ids=["plain", "masks", "max-clusters"])
+    def test_generated_logs(self, seed, settings):
+        _assert_same_mining(_lines(3000, seed), **settings)
+
+    @pytest.mark.parametrize("max_clusters", [None, 20])
+    def test_long_tail(self, max_clusters):
+        _assert_same_mining(_long_tail_lines(4000, 5), max_clusters=max_clusters)
+
+    def test_analyze_log_matches(self):
+        lines = _lines(2000, 7)
+        assert analyze_log(lines, mining=MiningConfig(engine="native")) == analyze_log(lines)
+
+    def test_template_ids(self):
+        miner = NativeMiner()
+        tids = miner.add_many(["disk full on sda", "disk full on sdb", "cache miss"])
+        assert tids.dtype == np.int32
+        assert [miner.template_of(t) for t in tids] == [
+            (1, "disk full on sda"), (1, "disk full on <*>"), (2, "cache miss")]
+        assert miner.cluster_templates() == {1: "disk full on <*>", 2: "cache miss"}
+        miner.forget_templates()
+        assert miner.template_of(tids[1]) == (1, "disk full on <*>")
+        with pytest.raises(KeyError):
+            miner.template_of(tids[0])
+        assert miner.add_many(["disk full on sdc"])[0] == tids[1]
+
+    def test_unknown_engine(self):
+        with pytest.raises(ValueError):
+            MiningConfig(engine="fast")
+
+
+class TestNativeMinerState:
+    """dump / load restore the tree, clusters and LRU order."""
+
+    def test_round_trip_keeps_mining(self):
+        first, second = _long_tail_lines(2000, 1), _long_tail_lines(2000, 2)
+        reference = NativeMiner()
+        reference.add_many(first)
+        expected = [reference.template_of(t) for t in reference.add_many(second)]
+
+        miner = load_miner(None, engine="native")
+        mine_log(first, miner=miner)
+        restored = load_miner(dump_miner(miner), engine="native")
+        assert restored.cluster_templates() == miner.cluster_templates()
+        assert [restored.template_of(t) for t in restored.add_many(second)] == expected
+
+    def test_load_applies_cluster_bound(self):
+        miner = NativeMiner()
+        miner.add_many([f"event_{i} " + "x " * i for i in range(20)])
+        restored = NativeMiner.load(miner.dump(), max_clusters=5)
+        assert cluster_count(restored) == 5 and sorted(restored.clusters) == list(range(16, 21))
+
+    def test_rejects_other_states(self):
+        drain3_state = dump_miner(load_miner(None))
+        for state in (drain3_state, b"not a snapshot"):
+            with pytest.raises(ValueError):
+                NativeMiner.load(state)
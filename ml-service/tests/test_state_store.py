@@ -0,0 +1,82 @@
+"""
+Unit tests for the per-source state stores (state_store.py).
+"""
+import os
+
+from state_store import FileStateStore, RedisStateStore, store_from_env
+
+
+class TestFileStateStore:
+    """Per-source files with a size cap and LRU eviction."""
+
+    def test_save_and_load(self, tmp_path):
+        store = FileStateStore(str(tmp_path))
+        assert store.load("svc-a") is None
+        assert store.save("svc-a", b"state")
+        assert store.load("svc-a") == b"state"
+        assert store.load("svc-b") is None
+
+    def test_source_keys_are_not_paths(self, tmp_path):
+        store = FileStateStore(str(tmp_path / "states"))
+        store.save("../../etc/passwd", b"x")
+        assert os.listdir(tmp_path) == ["states"]
+
+    def test_over_cap_state_is_dropped(self, tmp_path):
+        store = FileStateStore(str(tmp_path), max_bytes=10)
+        store.save("svc", b"small")
+        assert not store.save("svc", b"x" * 11)
+        assert store.load("svc") is None
+
+    def test_least_recently_used_sources_are_evicted(self, tmp_path):
+        store = FileStateStore(str(tmp_path), max_sources=2)
+        store.save("a", b"1")
+        store.save("b", b"2")
+        os.utime(store._path("a"), (1, 1))
+        os.utime(store._path("b"), (2, 2))
+        store.load("a")  # a becomes the most recently used
+        store.save("c", b"3")
+        assert store.load("b") is None
+        assert store.load("a") == b"1" and store.load("c") == b"3"
+
+
+class _DictRedis:
+    """Enough of the redis client API for RedisTemplateStore."""
+
+    def __init__(self):
+        self.data, self.ttl = {}, {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None):
+        self.data[key], self.ttl[key] = value, ex
+
+    def expire(self, key, seconds):
+        self.ttl[key] = seconds
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+
+class TestRedisStateStore:
+    """Keys are prefixed per source and carry a TTL; over-cap states are dropped."""
+
+    def test_save_load_and_cap(self):
+        client = _DictRedis()
+        store = RedisStateStore(client, prefix="p:", max_bytes=8, ttl_seconds=60)
+        assert store.save("svc", b"state")
+        assert client.ttl["p:svc"] == 60
+        assert store.load("svc") == b"state"
+        assert not store.save("svc", b"too large state")
+        assert store.load("svc") is None
+
+
+class TestStoreFromEnv:
+    """Env prefixes select and size the store; `kind` names its files."""
+
+    def test_file_store(self, tmp_path):
+        assert store_from_env("MODEL_CACHE", "model", env={}) is None
+        store = store_from_env("MODEL_CACHE", "model", env={"MODEL_CACHE_DIR": str(tmp_path), "MODEL_CACHE_MAX_SOURCES": "3"})
+        store.save("svc", b"m")
+        assert store.max_sources == 3
+        assert [p.suffix for p in tmp_path.iterdir()] == [".model"]
@@ -0,0 +1,41 @@
+"""
+Unit tests for warm-start Drain3 state per log source (template_state.py).
+"""
+import tempfile
+
+from anomaly import analyze_log, mine_log
+from template_state import dump_miner, load_miner
+
+
+def _lines(n: int, seed: int) -> list[str]:
+    from test_anomaly import generate_test_logs
+
+    with tempfile.NamedTemporaryFile("r", suffix=".log") as f:
+        generate_test_logs(filename=f.name, num_lines=n, seed=seed)
+        return f.read().strip().split("\n")
+
+
+class TestMinerState:
+    """Snapshots restore the Drain3 tree: same clusters, ids and templates."""
+
+    def test_round_trip(self):
+        miner = load_miner(None)
+        mine_log(_lines(2000, 1), miner=miner)
+        restored = load_miner(dump_miner(miner))
+        assert {c.cluster_id: c.get_template() for c in restored.drain.clusters} == \
+               {c.cluster_id: c.get_template() for c in miner.drain.clusters}
+        assert restored.drain.clusters_counter == miner.drain.clusters_counter
+        assert restored.persistence_handler is None
+
+    def test_warm_miner_keeps_templates_stable(self):
+        """A second job of the same source mines into the first job's clusters instead of new ones."""
+        miner = load_miner(None)
+        first = mine_log(_lines(3000, 1), miner=miner)
+        warm = load_miner(dump_miner(miner))
+        second = mine_log(_lines(3000, 2), miner=warm)
+        assert len(warm.drain.clusters) == len(miner.drain.clusters)
+        assert set(second.table.templates) <= set(first.cluster_templates.values())
+
+    def test_analyze_log_with_cold_miner_matches_default(self):
+        lines = _lines(2000, 3)
+        assert analyze_log(lines, miner=load_miner(None)) == analyze_log(lines)
@@ -1,16 +1,42 @@
 import os
+import io
 import sys
+import bz2
+import gzip
 import json
+import hashlib
 import pika
 import boto3
 import uuid
 import time
-from concurrent.futures import ThreadPoolExecutor
+import functools
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field, replace
+from datetime import datetime, timedelta, timezone
+from itertools import chain
+from time import perf_counter
 from sqlalchemy import create_engine, text
 from dotenv import load_dotenv
-from anomaly import analyze_log
+from anomaly import (NULL_TIMER, LineBatches, MiningConfig, ModelConfig, ScoringBaseline, SpillConfig, StageTimer,
+                     StreamingConfig, analyze_log, analyze_mined_parts, mine_log, resolve_masks)
+import metrics
+import model_cache
+import state_store
+import template_state
 import structlog
 
+try:
+    from compression.zstd import ZstdFile  # Python 3.14+
+except ImportError:
+    ZstdFile = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
 load_dotenv()
 
 
@@ -38,9 +64,88 @@ JOBS_QUEUE_NAME = None
 RESULTS_QUEUE_NAME = None
 s3_client = None
 db_engine = None
+# 0 = analyze in a thread of this process; N > 0 = N analysis processes (and prefetch N)
+ANALYSIS_PROCESSES = 0
+ANALYSIS_MAX_TASKS_PER_CHILD = 20
+# WORKER_MODE=async: asyncio pipeline (async_worker.py) that downloads up to ASYNC_PREFETCH_JOBS objects
+# ahead into ASYNC_SPOOL_DIR (default: system temp dir) and persists finished jobs during the next analysis
+WORKER_MODE = "blocking"
+ASYNC_PREFETCH_JOBS = 1
+ASYNC_SPOOL_DIR = None
+# Size-aware lanes (off when LANE_LARGE_MIN_BYTES is unset): jobs whose object is estimated at
+# LANE_LARGE_MIN_BYTES or more (uncompressed) are re-queued to "<RABBITMQ_JOBS_QUEUE>.large". Each lane
+# has its own consumer and LANE_*_CONCURRENCY analysis slots; large-lane processes run at LANE_LARGE_NICE.
+LANE_LARGE_MIN_BYTES = None
+LANE_SMALL_CONCURRENCY = 1
+LANE_LARGE_CONCURRENCY = 1
+LANE_LARGE_NICE = 10
+# Assumed expansion of compressed objects when estimating their analyzed size
+COMPRESSED_SIZE_FACTOR = 10
+# PROGRESS messages on the results queue while a job analyzes: one when each stage is first reached,
+# then at most one per PROGRESS_INTERVAL_SECONDS (0 = off)
+PROGRESS_INTERVAL_SECONDS = 10.0
+# Objects of at least RANGE_SPLIT_MIN_BYTES are mined in RANGE_PROCESSES byte ranges in parallel (0 = off)
+RANGE_PROCESSES = 0
+RANGE_SPLIT_MIN_BYTES = 256 * 1024 * 1024
+# Bytes per S3 read; each chunk is decoded and split into lines at once
+S3_READ_CHUNK_BYTES = 2 * 1024 * 1024
+# Per-stage timing (logged per job, exported on /metrics when METRICS_PORT is set); off = NULL_TIMER
+STAGE_TIMING = False
+METRICS_PORT = None
+# Warm-start Drain3 state per job "sourceKey" (TEMPLATE_STATE_DIR or TEMPLATE_STATE_URL); None = always cold
+template_store = None
+# Cached scaler/forest per job "sourceKey" (MODEL_CACHE_DIR or MODEL_CACHE_URL); None = fit every job.
+# A cached model is refit when older than MODEL_MAX_AGE_SECONDS or when the job's features drift more
+# than MODEL_MAX_DRIFT fitted standard deviations.
+model_store = None
+MODEL_MAX_AGE_SECONDS = 7 * 24 * 3600
+MODEL_MAX_DRIFT = 0.5
+# Token masks applied before mining (MINING_MASKS: a profile such as "default" or mask names), the
+# LRU bound on clusters (MINING_MAX_CLUSTERS), the miner (MINING_ENGINE: drain3 or native) and
+# run-length collapse of repeated lines (MINING_COLLAPSE_REPEATS); MiningConfig() = Drain3, no
+# masking, unbounded, every line mined
+MINING = MiningConfig()
+# Analyze sequential jobs in bounded-memory segments of STREAMING_SEGMENT_LINES lines, fitting on a
+# reservoir of STREAMING_RESERVOIR_SIZE feature rows (see StreamingConfig); None = whole-file analysis
+STREAMING = None
+# Whole-file jobs whose per-line arrays would take more than SPILL_MEMORY_LIMIT_BYTES move them to
+# np.memmap files under SPILL_DIR (default: the system temp dir; see SpillConfig); None = in memory
+SPILL = None
+# Reuse the incidents of a completed job with the same content (S3 ETag + size) and analyzer settings
+# ("AnalysisResultCache" table); entries unused for RESULT_CACHE_TTL_SECONDS or beyond the
+# RESULT_CACHE_MAX_ENTRIES most recently used are evicted
+RESULT_CACHE = False
+RESULT_CACHE_TTL_SECONDS = 30 * 24 * 3600
+RESULT_CACHE_MAX_ENTRIES = 10_000
+# Bump when the analysis output for the same input changes, so older cache entries stop matching
+RESULT_CACHE_VERSION = 1
+# Template-frequency window of the features (analyze_log's window_size); part of the result cache key
+WINDOW_SIZE = 3
+
+
+
+@dataclass
+class Lane:
+    """A consumer of the worker: its queue, its analysis slots (dispatcher threads; ack/notify run on the
+    connection thread via add_callback_threadsafe) and, in process mode, its own process pool."""
+    name: str
+    queue: str | None
+    concurrency: int = 1
+    nice: int = 0
+    executor: ThreadPoolExecutor = None
+    pool: ProcessPoolExecutor | None = None
+    pool_lock: threading.Lock = field(default_factory=threading.Lock)
+    progress_queue: object = None  # multiprocessing queue of the pool's PROGRESS payloads
+
+    def __post_init__(self):
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix=f"lane-{self.name}")
+
 
-# Thread pool for long-running analysis; ack/notify run on connection thread via add_callback_threadsafe
-_analysis_executor = ThreadPoolExecutor(max_workers=1)
+# Lanes consumed by start_worker; a single "jobs" lane unless LANE_LARGE_MIN_BYTES is set
+_lanes = {"jobs": Lane("jobs", None)}
+# In pool processes: where the children put PROGRESS payloads for the parent to publish
+_progress_queue = None
 
 
 # --- Tools for resilience ---
@@ -87,10 +192,53 @@ def _normalize_database_url(db_url: str | None) -> str:
 def init_runtime_from_env():
     """Initialize clients and runtime config from environment variables."""
     global RABBIT_URL, JOBS_QUEUE_NAME, RESULTS_QUEUE_NAME, s3_client, db_engine
+    global ANALYSIS_PROCESSES, ANALYSIS_MAX_TASKS_PER_CHILD, RANGE_PROCESSES, RANGE_SPLIT_MIN_BYTES
+    global WORKER_MODE, ASYNC_PREFETCH_JOBS, ASYNC_SPOOL_DIR
+    global LANE_LARGE_MIN_BYTES, LANE_SMALL_CONCURRENCY, LANE_LARGE_CONCURRENCY, LANE_LARGE_NICE
+    global PROGRESS_INTERVAL_SECONDS
+    global S3_READ_CHUNK_BYTES, STAGE_TIMING, METRICS_PORT, template_store
+    global model_store, MODEL_MAX_AGE_SECONDS, MODEL_MAX_DRIFT
+    global RESULT_CACHE, RESULT_CACHE_TTL_SECONDS, RESULT_CACHE_MAX_ENTRIES, MINING, STREAMING, SPILL
 
     RABBIT_URL = os.getenv("RABBITMQ_URL")
     JOBS_QUEUE_NAME = os.getenv("RABBITMQ_JOBS_QUEUE")
     RESULTS_QUEUE_NAME = os.getenv("RABBITMQ_RESULTS_QUEUE")
+    ANALYSIS_PROCESSES = int(os.getenv("ANALYSIS_PROCESSES", "0"))
+    ANALYSIS_MAX_TASKS_PER_CHILD = int(os.getenv("ANALYSIS_MAX_TASKS_PER_CHILD", "20"))
+    WORKER_MODE = os.getenv("WORKER_MODE", "blocking").lower()
+    ASYNC_PREFETCH_JOBS = int(os.getenv("ASYNC_PREFETCH_JOBS", "1"))
+    ASYNC_SPOOL_DIR = os.getenv("ASYNC_SPOOL_DIR") or None
+    LANE_LARGE_MIN_BYTES = int(os.getenv("LANE_LARGE_MIN_BYTES")) if os.getenv("LANE_LARGE_MIN_BYTES") else None
+    LANE_SMALL_CONCURRENCY = int(os.getenv("LANE_SMALL_CONCURRENCY", "1"))
+    LANE_LARGE_CONCURRENCY = int(os.getenv("LANE_LARGE_CONCURRENCY", "1"))
+    LANE_LARGE_NICE = int(os.getenv("LANE_LARGE_NICE", "10"))
+    PROGRESS_INTERVAL_SECONDS = float(os.getenv("PROGRESS_INTERVAL_SECONDS", "10"))
+    RANGE_PROCESSES = int(os.getenv("RANGE_PROCESSES", "0"))
+    RANGE_SPLIT_MIN_BYTES = int(os.getenv("RANGE_SPLIT_MIN_BYTES", str(256 * 1024 * 1024)))
+    S3_READ_CHUNK_BYTES = int(os.getenv("S3_READ_CHUNK_BYTES", str(2 * 1024 * 1024)))
+    METRICS_PORT = int(os.getenv("METRICS_PORT")) if os.getenv("METRICS_PORT") else None
+    STAGE_TIMING = METRICS_PORT is not None or os.getenv("STAGE_TIMING", "").lower() in ("1", "true", "yes")
+    template_store = state_store.store_from_env("TEMPLATE_STATE", "drain3")
+    model_store = state_store.store_from_env("MODEL_CACHE", "model")
+    MODEL_MAX_AGE_SECONDS = float(os.getenv("MODEL_MAX_AGE_SECONDS", str(7 * 24 * 3600)))
+    MODEL_MAX_DRIFT = float(os.getenv("MODEL_MAX_DRIFT", "0.5"))
+    RESULT_CACHE = os.getenv("RESULT_CACHE", "").lower() in ("1", "true", "yes")
+    RESULT_CACHE_TTL_SECONDS = int(os.getenv("RESULT_CACHE_TTL_SECONDS", str(30 * 24 * 3600)))
+    RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "10000"))
+    MINING = MiningConfig(
+        masks=resolve_masks(os.getenv("MINING_MASKS", "")),
+        max_clusters=int(os.getenv("MINING_MAX_CLUSTERS")) if os.getenv("MINING_MAX_CLUSTERS") else None,
+        engine=os.getenv("MINING_ENGINE", "drain3"),
+        collapse_repeats=os.getenv("MINING_COLLAPSE_REPEATS", "").lower() in ("1", "true", "yes"),
+    )
+    STREAMING = StreamingConfig(
+        segment_lines=int(os.getenv("STREAMING_SEGMENT_LINES")),
+        reservoir_size=int(os.getenv("STREAMING_RESERVOIR_SIZE", str(StreamingConfig.reservoir_size))),
+    ) if os.getenv("STREAMING_SEGMENT_LINES") else None
+    SPILL = SpillConfig(
+        memory_limit_bytes=int(os.getenv("SPILL_MEMORY_LIMIT_BYTES")),
+        directory=os.getenv("SPILL_DIR") or None,
+    ) if os.getenv("SPILL_MEMORY_LIMIT_BYTES") else None
 
     boto3_kwargs = {
         "region_name": os.getenv("S3_REGION", "us-east-1")
@@ -171,6 +319,144 @@ def send_result_notification(channel, job_id: str, status: str, incidents: list
         logger.error("Failed to send result notification", error=str(e))
 
 
+def send_progress_notification(channel, payload: dict):
+    """Publish a PROGRESS payload (see ProgressReporter) to the results queue; called on the connection thread."""
+    try:
+        channel.basic_publish(
+            exchange='',
+            routing_key=RESULTS_QUEUE_NAME,
+            body=json.dumps({"pattern": RESULTS_QUEUE_NAME, "data": payload})
+        )
+    except Exception as e:
+        logger.warning("Failed to send progress notification", error=str(e))
+
+
+class ProgressReporter:
+    """
+    analyze_log's progress callback for one job. Tracks the stage, the lines mined and the object
+    bytes read (count_bytes wraps the object's chunks) and hands a PROGRESS payload to `publish` when
+    a stage is reached for the first time, then at most every `interval` seconds. Called per batch;
+    a set lookup and a clock read when nothing is sent.
+    """
+
+    def __init__(self, publish, job_id: str, correlation_id: str = None, interval: float = None):
+        self.publish = publish
+        self.job_id = job_id
+        self.correlation_id = correlation_id
+        self.interval = PROGRESS_INTERVAL_SECONDS if interval is None else interval
+        self.total_bytes = None
+        self.bytes_read = 0
+        self._stages = set()
+        self._sent = 0.0
+
+    def count_bytes(self, chunks):
+        for chunk in chunks:
+            self.bytes_read += len(chunk)
+            yield chunk
+
+    def __call__(self, stage: str, lines: int):
+        now = time.monotonic()
+        if stage in self._stages and now - self._sent < self.interval:
+            return
+        self._stages.add(stage)
+        self._sent = now
+        try:
+            self.publish({
+                "jobId": self.job_id,
+                "status": "PROGRESS",
+                "stage": stage,
+                "linesProcessed": lines,
+                "bytesProcessed": self.bytes_read,
+                "totalBytes": self.total_bytes,
+                "correlationId": self.correlation_id,
+            })
+        except Exception as e:
+            logger.warning("Failed to queue progress notification", error=str(e))
+
+
+def job_progress(job_id: str, correlation_id: str = None, publish=None) -> ProgressReporter | None:
+    """A ProgressReporter for the job, or None when progress is off. publish defaults to the pool
+    process's progress queue (the parent publishes what the children put there)."""
+    publish = publish or (_progress_queue.put if _progress_queue is not None else None)
+    if PROGRESS_INTERVAL_SECONDS <= 0 or publish is None:
+        return None
+    return ProgressReporter(publish, job_id, correlation_id)
+
+
+def _forward_progress(queue, channel):
+    """Daemon thread: publish the PROGRESS payloads of a lane's pool processes on the connection thread."""
+    while True:
+        payload = queue.get()
+        channel.connection.add_callback_threadsafe(functools.partial(send_progress_notification, channel, payload))
+
+
+INCIDENT_COLUMNS = ("id", "jobId", "incidentTemplate", "occurrences", "avgScore", "severity", "exampleLog")
+
+
+def _pg_text(value):
+    """PostgreSQL text cannot hold NUL characters (COPY and INSERT both reject them); they become
+    U+FFFD, like undecodable bytes of the log."""
+    if isinstance(value, str) and "\0" in value:
+        return value.replace("\0", "\ufffd")
+    return value
+
+
+def _incident_rows(job_id, incidents):
+    """Incident rows in INCIDENT_COLUMNS order, shared by the COPY and executemany paths."""
+    for incident in incidents:
+        yield (
+            str(uuid.uuid4()),
+            job_id,
+            _pg_text(incident["incident_template"]),
+            int(incident["occurrences"]),
+            float(incident["avg_score"]),
+            incident["severity"],
+            _pg_text(incident["example_log"]),
+        )
+
+
+def _copy_field(value) -> str:
+    """One COPY text-format field: None is \\N (NULL); backslash, tab and line breaks are escaped."""
+    if value is None:
+        return "\\N"
+    value = str(value)
+    # Most fields contain none of these; guarded replace() is much faster than str.translate
+    if "\\" in value:
+        value = value.replace("\\", "\\\\")
+    if "\t" in value:
+        value = value.replace("\t", "\\t")
+    if "\n" in value:
+        value = value.replace("\n", "\\n")
+    if "\r" in value:
+        value = value.replace("\r", "\\r")
+    return value
+
+
+def _incidents_copy_text(job_id, incidents) -> io.StringIO:
+    """Incident rows in COPY text format (tab-separated, one row per line)."""
+    buf = io.StringIO()
+    buf.writelines("\t".join(map(_copy_field, row)) + "\n" for row in _incident_rows(job_id, incidents))
+    buf.seek(0)
+    return buf
+
+
+def _copy_incidents(conn, job_id, incidents) -> bool:
+    """
+    Stream incident rows with COPY ... FROM STDIN on the connection's own DBAPI cursor, so they
+    commit together with the AnalysisJob update. Returns False when the driver has no COPY
+    support (non-PostgreSQL or not psycopg2); the caller then uses the executemany INSERT.
+    """
+    if conn.dialect.name != "postgresql" or conn.dialect.driver != "psycopg2":
+        return False
+    columns = ", ".join(f'"{c}"' for c in INCIDENT_COLUMNS)
+    cursor = conn.connection.dbapi_connection.cursor()
+    try:
+        cursor.copy_expert(f'COPY "Incident" ({columns}) FROM STDIN', _incidents_copy_text(job_id, incidents))
+    finally:
+        cursor.close()
+    return True
+
+
 def update_job_status(job_id, status, incidents=None, error=None):
     """Update AnalysisJob status and insert Incident rows when COMPLETED."""
     with db_engine.begin() as conn:
@@ -190,48 +476,470 @@ def update_job_status(job_id, status, incidents=None, error=None):
         })
 
         if incidents and status == "COMPLETED":
-            incident_query = text("""
-                INSERT INTO "Incident" (id, "jobId", "incidentTemplate", occurrences, "avgScore", severity, "exampleLog")
-                VALUES (:id, :job_id, :template, :occurrences, :avg_score, :severity, :example_log)
-            """)
-
-            incident_params = [{
-                "id": str(uuid.uuid4()),
-                "job_id": job_id,
-                "template": incident["incident_template"],
-                "occurrences": incident["occurrences"],
-                "avg_score": incident["avg_score"],
-                "severity": incident["severity"],
-                "example_log": incident["example_log"]
-            } for incident in incidents]
-
-            if incident_params:
-                conn.execute(incident_query, incident_params)
-                logger.info("Bulk saved incidents", incidentCount=len(incidents), jobId=job_id)
+            if _copy_incidents(conn, job_id, incidents):
+                logger.info("Bulk saved incidents", incidentCount=len(incidents), jobId=job_id, method="copy")
+            else:
+                incident_query = text("""
+                    INSERT INTO "Incident" (id, "jobId", "incidentTemplate", occurrences, "avgScore", severity, "exampleLog")
+                    VALUES (:id, :job_id, :template, :occurrences, :avg_score, :severity, :example_log)
+                """)
+                keys = ("id", "job_id", "template", "occurrences", "avg_score", "severity", "example_log")
+                conn.execute(incident_query, [dict(zip(keys, row)) for row in _incident_rows(job_id, incidents)])
+                logger.info("Bulk saved incidents", incidentCount=len(incidents), jobId=job_id, method="executemany")
 
             logger.info("Job status updated", jobId=job_id, status=status)
 
 
-def _run_analysis_task(job_id: str, file_key: str, bucket: str):
+def result_cache_key(etag: str, size: int, source_key: str | None = None, ranges: int | None = None) -> str:
+    """Content address of an analysis: object ETag and size plus everything that changes the incidents
+    for the same bytes. The source key only counts when warm template state or cached models make
+    results depend on the source's history. ranges: the number of byte ranges the object is mined in
+    (range mode merges their templates), None = mined sequentially."""
+    parts = [RESULT_CACHE_VERSION, etag, size, WINDOW_SIZE, repr(replace(ModelConfig(), n_jobs=1)), repr(MINING)]
+    if ranges is not None:
+        parts.append(["ranges", ranges])
+    elif STREAMING is not None:
+        parts.append(repr(STREAMING))
+    if source_key and (template_store is not None or model_store is not None):
+        parts.append(source_key)
+    return hashlib.sha256(json.dumps(parts).encode("utf-8")).hexdigest()
+
+
+def _new_id_sql(conn) -> str:
+    return "gen_random_uuid()::text" if conn.dialect.name == "postgresql" else "lower(hex(randomblob(16)))"
+
+
+def copy_cached_result(job_id: str, content_key: str) -> list | None:
+    """
+    If a completed job with the same content key exists, copy its incidents to `job_id` with one
+    INSERT ... SELECT, mark the job COMPLETED and return the copied incidents; else None.
+    """
+    with db_engine.begin() as conn:
+        cached_job = conn.execute(text('''
+            SELECT c."jobId" FROM "AnalysisResultCache" c JOIN "AnalysisJob" j ON j.id = c."jobId"
+            WHERE c."contentKey" = :key AND j.status = 'COMPLETED'
+        '''), {"key": content_key}).scalar()
+        if cached_job is None:
+            return None
+
+        copied = conn.execute(text(f'''
+            INSERT INTO "Incident" (id, "jobId", "incidentTemplate", occurrences, "avgScore", severity, "exampleLog")
+            SELECT {_new_id_sql(conn)}, :job_id, "incidentTemplate", occurrences, "avgScore", severity, "exampleLog"
+            FROM "Incident" WHERE "jobId" = :cached_job
+        '''), {"job_id": job_id, "cached_job": cached_job}).rowcount
+        conn.execute(text('''
+            UPDATE "AnalysisJob" SET status = 'COMPLETED', "incidentCount" = :count WHERE id = :id
+        '''), {"count": copied, "id": job_id})
+        conn.execute(text('''
+            UPDATE "AnalysisResultCache" SET "lastUsedAt" = :now, hits = hits + 1 WHERE "contentKey" = :key
+        '''), {"now": datetime.now(timezone.utc), "key": content_key})
+        rows = conn.execute(text('''
+            SELECT "incidentTemplate", occurrences, "avgScore", severity, "exampleLog"
+            FROM "Incident" WHERE "jobId" = :job_id
+        '''), {"job_id": job_id}).fetchall()
+
+    logger.info("Result cache hit, incidents copied", jobId=job_id, cachedJobId=cached_job, incidentCount=copied)
+    return [{
+        "incident_template": r.incidentTemplate,
+        "occurrences": r.occurrences,
+        "avg_score": r.avgScore,
+        "severity": r.severity,
+        "example_log": r.exampleLog,
+    } for r in rows]
+
+
+def remember_result(job_id: str, content_key: str):
+    """Point the content key at this completed job, then evict expired and least recently used entries."""
+    now = datetime.now(timezone.utc)
+    with db_engine.begin() as conn:
+        conn.execute(text('''
+            INSERT INTO "AnalysisResultCache" ("contentKey", "jobId", "createdAt", "lastUsedAt", hits)
+            VALUES (:key, :job_id, :now, :now, 0)
+            ON CONFLICT ("contentKey") DO UPDATE SET "jobId" = excluded."jobId", "lastUsedAt" = excluded."lastUsedAt"
+        '''), {"key": content_key, "job_id": job_id, "now": now})
+        conn.execute(text('DELETE FROM "AnalysisResultCache" WHERE "lastUsedAt" < :cutoff'),
+                     {"cutoff": now - timedelta(seconds=RESULT_CACHE_TTL_SECONDS)})
+        oldest_kept = conn.execute(text('''
+            SELECT "lastUsedAt" FROM "AnalysisResultCache" ORDER BY "lastUsedAt" DESC LIMIT 1 OFFSET :offset
+        '''), {"offset": RESULT_CACHE_MAX_ENTRIES - 1}).scalar()
+        if oldest_kept is not None:
+            conn.execute(text('DELETE FROM "AnalysisResultCache" WHERE "lastUsedAt" < :oldest'), {"oldest": oldest_kept})
+
+
+def _split_lines(data: bytes) -> list[str]:
+    """Decode a block of complete lines (ending with a line break) once and split it into stripped
+    lines, breaking on \\n, \\r\\n and \\r like StreamingBody.iter_lines (bytes.splitlines)."""
+    if b"\r" in data:
+        data = data.replace(b"\r\n", b"\n").replace(b"\r", b"\n")
+    lines = data.decode("utf-8", errors="replace").split("\n")
+    lines.pop()  # empty piece after the final line break
+    return list(map(str.strip, lines))
+
+
+def iter_line_batches(chunks):
+    """
+    Bulk line splitting for a byte stream (e.g. StreamingBody.iter_chunks with multi-MB chunks):
+    each chunk is cut at its last newline, decoded once with errors="replace" and split in one
+    pass; the partial last line is carried into the next chunk. Yields list[str] per chunk.
+    """
+    pending = b""
+    for chunk in chunks:
+        data = pending + chunk if pending else chunk
+        cut = data.rfind(b"\n")
+        if cut < 0:
+            pending = data
+            continue
+        pending = data[cut + 1:]
+        yield _split_lines(data[:cut + 1])
+    if pending:
+        yield _split_lines(pending + b"\n")
+
+
+# Leading bytes of each supported compressed format, and key suffixes used when the magic is absent
+COMPRESSION_MAGIC = {"gzip": b"\x1f\x8b", "bz2": b"BZh", "zstd": b"\x28\xb5\x2f\xfd"}
+COMPRESSION_SUFFIXES = {".gz": "gzip", ".gzip": "gzip", ".bz2": "bz2", ".zst": "zstd", ".zstd": "zstd"}
+
+
+def detect_compression(file_key: str, head: bytes) -> str | None:
+    """Codec of an object from its first bytes (magic), else from its key suffix; None = plain text."""
+    for codec, magic in COMPRESSION_MAGIC.items():
+        if head.startswith(magic):
+            return codec
+    return COMPRESSION_SUFFIXES.get(os.path.splitext(file_key.lower())[1])
+
+
+class _ChunkReader(io.RawIOBase):
+    """Read-only file object over an iterator of byte chunks, so a decompressor can pull from S3."""
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._buf = memoryview(b"")
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while not self._buf:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return 0
+            self._buf = memoryview(chunk)
+        n = min(len(b), len(self._buf))
+        b[:n] = self._buf[:n]
+        self._buf = self._buf[n:]
+        return n
+
+
+def _open_decompressor(codec: str, raw: io.RawIOBase):
+    if codec == "gzip":
+        return gzip.GzipFile(fileobj=raw, mode="rb")
+    if codec == "bz2":
+        return bz2.BZ2File(raw, mode="rb")
+    if ZstdFile is not None:
+        return ZstdFile(raw, mode="rb")
+    if zstandard is not None:
+        return zstandard.ZstdDecompressor().stream_reader(raw, read_across_frames=True)
+    raise RuntimeError("zstd input needs Python 3.14+ (compression.zstd) or the zstandard package")
+
+
+def iter_decompressed(chunks, file_key: str, block_size: int = 2 * 1024 * 1024):
+    """
+    Pass plain chunks through, or decompress a gzip/bz2/zstd stream incrementally (multi-member
+    and multi-frame files included) into blocks of at most `block_size` bytes. Only one input
+    chunk and one output block are held at a time, so the file is never materialized.
+    """
+    chunks = iter(chunks)
+    head = next(chunks, b"")
+    codec = detect_compression(file_key, head)
+    stream = chain((head,), chunks)
+    if codec is None:
+        yield from stream
+        return
+    logger.info("Decompressing stream", codec=codec)
+    with _open_decompressor(codec, _ChunkReader(stream)) as f:
+        while block := f.read(block_size):
+            yield block
+
+
+def split_byte_ranges(size: int, parts: int) -> list[tuple[int, int]]:
+    """Split [0, size) into `parts` contiguous, near-equal [start, end) byte ranges."""
+    parts = max(1, min(parts, size))
+    bounds = [size * i // parts for i in range(parts + 1)]
+    return [(bounds[i], bounds[i + 1]) for i in range(parts)]
+
+
+def _first_line_start(data: bytes) -> int | None:
+    """Offset just past the first line break in `data` (\\r\\n counts as one break), or None when there is
+    none yet, including a final \\r that the next chunk may pair with \\n."""
+    newline, cr = data.find(b"\n"), data.find(b"\r")
+    if cr < 0 or 0 <= newline < cr:
+        return newline + 1 if newline >= 0 else None
+    if cr + 1 == len(data):
+        return None
+    return cr + 2 if data[cr + 1:cr + 2] == b"\n" else cr + 1
+
+
+def iter_range_lines(s3, bucket: str, file_key: str, start: int, end: int, size: int,
+                     chunk_size: int = 1024 * 1024, tail_size: int = 64 * 1024):
+    """
+    Yield the decoded lines of an S3 object that *start* inside [start, end), using Range GETs.
+    Lines are split and stripped like iter_line_batches (breaking on \\n, \\r\\n and \\r), so
+    range mode sees the same lines as a sequential read. The byte before `start` is fetched too:
+    unless a line break ends there, the partial first line belongs to the previous range and is
+    skipped. The last line is completed past `end` with small extra GETs. Consecutive ranges thus
+    yield every line of the object exactly once.
+    """
+    first = max(start - 1, 0)
+    body = s3.get_object(Bucket=bucket, Key=file_key, Range=f"bytes={first}-{end - 1}")["Body"]
+    skipping = start > 0
+    pending = b""
+    for chunk in body.iter_chunks(chunk_size=chunk_size):
+        data = pending + chunk if pending else chunk
+        if skipping:
+            begin = _first_line_start(data)
+            if begin is None:
+                pending = data[-1:] if data.endswith(b"\r") else b""
+                continue
+            data = data[begin:]
+            skipping = False
+        # Cut at the last \n only: a final \r may be the first half of \r\n
+        cut = data.rfind(b"\n")
+        if cut < 0:
+            pending = data
+            continue
+        pending = data[cut + 1:]
+        yield from _split_lines(data[:cut + 1])
+    if skipping:
+        return  # no line starts inside this range
+    pos = end
+    while pending and not pending.endswith(b"\r") and pos < size:
+        tail = s3.get_object(Bucket=bucket, Key=file_key, Range=f"bytes={pos}-{min(pos + tail_size, size) - 1}")["Body"].read()
+        pos += len(tail)
+        breaks = [i for i in (tail.find(b"\n"), tail.find(b"\r")) if i >= 0]
+        if breaks:
+            pending += tail[:min(breaks) + 1]
+            break
+        pending += tail
+    if pending:
+        yield from _split_lines(pending if pending.endswith((b"\n", b"\r")) else pending + b"\n")
+
+
+def _load_warm_miner(source_key: str | None, timer=NULL_TIMER):
+    """The miner for a job of `source_key`: restored from its saved template state, or cold when there is
+    none (or it is unusable). None without a store or a source key (analyze_log then mines cold)."""
+    if template_store is None or not source_key:
+        return None
+    with timer.stage("template_state"):
+        try:
+            state = template_store.load(source_key)
+            miner = template_state.load_miner(state, MINING.max_clusters, MINING.engine)
+        except Exception as e:
+            logger.warning("Warm template state unusable, mining cold", sourceKey=source_key, error=str(e))
+            return template_state.load_miner(None, MINING.max_clusters, MINING.engine)
+    logger.info("Template state loaded" if state else "No template state yet, mining cold",
+                sourceKey=source_key, clusters=template_state.cluster_count(miner))
+    return miner
+
+
+def _save_warm_miner(source_key: str | None, miner, timer=NULL_TIMER):
+    """Save the grown tree back; a failed or over-cap save only costs the next job a cold start."""
+    if template_store is None or not source_key or miner is None:
+        return
+    try:
+        with timer.stage("template_state"):
+            state = template_state.dump_miner(miner)
+            saved = template_store.save(source_key, state)
+        if saved:
+            logger.info("Template state saved", sourceKey=source_key, clusters=template_state.cluster_count(miner), bytes=len(state))
+        else:
+            logger.warning("Template state over size cap, dropped", sourceKey=source_key, bytes=len(state))
+    except Exception as e:
+        logger.warning("Saving template state failed", sourceKey=source_key, error=str(e))
+
+
+def _load_baseline(source_key: str | None, config: ModelConfig, timer=NULL_TIMER):
+    """The source's cached-model slot for analyze_log (its model None when there is no usable entry);
+    None without a model store or a source key (the job then fits as usual)."""
+    if model_store is None or not source_key:
+        return None
+    baseline = ScoringBaseline(max_age_seconds=MODEL_MAX_AGE_SECONDS, max_drift=MODEL_MAX_DRIFT)
+    with timer.stage("model_cache"):
+        try:
+            key = model_cache.model_key(config, WINDOW_SIZE, MINING)
+            baseline.model = model_cache.load_baseline(model_store.load(source_key), key)
+        except Exception as e:
+            logger.warning("Cached model unusable, refitting", sourceKey=source_key, error=str(e))
+    return baseline
+
+
+def _save_baseline(source_key: str | None, baseline, config: ModelConfig, timer=NULL_TIMER):
+    """Store a model the job refit; a reused model is left as it is (its age counts from its fit)."""
+    if baseline is None or (baseline.refit_reason is None and baseline.drift is None):
+        return  # no store / source key, or too few lines to score
+    if baseline.refit_reason is None:
+        logger.info("Cached model reused", sourceKey=source_key, drift=round(baseline.drift, 4),
+                    fittedAt=baseline.model.fitted_at)
+        return
+    try:
+        with timer.stage("model_cache"):
+            state = model_cache.dump_baseline(baseline.model, model_cache.model_key(config, WINDOW_SIZE, MINING))
+            saved = model_store.save(source_key, state)
+        logger.info("Model refit" if saved else "Refit model over size cap, not cached", sourceKey=source_key,
+                    reason=baseline.refit_reason, drift=baseline.drift, bytes=len(state))
+    except Exception as e:
+        logger.warning("Caching model failed", sourceKey=source_key, error=str(e))
+
+
+def _mine_byte_range(bucket: str, file_key: str, start: int, end: int, size: int, source_key: str = None):
+    """Runs in a range process: stream one byte range of the object through mine_log
+    (each range starts from the source's warm tree when there is one; ranges do not save it)."""
+    return mine_log(iter_range_lines(s3_client, bucket, file_key, start, end, size), miner=_load_warm_miner(source_key),
+                    mining=MINING)
+
+
+def _analyze_in_ranges(bucket: str, file_key: str, size: int, timer=NULL_TIMER, source_key: str = None,
+                       config: ModelConfig = None, baseline: ScoringBaseline = None, progress=None) -> list:
+    """
+    Intra-file parallelism for large objects: parsing, Drain3 mining and per-line features run
+    per line-aligned byte range in RANGE_PROCESSES processes; frequency/window features and the
+    Isolation Forest then run once on the merged file.
+    """
+    ranges = split_byte_ranges(size, RANGE_PROCESSES)
+    logger.info("Mining byte ranges in parallel", ranges=len(ranges), size=size)
+    if progress is not None:
+        progress.total_bytes = size
+        progress("mine_ranges", 0)
+    with ProcessPoolExecutor(
+        max_workers=len(ranges),
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_analysis_process,
+    ) as pool, timer.stage("mine_ranges", nbytes=size):
+        parts = list(pool.map(_mine_byte_range, *zip(*((bucket, file_key, s, e, size, source_key) for s, e in ranges))))
+    if progress is not None:
+        progress.bytes_read = size
+    # Block scoring threads use the same cores once the range processes are done
+    config = config or ModelConfig(n_jobs=RANGE_PROCESSES)
+    return analyze_mined_parts(parts, WINDOW_SIZE, model=config, timer=timer, baseline=baseline, progress=progress,
+                               spill=SPILL)
+
+
+def _new_timer():
+    return StageTimer() if STAGE_TIMING else NULL_TIMER
+
+
+def _log_stages(job_id: str, timer):
+    """One structured log line with every stage's seconds, lines and bytes for the job."""
+    if isinstance(timer, StageTimer) and timer.stages:
+        stages = {name: {**s, "seconds": round(s["seconds"], 4)} for name, s in timer.stages.items()}
+        logger.info("Job stage timings", jobId=job_id, stages=stages)
+
+
+def _analyze_chunks(chunks, file_key: str, config: ModelConfig, timer=NULL_TIMER, source_key: str = None,
+                    progress: ProgressReporter | None = None):
+    """analyze_log over the raw byte chunks of an object (decompressed and split into line batches
+    as they stream), with the source's warm miner and cached model. Returns (incidents, miner, baseline)
+    so the caller saves the grown tree and the model. progress: counts the chunks' bytes and gets
+    analyze_log's progress calls."""
+    miner = _load_warm_miner(source_key, timer)
+    baseline = _load_baseline(source_key, config, timer)
+    if progress is not None:
+        chunks = progress.count_bytes(chunks)
+    lines_stream = LineBatches(iter_line_batches(iter_decompressed(chunks, file_key, S3_READ_CHUNK_BYTES)))
+    logger.info("Starting ML analysis stream")
+    incidents = analyze_log(lines_stream, WINDOW_SIZE, model=config, timer=timer, miner=miner, baseline=baseline,
+                            mining=MINING, streaming=STREAMING, progress=progress, spill=SPILL)
+    return incidents, miner, baseline
+
+
+def _complete_job(job_id: str, bucket: str, file_key: str, incidents: list, timer=NULL_TIMER, content_key: str = None,
+                  source_key: str = None, miner=None, baseline=None, config: ModelConfig | None = None):
+    """Persist a COMPLETED job, save the source's tree and model (when given), record the result cache
+    entry, log the stage timings and delete the object from S3."""
+    logger.info("Persisting incidents", incidentCount=len(incidents))
+    with timer.stage("persist", len(incidents)):
+        with_retry(update_job_status, job_id, "COMPLETED", incidents)
+    _save_warm_miner(source_key, miner, timer)
+    _save_baseline(source_key, baseline, config, timer)
+    if content_key is not None:
+        try:
+            remember_result(job_id, content_key)
+        except Exception as e:
+            logger.warning("Recording result in cache failed", error=str(e))
+    _log_stages(job_id, timer)
+
+    with_retry(s3_client.delete_object, Bucket=bucket, Key=file_key)
+    logger.info("Deleted file from S3", fileKey=file_key)
+
+
+def _check_object(job_id: str, bucket: str, file_key: str, timer=NULL_TIMER, source_key: str = None,
+                  head: dict | None = None):
+    """What to do with a job's object before fetching it: (content_key, cached, range_size).
+    content_key: its result cache key (None without RESULT_CACHE). cached: the incidents copied from a
+    cached result (the object is then already deleted), else None. range_size: the object size when it
+    is to be analyzed in byte ranges (RANGE_PROCESSES), else None.
+    head: the object's ContentLength and ETag when route_message already HEADed it (see parse_object_head)."""
+    content_key = range_size = None
+    if not (RANGE_PROCESSES > 1 or RESULT_CACHE):
+        return None, None, None
+    head = head or with_retry(s3_client.head_object, Bucket=bucket, Key=file_key)
+
+    size = head["ContentLength"]
+    if RANGE_PROCESSES > 1 and size >= RANGE_SPLIT_MIN_BYTES:
+        # Byte ranges of a compressed object cannot be decoded independently
+        start = with_retry(s3_client.get_object, Bucket=bucket, Key=file_key, Range="bytes=0-3")["Body"].read()
+        if not detect_compression(file_key, start):
+            range_size = size
+
+    if RESULT_CACHE:
+        content_key = result_cache_key(head["ETag"], size, source_key, RANGE_PROCESSES if range_size else None)
+        try:
+            with timer.stage("result_cache"):
+                cached = copy_cached_result(job_id, content_key)
+        except Exception as e:
+            logger.warning("Result cache lookup failed, analyzing", error=str(e))
+            cached = None
+        if cached is not None:
+            with_retry(s3_client.delete_object, Bucket=bucket, Key=file_key)
+            logger.info("Deleted file from S3", fileKey=file_key)
+            _log_stages(job_id, timer)
+            return content_key, cached, None
+    return content_key, None, range_size
+
+
+def _run_analysis_task(job_id: str, file_key: str, bucket: str, timer=NULL_TIMER, source_key: str = None,
+                       progress: ProgressReporter | None = None, head: dict | None = None):
     """
     Runs in a worker thread: S3 fetch, analyze_log, DB, S3 delete.
     Returns (job_id, status, incidents) so the consumer thread can send
     the notification on the existing channel (pika channels are not thread-safe).
+    timer: a StageTimer collecting fetch, analysis and persist stages (NULL_TIMER = off).
+    source_key: optional log source; its warm Drain3 tree and cached model are loaded before the
+    analysis and saved after the incidents are persisted.
+    progress: a ProgressReporter that sends the job's PROGRESS messages (None = none).
+    head: the object's HEAD carried in the job message (see parse_object_head); None = HEAD it when needed.
     """
     try:
-        logger.info("Fetching from S3", bucket=bucket, fileKey=file_key)
-        obj = with_retry(s3_client.get_object, Bucket=bucket, Key=file_key)
-       
-        lines_stream = (line.decode("utf-8", errors="replace") for line in obj["Body"].iter_lines())
-
-        logger.info("Starting ML analysis stream")
-        incidents = analyze_log(lines_stream)
+        miner = None
+        config = ModelConfig()
+        content_key, cached, size = _check_object(job_id, bucket, file_key, timer, source_key, head)
+        if cached is not None:
+            return (job_id, "COMPLETED", cached)
 
-        logger.info("Persisting incidents", incidentCount=len(incidents))
-        with_retry(update_job_status, job_id, "COMPLETED", incidents)
+        if size is not None:
+            config = ModelConfig(n_jobs=RANGE_PROCESSES)
+            baseline = _load_baseline(source_key, config, timer)
+            incidents = _analyze_in_ranges(bucket, file_key, size, timer, source_key, config, baseline, progress)
+        else:
+            logger.info("Fetching from S3", bucket=bucket, fileKey=file_key)
+            start = perf_counter()
+            obj = with_retry(s3_client.get_object, Bucket=bucket, Key=file_key)
+            timer.add("fetch", perf_counter() - start, nbytes=obj.get("ContentLength") or 0)
+            if progress is not None:
+                progress.total_bytes = obj.get("ContentLength")
+            chunks = obj["Body"].iter_chunks(chunk_size=S3_READ_CHUNK_BYTES)
+            incidents, miner, baseline = _analyze_chunks(chunks, file_key, config, timer, source_key, progress)
 
-        with_retry(s3_client.delete_object, Bucket=bucket, Key=file_key)
-        logger.info("Deleted file from S3", fileKey=file_key)
+        _complete_job(job_id, bucket, file_key, incidents, timer, content_key, source_key, miner, baseline, config)
         return (job_id, "COMPLETED", incidents)
     except Exception as e:
         logger.error("Error in analysis task", error=str(e))
@@ -239,70 +947,271 @@ def _run_analysis_task(job_id: str, file_key: str, bucket: str):
         return (job_id, "FAILED", None)
 
 
-def process_message(ch, method, properties, body):
-    """Consume job: run analysis in thread; ack and notify on connection thread via add_callback_threadsafe."""
+def _init_analysis_process(nice: int = 0, progress_queue=None):
+    """Initializer of pool processes: each child builds its own S3 client and DB engine, lowers its
+    CPU priority by `nice` (range processes it spawns inherit it) and puts PROGRESS payloads on
+    `progress_queue` (None = no progress)."""
+    global _progress_queue
+    if nice:
+        os.nice(nice)
+    init_runtime_from_env()
+    _progress_queue = progress_queue
+
+
+def _create_process_pool(processes: int = None, nice: int = 0, progress_queue=None) -> ProcessPoolExecutor:
+    """
+    Pool of `processes` (default ANALYSIS_PROCESSES) analysis processes. Children are recycled after
+    ANALYSIS_MAX_TASKS_PER_CHILD jobs so heap fragmentation from sklearn/Drain3
+    does not accumulate on long-running workers.
+    """
+    return ProcessPoolExecutor(
+        max_workers=processes or ANALYSIS_PROCESSES,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_analysis_process,
+        initargs=(nice, progress_queue),
+        max_tasks_per_child=ANALYSIS_MAX_TASKS_PER_CHILD,
+    )
+
+
+def _run_analysis_in_child(job_id: str, file_key: str, bucket: str, correlation_id: str = None, source_key: str = None,
+                           head: dict | None = None):
+    """Entry point in a pool process: bind the job's correlation ID, then run the task.
+    Returns ((job_id, status, incidents), stages) so the parent can export the stage metrics."""
+    structlog.contextvars.clear_contextvars()
+    if correlation_id:
+        structlog.contextvars.bind_contextvars(correlationId=correlation_id)
+    timer = _new_timer()
+    result = _run_analysis_task(job_id, file_key, bucket, timer, source_key, job_progress(job_id, correlation_id), head)
+    return result, getattr(timer, "stages", {})
+
+
+def _run_in_analysis_process(lane: Lane, job_id: str, file_key: str, bucket: str, correlation_id: str = None,
+                             source_key: str = None, head: dict | None = None):
+    """
+    Runs in a dispatcher thread: submits the job to the lane's process pool and waits for
+    ((job_id, status, incidents), stages). If a child dies mid-job (e.g. OOM kill), the pool
+    is broken: the job is marked FAILED and a fresh pool replaces the broken one.
+    """
+    pool = lane.pool
+    try:
+        return pool.submit(_run_analysis_in_child, job_id, file_key, bucket, correlation_id, source_key,
+                           head).result()
+    except BrokenProcessPool as e:
+        logger.error("Analysis process died", jobId=job_id, lane=lane.name, error=str(e))
+        with lane.pool_lock:
+            if lane.pool is pool:
+                lane.pool = _create_process_pool(lane.concurrency, lane.nice, lane.progress_queue)
+        with_retry(update_job_status, job_id, "FAILED", error=str(e), max_retries=2)
+        return (job_id, "FAILED", None), {}
+
+
+def parse_job(body) -> tuple:
+    """(job_id, file_key, bucket, correlation_id, source_key) of a job message (bare or in a "data" envelope)."""
     raw = json.loads(body)
     data = raw.get("data", raw)
-    job_id = data.get("jobId")
-    file_key = data.get("fileKey")
-    bucket = data.get("bucket", "sentinel-logs")
-    correlation_id = data.get("correlationId")
+    return (data.get("jobId"), data.get("fileKey"), data.get("bucket", "sentinel-logs"), data.get("correlationId"),
+            data.get("sourceKey"))
+
+
+def parse_object_head(body) -> dict | None:
+    """The object's {"ContentLength", "ETag"} that route_message added to a job message ("objectSize",
+    "objectETag"), so the analysis does not HEAD the object again; None when the message has none."""
+    raw = json.loads(body)
+    data = raw.get("data", raw)
+    if data.get("objectSize") is None:
+        return None
+    return {"ContentLength": data["objectSize"], "ETag": data.get("objectETag")}
+
+
+def _with_object_head(body, head: dict) -> bytes:
+    """The job message with the object's size and ETag added (inside the "data" envelope when there is one)."""
+    raw = json.loads(body)
+    data = raw.get("data", raw)
+    data.update(objectSize=head["ContentLength"], objectETag=head.get("ETag"))
+    return json.dumps(raw).encode("utf-8")
+
+
+def estimate_job_bytes(file_key: str, size: int) -> int:
+    """Rough analyzed (uncompressed) size of an object: its size, times COMPRESSED_SIZE_FACTOR when the
+    key names a compressed format."""
+    return size * COMPRESSED_SIZE_FACTOR if detect_compression(file_key, b"") else size
+
+
+def route_message(ch, method, properties, body, small: Lane, large: Lane, router: ThreadPoolExecutor):
+    """
+    Consumer of the jobs queue when lanes are on: HEAD the object (with retries, on a `router` thread so
+    a slow S3 never stalls the connection thread's heartbeats and consumers) and re-queue jobs estimated
+    at LANE_LARGE_MIN_BYTES or more to the large lane's queue (the original message is acked once the
+    copy is published); everything else runs in the small lane. Publish, ack and dispatch run back on the
+    connection thread via add_callback_threadsafe. The size and ETag travel in the job message, so the
+    analysis does not HEAD the object again. An object that still cannot be HEADed after the retries
+    goes to the small lane, whose analysis then fails the job.
+    """
+    job_id, file_key, bucket, correlation_id, _ = parse_job(body)
+    if not job_id or not file_key:
+        process_message(ch, method, properties, body, small)
+        return
+
+    def dispatch(head):
+        if head is None:
+            process_message(ch, method, properties, body, small)
+            return
+        sized = _with_object_head(body, head)
+        estimate = estimate_job_bytes(file_key, head["ContentLength"])
+        if estimate < LANE_LARGE_MIN_BYTES:
+            process_message(ch, method, properties, sized, small)
+            return
+        # Keep the original publish time so the large lane's queue wait includes the time spent here
+        published = getattr(properties, "timestamp", None) or int(time.time())
+        ch.basic_publish(exchange="", routing_key=large.queue, body=sized, properties=pika.BasicProperties(
+            delivery_mode=2, timestamp=published, content_type=getattr(properties, "content_type", None)))
+        ch.basic_ack(delivery_tag=method.delivery_tag)
+        logger.info("Job routed", jobId=job_id, lane=large.name, size=head["ContentLength"], estimatedBytes=estimate,
+                    correlationId=correlation_id)
+
+    def size_object():
+        try:
+            response = with_retry(s3_client.head_object, Bucket=bucket, Key=file_key)
+            head = {"ContentLength": response["ContentLength"], "ETag": response.get("ETag")}
+        except Exception as e:
+            logger.error("Sizing object failed, using the small lane", jobId=job_id, error=str(e),
+                         correlationId=correlation_id)
+            head = None
+        ch.connection.add_callback_threadsafe(functools.partial(dispatch, head))
+
+    router.submit(size_object)
+
+
+def process_message(ch, method, properties, body, lane: Lane = None):
+    """Consume job: run analysis in one of the lane's slots (thread, or pool process); ack and notify on
+    connection thread via add_callback_threadsafe."""
+    lane = lane or next(iter(_lanes.values()))
+    job_id, file_key, bucket, correlation_id, source_key = parse_job(body)
+    head = parse_object_head(body)
 
     structlog.contextvars.clear_contextvars()
     if correlation_id:
         structlog.contextvars.bind_contextvars(correlationId=correlation_id)
 
-    logger.info("Job received", jobId=job_id, fileKey=file_key)
+    received = time.time()
+    logger.info("Job received", jobId=job_id, fileKey=file_key, sourceKey=source_key, lane=lane.name)
 
     if not job_id or not file_key:
         logger.error("Rejected: missing jobId or fileKey")
         ch.basic_ack(delivery_tag=method.delivery_tag)
         return
 
+    metrics.JOBS_IN_FLIGHT.inc()
+
     def finish_message(delivery_tag, j_id, status, incidents, correlation_id):
         if correlation_id:
             structlog.contextvars.bind_contextvars(correlationId=correlation_id)
+        start = perf_counter()
         send_result_notification(ch, j_id, status, incidents, correlation_id)
+        if STAGE_TIMING:
+            metrics.STAGE_SECONDS.observe(perf_counter() - start, stage="notify")
         ch.basic_ack(delivery_tag=delivery_tag)
-    
+        metrics.JOBS_IN_FLIGHT.dec()
+        metrics.JOBS_TOTAL.inc(status=status)
+
     def worker_task():
         if correlation_id:
             structlog.contextvars.bind_contextvars(correlationId=correlation_id)
+        # Broker wait when the publisher set an AMQP timestamp, else time spent waiting locally
+        published = getattr(properties, "timestamp", None)
+        queue_wait = max(0.0, time.time() - (published or received))
+        metrics.QUEUE_WAIT_SECONDS.observe(queue_wait, lane=lane.name)
 
-        j_id, status, incidents = _run_analysis_task(job_id, file_key, bucket)
+        start = perf_counter()
+        if lane.pool is not None:
+            (j_id, status, incidents), stages = _run_in_analysis_process(lane, job_id, file_key, bucket, correlation_id,
+                                                                         source_key, head)
+        else:
+            timer = _new_timer()
+            progress = job_progress(job_id, correlation_id, lambda payload: ch.connection.add_callback_threadsafe(
+                functools.partial(send_progress_notification, ch, payload)))
+            j_id, status, incidents = _run_analysis_task(job_id, file_key, bucket, timer, source_key, progress, head)
+            stages = getattr(timer, "stages", {})
+        run_seconds = perf_counter() - start
+        metrics.observe_stages(stages)
+        metrics.JOB_SECONDS.observe(run_seconds, lane=lane.name)
+        logger.info("Job finished", jobId=j_id, status=status, lane=lane.name, queueWaitSeconds=round(queue_wait, 3),
+                    runSeconds=round(run_seconds, 3))
 
         ch.connection.add_callback_threadsafe(
             lambda: finish_message(method.delivery_tag, j_id, status, incidents, correlation_id)
         )
-    
-    _analysis_executor.submit(worker_task)
+
+    lane.executor.submit(worker_task)
+
+
+def create_lanes() -> dict[str, Lane]:
+    """The "jobs" lane (ANALYSIS_PROCESSES slots) or, with LANE_LARGE_MIN_BYTES, the "small" lane on the
+    jobs queue and the "large" lane on "<jobs queue>.large". In process mode each lane gets a pool of
+    its own concurrency, so large jobs never take the small lane's processes."""
+    if LANE_LARGE_MIN_BYTES is None:
+        lanes = [Lane("jobs", JOBS_QUEUE_NAME, max(1, ANALYSIS_PROCESSES))]
+    else:
+        lanes = [Lane("small", JOBS_QUEUE_NAME, LANE_SMALL_CONCURRENCY),
+                 Lane("large", f"{JOBS_QUEUE_NAME}.large", LANE_LARGE_CONCURRENCY, nice=LANE_LARGE_NICE)]
+    if ANALYSIS_PROCESSES > 0:
+        for lane in lanes:
+            logger.info("Starting analysis processes", lane=lane.name, processes=lane.concurrency, nice=lane.nice,
+                        maxTasksPerChild=ANALYSIS_MAX_TASKS_PER_CHILD)
+            if PROGRESS_INTERVAL_SECONDS > 0:
+                lane.progress_queue = multiprocessing.get_context("spawn").Queue()
+            lane.pool = _create_process_pool(lane.concurrency, lane.nice, lane.progress_queue)
+    return {lane.name: lane for lane in lanes}
 
 
 def start_worker():
+    global _lanes
     if not RABBIT_URL or not JOBS_QUEUE_NAME or not RESULTS_QUEUE_NAME:
         raise RuntimeError("Runtime is not initialized. Call init_runtime_from_env() first.")
 
+    if METRICS_PORT is not None:
+        metrics.start_metrics_server(METRICS_PORT)
+        logger.info("Serving metrics", port=METRICS_PORT, path="/metrics")
+
+    _lanes = create_lanes()
+
     logger.info("Connecting to RabbitMQ")
     params = pika.URLParameters(RABBIT_URL)
 
     connection = with_retry(pika.BlockingConnection, params, max_retries=5, base_delay=3)
-    channel = connection.channel()
-
-    channel.queue_declare(queue=JOBS_QUEUE_NAME, durable=True)
-    channel.queue_declare(queue=RESULTS_QUEUE_NAME, durable=True)  # reuse same channel for publishing
-    channel.basic_qos(prefetch_count=1)  # one job at a time
-
-    channel.basic_consume(queue=JOBS_QUEUE_NAME, on_message_callback=process_message)
-    logger.info("Waiting for messages. CTRL+C to exit.")
-    channel.start_consuming()
+    # One channel per lane, so each lane's prefetch (one job per analysis slot) is its own
+    for lane in _lanes.values():
+        channel = connection.channel()
+        channel.queue_declare(queue=lane.queue, durable=True)
+        channel.queue_declare(queue=RESULTS_QUEUE_NAME, durable=True)  # reuse same channel for publishing
+        channel.basic_qos(prefetch_count=lane.concurrency)
+        callback = functools.partial(process_message, lane=lane)
+        if lane.name == "small":
+            # HEADs for routing run here; at most one per unacked message (the small lane's prefetch)
+            router = ThreadPoolExecutor(max_workers=lane.concurrency, thread_name_prefix="route")
+            callback = functools.partial(route_message, small=lane, large=_lanes["large"], router=router)
+        channel.basic_consume(queue=lane.queue, on_message_callback=callback)
+        if lane.progress_queue is not None:
+            threading.Thread(target=_forward_progress, args=(lane.progress_queue, channel), daemon=True).start()
+    logger.info("Waiting for messages. CTRL+C to exit.", lanes={n: l.concurrency for n, l in _lanes.items()})
+    channel.start_consuming()  # dispatches the deliveries of every channel on the connection
 
 if __name__ == "__main__":
     validate_env()
     init_runtime_from_env()
     wait_for_dependencies()
     try:
-        start_worker()
+        if WORKER_MODE == "async":
+            sys.modules.setdefault("worker", sys.modules[__name__])  # async_worker shares this runtime
+            import async_worker
+            async_worker.start_async_worker()
+        else:
+            start_worker()
     except KeyboardInterrupt:
         logger.info("Interrupted")
     except Exception as e:
-        logger.error("Worker crashed", error=str(e))
\ No newline at end of file
+        logger.error("Worker crashed", error=str(e))
+    finally:
+        for lane in _lanes.values():
+            if lane.pool is not None:
+                lane.pool.shutdown(wait=False, cancel_futures=True)
\ No newline at end of file